@@ -8,17 +8,8 @@ Github: https://github.com/marsipu/mne-pipeline-hd
 import os
 import sys
 
-import qtpy
-from qtpy.QtCore import QTimer, Qt
-from qtpy.QtWidgets import QApplication
-
-from mne_pipeline_hd.gui.gui_utils import (
-    StdoutStderrStream,
-    UncaughtHook,
-    set_app_font,
-    set_app_theme,
-)
-from mne_pipeline_hd.gui.welcome_window import WelcomeWindow
+from qtpy.QtCore import QCoreApplication
+
 from mne_pipeline_hd.pipeline.legacy import legacy_import_check
 from mne_pipeline_hd.pipeline.pipeline_utils import (
     ismac,
@@ -31,16 +22,45 @@ from mne_pipeline_hd.pipeline.pipeline_utils import (
 legacy_import_check()
 
 
+app_name = "mne-pipeline-hd"
+organization_name = "marsipu"
+domain_name = "https://github.com/marsipu/mne-pipeline-hd"
+
+
 def init_streams():
+    from mne_pipeline_hd.gui.gui_utils import StdoutStderrStream
+
     # Redirect stdout and stderr to capture it later in GUI
     sys.stdout = StdoutStderrStream("stdout")
     sys.stderr = StdoutStderrStream("stderr")
 
 
 def main():
-    app_name = "mne-pipeline-hd"
-    organization_name = "marsipu"
-    domain_name = "https://github.com/marsipu/mne-pipeline-hd"
+    # The GUI and the command-line share the QSettings
+    QCoreApplication.setApplicationName(app_name)
+    QCoreApplication.setOrganizationName(organization_name)
+    QCoreApplication.setOrganizationDomain(domain_name)
+
+    # Run without GUI with "mne_pipeline_hd run ..."
+    if len(sys.argv) > 1 and sys.argv[1] == "run":
+        from mne_pipeline_hd.pipeline.cli import run_cli
+
+        sys.exit(run_cli(sys.argv[2:]))
+
+    start_gui()
+
+
+def start_gui():
+    import qtpy
+    from qtpy.QtCore import QTimer, Qt
+    from qtpy.QtWidgets import QApplication
+
+    from mne_pipeline_hd.gui.gui_utils import (
+        UncaughtHook,
+        set_app_font,
+        set_app_theme,
+    )
+    from mne_pipeline_hd.gui.welcome_window import WelcomeWindow
 
     # Enable High-DPI
     if hasattr(Qt.ApplicationAttribute, "AA_UseHighDpiPixmaps"):
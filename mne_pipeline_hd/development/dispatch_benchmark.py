@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import argparse
+import tempfile
+import timeit
+
+from mne_pipeline_hd.pipeline.controller import Controller
+from mne_pipeline_hd.pipeline.function_utils import get_arguments, get_func
+from mne_pipeline_hd.pipeline.loading import MEEG, data_cache
+from mne_pipeline_hd.pipeline.pipeline_utils import QSettingsSnapshot, use_qsettings
+
+
+def dispatch_step(meeg, func_name, qsettings):
+    # What the run-engine does for each step before the function runs
+    # (including the lookups of the data-cache for one load and one save)
+    func = get_func(func_name, meeg)
+    get_arguments(func, meeg, qsettings)
+    data_cache.get_max_bytes()
+    data_cache.get_max_bytes()
+
+
+def benchmark(meeg, func_name, qsettings, number):
+    with use_qsettings(qsettings):
+        durations = timeit.repeat(
+            lambda: dispatch_step(meeg, func_name, qsettings), number=number, repeat=5
+        )
+
+    return min(durations) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the overhead of the run-engine for each step "
+        "with the QSettings read from the settings-store (QS) "
+        "and from a QSettingsSnapshot."
+    )
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--functions", default="filter_data,epoch_raw,plot_evoked_topo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home_path:
+        ct = Controller(home_path, "benchmark")
+        meeg = MEEG("benchmark", ct)
+        duration = min(timeit.repeat(QSettingsSnapshot, number=10, repeat=5)) / 10
+        print(f"QSettingsSnapshot(): {duration * 1e3:.3f} ms (once per run)")
+        for func_name in args.functions.split(","):
+            # None reads the QSettings from QS() for each access
+            before = benchmark(meeg, func_name, None, args.number)
+            after = benchmark(meeg, func_name, QSettingsSnapshot(), args.number)
+            print(
+                f"{func_name:30} QS: {before * 1e6:8.1f} µs, "
+                f"QSettingsSnapshot: {after * 1e6:8.1f} µs per step"
+            )
+
+
+if __name__ == "__main__":
+    main()
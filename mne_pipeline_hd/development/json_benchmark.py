@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from mne_pipeline_hd.pipeline.pipeline_utils import TypedJSONEncoder, type_json_hook
+
+
+def get_test_data():
+    """Get data like large parameters- and file-parameters-files."""
+    rng = np.random.default_rng(0)
+    presets = dict()
+    for preset_idx in range(10):
+        parameters = dict()
+        for idx in range(300):
+            parameters[f"float_{idx}"] = float(idx)
+            parameters[f"tuple_{idx}"] = {"tuple_type": [idx, idx + 1]}
+            parameters[f"list_{idx}"] = ["a", "b", idx]
+        for idx in range(20):
+            parameters[f"array_{idx}"] = rng.standard_normal(1000)
+        presets[f"Preset{preset_idx}"] = parameters
+
+    file_parameters = dict()
+    for idx in range(2000):
+        file_parameters[f"sub{idx:04}_Default_evoked-ave.fif"] = {
+            "FUNCTION": "get_evokeds",
+            "FUNCTIONS": ["filter_data", "epoch_raw", "get_evokeds"],
+            "NAME": f"sub{idx:04}",
+            "TIME": str(datetime.now()),
+            "SIZE": 123456,
+            "P_PRESET": "Default",
+            "highpass": 0.1,
+            "lowpass": 40.0,
+            "t_epoch": {"tuple_type": [-0.2, 0.5]},
+            "reject": {"grad": 4e-10, "mag": 4e-12},
+        }
+
+    return {"parameters": presets, "file-parameters": file_parameters}
+
+
+def benchmark(name, data, number):
+    encoded = json.dumps(data, cls=TypedJSONEncoder)
+
+    def _encode():
+        json.dumps(data, cls=TypedJSONEncoder)
+
+    def _decode():
+        json.loads(encoded, object_hook=type_json_hook)
+
+    encode_time = min(timeit.repeat(_encode, number=number, repeat=5)) / number
+    decode_time = min(timeit.repeat(_decode, number=number, repeat=5)) / number
+    print(
+        f"{name:40} size: {len(encoded) / 1e6:6.2f} MB, "
+        f"encode: {encode_time * 1e3:7.1f} ms, decode: {decode_time * 1e3:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure encoding and decoding with TypedJSONEncoder "
+        "and type_json_hook."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="JSON-files to measure (e.g. the largest parameters_*.json and "
+        "_*_file_parameters.json), otherwise generated data is used.",
+    )
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+
+    if len(args.paths) > 0:
+        test_data = dict()
+        for path in args.paths:
+            with open(path, "r") as file:
+                test_data[Path(path).name] = json.load(file, object_hook=type_json_hook)
+    else:
+        test_data = get_test_data()
+    for name, data in test_data.items():
+        benchmark(name, data, args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+modules = [
+    "mne_pipeline_hd.pipeline.controller",
+    "mne_pipeline_hd.pipeline.function_utils",
+    "mne_pipeline_hd.pipeline.cli",
+]
+
+heavy_modules = ["matplotlib.pyplot", "mne_connectivity", "pandas", "qtpy.QtWidgets"]
+
+
+def _run_timed(code):
+    # The time is measured inside the interpreter to exclude its own startup
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{code}\n"
+        "duration = time.perf_counter() - start\n"
+        f"loaded = [m for m in {heavy_modules} if m in sys.modules]\n"
+        "print(duration, ','.join(loaded))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout.strip()
+    duration, _, loaded = output.splitlines()[-1].partition(" ")
+
+    return float(duration), loaded
+
+
+def benchmark(code, n_runs):
+    durations = list()
+    loaded = ""
+    for _ in range(n_runs):
+        duration, loaded = _run_timed(code)
+        durations.append(duration)
+
+    return statistics.median(durations), min(durations), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the startup-time of the headless path "
+        "(imports and Controller) in fresh interpreters."
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--home", help="Also measure the initialization of a Controller."
+    )
+    args = parser.parse_args()
+
+    cases = {f"import {m}": f"import {m}" for m in modules}
+    if args.home is not None:
+        cases["Controller()"] = (
+            "from mne_pipeline_hd.pipeline.controller import Controller\n"
+            f"Controller(r'{args.home}')"
+        )
+    for name, code in cases.items():
+        median, best, loaded = benchmark(code, args.runs)
+        print(
+            f"{name:50} median: {median:.3f} s, best: {best:.3f} s, "
+            f"heavy modules: {loaded or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,6 @@ import shutil
 import subprocess
 import sys
 import time
-from functools import reduce
-from itertools import combinations
 from os import environ
 from os.path import isdir, isfile, join
 
@@ -22,10 +20,18 @@ import autoreject as ar
 import mne
 import mne_connectivity
 import numpy as np
+from mne.forward import is_fixed_orient
+from mne.io.constants import FIFF
 from mne.preprocessing import ICA, find_bad_channels_maxwell
 from mne_connectivity import SpectralConnectivity
 
-from mne_pipeline_hd.pipeline.loading import MEEG, FSMRI
+from mne_pipeline_hd.pipeline.accumulators import (
+    ChannelAverage,
+    InstanceAverage,
+    RunningMean,
+)
+from mne_pipeline_hd.pipeline.loading import MEEG
+from mne_pipeline_hd.pipeline.parallel import prefetch_map
 from mne_pipeline_hd.pipeline.pipeline_utils import (
     check_kwargs,
     compare_filep,
@@ -37,11 +43,120 @@ from mne_pipeline_hd.pipeline.pipeline_utils import (
 
 
 # Todo: Create docstrings for each function
+def _load_data(data):
+    # Data from lazy load-modes (see MEEG.get_load_mode) has to be in memory
+    # to be modified in place or to be saved to the file it is read from
+    if hasattr(data, "load_data"):
+        data.load_data()
+
+    return data
+
+
+def _iter_group_data(group, load):
+    # Load the data of the next group-members in background threads,
+    # while the data of the current member is added to the grand-average
+    def _load(name):
+        meeg = MEEG(name, group.ct)
+        print(f"Add {name} to grand_average")
+        return meeg, load(meeg)
+
+    return prefetch_map(_load, group.group_list)
+
+
+def _filter_raw_chunked(
+    raw,
+    chunk_duration,
+    l_freq,
+    h_freq,
+    filter_length,
+    skip_by_annotation,
+    phase,
+    pad,
+    **kwargs,
+):
+    # Apply the same FIR-filter as Raw.filter() in place to overlapping chunks,
+    # so only the chunks of the data (e.g. from a memory-mapped file)
+    # need to be in memory
+    from mne.annotations import _annotations_starts_stops
+
+    sfreq = raw.info["sfreq"]
+    filter_kwargs = dict(
+        l_trans_bandwidth=kwargs.get("l_trans_bandwidth", "auto"),
+        h_trans_bandwidth=kwargs.get("h_trans_bandwidth", "auto"),
+        method="fir",
+        phase=phase,
+        fir_window=kwargs.get("fir_window", "hamming"),
+        fir_design=kwargs.get("fir_design", "firwin"),
+    )
+    h = mne.filter.create_filter(
+        None, sfreq, l_freq, h_freq, filter_length, **filter_kwargs
+    )
+    # Samples at each side of a chunk which change the filtered chunk
+    n_overlap = len(h)
+    n_chunk = max(int(chunk_duration * sfreq), n_overlap)
+    # All data-channels (also bad ones) like Raw.filter()
+    picks = mne.pick_types(
+        raw.info,
+        meg=True,
+        eeg=True,
+        csd=True,
+        seeg=True,
+        ecog=True,
+        dbs=True,
+        fnirs=True,
+        exclude=[],
+    )
+    # Filter contiguous segments separately like Raw.filter()
+    onsets, ends = _annotations_starts_stops(raw, skip_by_annotation, invert=True)
+    logger().info(
+        f"Filtering raw-data in chunks of {n_chunk} samples "
+        f"with an overlap of {n_overlap} samples"
+    )
+    for seg_start, seg_stop in zip(onsets, ends):
+        # The original data overlapping with the last chunk
+        # (which was already overwritten with the filtered data)
+        last_overlap = None
+        for start in range(seg_start, seg_stop, n_chunk):
+            stop = min(start + n_chunk, seg_stop)
+            in_start = max(start - n_overlap, seg_start)
+            in_stop = min(stop + n_overlap, seg_stop)
+            data = raw._data[picks, in_start:in_stop]
+            if last_overlap is not None:
+                data[:, : start - in_start] = last_overlap
+            next_start = max(stop - n_overlap, seg_start)
+            last_overlap = data[:, next_start - in_start : stop - in_start].copy()
+            data = mne.filter.filter_data(
+                data,
+                sfreq,
+                l_freq,
+                h_freq,
+                filter_length=len(h),
+                n_jobs=kwargs.get("n_jobs"),
+                copy=False,
+                pad=pad,
+                verbose="error",
+                **filter_kwargs,
+            )
+            raw._data[picks, start:stop] = data[:, start - in_start : stop - in_start]
+
+    # Update the filter-settings in info like Raw.filter()
+    if len(picks) > 0:
+        with raw.info._unlock():
+            if h_freq is not None and (l_freq is None or l_freq < h_freq):
+                if raw.info["lowpass"] is None or h_freq < raw.info["lowpass"]:
+                    raw.info["lowpass"] = float(h_freq)
+            if l_freq is not None and (h_freq is None or l_freq < h_freq):
+                if raw.info["highpass"] is None or l_freq > raw.info["highpass"]:
+                    raw.info["highpass"] = float(l_freq)
+
+    return raw
+
+
 # =============================================================================
 # PREPROCESSING AND GETTING TO EVOKED AND TFR
 # =============================================================================
 def find_bads(meeg, n_jobs, **kwargs):
-    raw = meeg.load_raw()
+    raw = _load_data(meeg.load_raw())
 
     if raw.info["dev_head_t"] is None:
         coord_frame = "meg"
@@ -79,6 +194,7 @@ def filter_data(
     enable_cuda,
     erm_t_limit,
     bad_interpolation,
+    filter_chunk_duration=None,
 ):
     # Compare Parameters from last run
     filtered_path = meeg.io_dict[filter_target]["path"]
@@ -86,9 +202,40 @@ def filter_data(
         meeg, filtered_path, ["highpass", "lowpass", "bad_interpolation"]
     )
 
-    if any([results[key] != "equal" for key in results]):
+    # Stream the raw-data through the filter in chunks
+    # from a memory-mapped file to limit the memory-usage
+    filter_chunked = (
+        filter_chunk_duration
+        and filter_target == "raw"
+        and filter_method == "fir"
+        and not enable_cuda
+    )
+
+    if any([results[key] != "equal" for key in results]) and filter_chunked:
+        raw = meeg.load_raw(load_mode="memmap")
+        _filter_raw_chunked(
+            raw,
+            filter_chunk_duration,
+            highpass,
+            lowpass,
+            filter_length=filter_length,
+            l_trans_bandwidth=l_trans_bandwidth,
+            h_trans_bandwidth=h_trans_bandwidth,
+            n_jobs=n_jobs,
+            phase=fir_phase,
+            fir_window=fir_window,
+            fir_design=fir_design,
+            skip_by_annotation=skip_by_annotation,
+            pad=fir_pad,
+        )
+        # The data is written incrementally from the memory-mapped file
+        meeg.save("raw_filtered", raw)
+        del raw
+        gc.collect()
+
+    elif any([results[key] != "equal" for key in results]):
         # Load Data
-        data = meeg.load(filter_target)
+        data = _load_data(meeg.load(filter_target))
 
         # use cuda for filtering if enabled
         if enable_cuda:
@@ -152,7 +299,7 @@ def filter_data(
             meeg, meeg.erm_processed_path, ["highpass", "lowpass", "bad_interpolation"]
         )
         if any([erm_results[key] != "equal" for key in erm_results]):
-            erm_raw = meeg.load_erm()
+            erm_raw = _load_data(meeg.load_erm())
 
             # Crop ERM-Measurement to limit if given
             if erm_t_limit:
@@ -197,14 +344,14 @@ def filter_data(
 
 
 def notch_filter(meeg, notch_frequencies, n_jobs):
-    raw_filtered = meeg.load_filtered()
+    raw_filtered = _load_data(meeg.load_filtered())
 
     raw_filtered = raw_filtered.notch_filter(notch_frequencies, n_jobs=1)
     meeg.save_filtered(raw_filtered)
 
 
 def interpolate_bads(meeg, bad_interpolation):
-    data = meeg.load(bad_interpolation)
+    data = _load_data(meeg.load(bad_interpolation))
 
     if bad_interpolation == "evoked":
         for evoked in data:
@@ -222,7 +369,7 @@ def interpolate_bads(meeg, bad_interpolation):
 def add_erm_ssp(
     meeg, erm_ssp_duration, erm_n_grad, erm_n_mag, erm_n_eeg, n_jobs, show_plots
 ):
-    raw_filtered = meeg.load_filtered()
+    raw_filtered = _load_data(meeg.load_filtered())
     erm_filtered = meeg.load_erm_processed()
 
     # Only include channels from Empty-Room-Data,
@@ -250,7 +397,7 @@ def add_erm_ssp(
 
 
 def eeg_reference_raw(meeg, ref_channels):
-    raw_filtered = meeg.load_filtered()
+    raw_filtered = _load_data(meeg.load_filtered())
 
     if ref_channels == "REST":
         forward = meeg.load_forward()
@@ -299,189 +446,43 @@ def find_6ch_binary_events(meeg, min_duration, shortest_event, adjust_timeline_b
     raw = meeg.load_raw()  # No copy to consume less memory
 
     # Binary Coding of 6 Stim Channels in Biomagenetism Lab Heidelberg
-    # prepare arrays
-    events = np.ndarray(shape=(0, 3), dtype=np.int32)
-    evs = list()
-    evs_tol = list()
-
-    # Find events for each stim channel, append sample values to list
-    evs.append(
-        mne.find_events(
-            raw,
-            min_duration=min_duration,
-            shortest_event=shortest_event,
-            stim_channel=["STI 001"],
-        )[:, 0]
-    )
-    evs.append(
-        mne.find_events(
-            raw,
-            min_duration=min_duration,
-            shortest_event=shortest_event,
-            stim_channel=["STI 002"],
-        )[:, 0]
-    )
-    evs.append(
-        mne.find_events(
-            raw,
-            min_duration=min_duration,
-            shortest_event=shortest_event,
-            stim_channel=["STI 003"],
-        )[:, 0]
-    )
-    evs.append(
-        mne.find_events(
-            raw,
-            min_duration=min_duration,
-            shortest_event=shortest_event,
-            stim_channel=["STI 004"],
-        )[:, 0]
-    )
-    evs.append(
-        mne.find_events(
-            raw,
-            min_duration=min_duration,
-            shortest_event=shortest_event,
-            stim_channel=["STI 005"],
-        )[:, 0]
-    )
-    evs.append(
-        mne.find_events(
-            raw,
-            min_duration=min_duration,
-            shortest_event=shortest_event,
-            stim_channel=["STI 006"],
-        )[:, 0]
-    )
-
-    for i in evs:
-        # delete events in each channel,
-        # which are too close too each other (1ms)
-        too_close = np.where(np.diff(i) <= 1)
-        if np.size(too_close) >= 1:
-            print(
-                f"Two close events (1ms) at samples "
-                f"{i[too_close] + raw.first_samp}, first deleted"
-            )
-            i = np.delete(i, too_close, 0)
-            evs[evs.index(i)] = i
-
-        # add tolerance to each value
-        i_tol = np.ndarray(shape=(0, 1), dtype=np.int32)
-        for t in i:
-            i_tol = np.append(i_tol, t - 1)
-            i_tol = np.append(i_tol, t)
-            i_tol = np.append(i_tol, t + 1)
-
-        evs_tol.append(i_tol)
-
-    # Get events from combinated Stim-Channels
-    equals = reduce(
-        np.intersect1d,
-        (evs_tol[0], evs_tol[1], evs_tol[2], evs_tol[3], evs_tol[4], evs_tol[5]),
+    # Read the stim channels only once (also when the raw is loaded lazily)
+    stim_channels = [f"STI 00{idx}" for idx in range(1, 7)]
+    bits = (raw.get_data(picks=stim_channels) > 0).astype(np.int64)
+
+    # Label the pulses of all channels to remove pulses shorter than
+    # min_duration/shortest_event and pulses running from the start
+    # (like mne.find_events)
+    rises = np.diff(bits, axis=1, prepend=0) > 0
+    labels = np.cumsum(rises).reshape(bits.shape) * bits
+    keep = np.bincount(labels.ravel()) >= max(
+        min_duration * raw.info["sfreq"], shortest_event
     )
-    # elimnate duplicated events
-    too_close = np.where(np.diff(equals) <= 1)
-    if np.size(too_close) >= 1:
-        equals = np.delete(equals, too_close, 0)
-        equals -= 1  # correction, because of shift with deletion
-
-    for q in equals:
-        if (
-            q not in events[:, 0]
-            and q not in events[:, 0] + 1
-            and q not in events[:, 0] - 1
-        ):
-            events = np.append(events, [[q, 0, 63]], axis=0)
-
-    for a, b, c, d, e in combinations(range(6), 5):
-        equals = reduce(
-            np.intersect1d, (evs_tol[a], evs_tol[b], evs_tol[c], evs_tol[d], evs_tol[e])
-        )
-        too_close = np.where(np.diff(equals) <= 1)
-        if np.size(too_close) >= 1:
-            equals = np.delete(equals, too_close, 0)
-            equals -= 1
-
-        for q in equals:
-            if (
-                q not in events[:, 0]
-                and q not in events[:, 0] + 1
-                and q not in events[:, 0] - 1
-            ):
-                events = np.append(
-                    events,
-                    [[q, 0, int(2**a + 2**b + 2**c + 2**d + 2**e)]],
-                    axis=0,
-                )
-
-    for a, b, c, d in combinations(range(6), 4):
-        equals = reduce(
-            np.intersect1d, (evs_tol[a], evs_tol[b], evs_tol[c], evs_tol[d])
-        )
-        too_close = np.where(np.diff(equals) <= 1)
-        if np.size(too_close) >= 1:
-            equals = np.delete(equals, too_close, 0)
-            equals -= 1
-
-        for q in equals:
-            if (
-                q not in events[:, 0]
-                and q not in events[:, 0] + 1
-                and q not in events[:, 0] - 1
-            ):
-                events = np.append(
-                    events, [[q, 0, int(2**a + 2**b + 2**c + 2**d)]], axis=0
-                )
-
-    for a, b, c in combinations(range(6), 3):
-        equals = reduce(np.intersect1d, (evs_tol[a], evs_tol[b], evs_tol[c]))
-        too_close = np.where(np.diff(equals) <= 1)
-        if np.size(too_close) >= 1:
-            equals = np.delete(equals, too_close, 0)
-            equals -= 1
-
-        for q in equals:
-            if (
-                q not in events[:, 0]
-                and q not in events[:, 0] + 1
-                and q not in events[:, 0] - 1
-            ):
-                events = np.append(events, [[q, 0, int(2**a + 2**b + 2**c)]], axis=0)
-
-    for a, b in combinations(range(6), 2):
-        equals = np.intersect1d(evs_tol[a], evs_tol[b])
-        too_close = np.where(np.diff(equals) <= 1)
-        if np.size(too_close) >= 1:
-            equals = np.delete(equals, too_close, 0)
-            equals -= 1
-
-        for q in equals:
-            if (
-                q not in events[:, 0]
-                and q not in events[:, 0] + 1
-                and q not in events[:, 0] - 1
-            ):
-                events = np.append(events, [[q, 0, int(2**a + 2**b)]], axis=0)
-
-    # Get single-channel events
-    for i in range(6):
-        for e in evs[i]:
-            if (
-                e not in events[:, 0]
-                and e not in events[:, 0] + 1
-                and e not in events[:, 0] - 1
-            ):
-                events = np.append(events, [[e, 0, 2**i]], axis=0)
-
-    # sort only along samples(column 0)
-    events = events[events[:, 0].argsort()]
+    keep[labels[:, 0]] = False
+    bits = keep[labels].astype(np.int64)
+
+    # Pack the channels into one code and get the bits,
+    # which are set at each change of the code
+    code = (bits << np.arange(6)[:, None]).sum(axis=0)
+    changes = np.flatnonzero(np.diff(code)) + 1
+    rising = code[changes] & ~code[changes - 1]
+    onsets = changes[rising > 0]
+    rising = rising[rising > 0]
+
+    # Onsets within a tolerance of +-1 sample around a common sample
+    # (at most 2 samples apart) belong to the same event
+    starts = np.flatnonzero(np.diff(onsets, prepend=-3) > 2)
+    ends = np.append(starts[1:], len(onsets)) - 1
+
+    # Combine the bits of the channels to the event-id
+    # and take the sample in the middle of the tolerance-window
+    events = np.zeros((len(starts), 3), dtype=np.int64)
+    if len(starts) > 0:
+        events[:, 0] = (onsets[starts] + onsets[ends]) // 2 + raw.first_samp
+        events[:, 2] = np.bitwise_or.reduceat(rising, starts)
 
     # apply latency correction
-    events[:, 0] = [
-        ts + np.round(adjust_timeline_by_msec * 10**-3 * raw.info["sfreq"])
-        for ts in events[:, 0]
-    ]
+    events[:, 0] += int(np.round(adjust_timeline_by_msec * 10**-3 * raw.info["sfreq"]))
 
     ids = np.unique(events[:, 2])
     print("unique ID's found: ", ids)
@@ -614,7 +615,7 @@ def run_ica(
     ecg_channel,
     **kwargs,
 ):
-    data = meeg.load(ica_fitto)
+    data = _load_data(meeg.load(ica_fitto))
     # Bad-Channels and Channel-Types are already picked in epochs
     if ica_fitto != "epochs":
         data.pick(ch_types, exclude="bads")
@@ -771,7 +772,7 @@ def apply_ica(meeg, ica_apply_target, n_pca_components):
     # Check file-parameters to make sure,
     # that ica is not applied twice in a row
 
-    data = meeg.load(ica_apply_target)
+    data = _load_data(meeg.load(ica_apply_target))
     ica = meeg.load_ica()
 
     if len(ica.exclude) == 0:
@@ -783,9 +784,9 @@ def apply_ica(meeg, ica_apply_target, n_pca_components):
         # Apply to Empty-Room-Data as well if present
         if meeg.erm:
             try:
-                erm_data = meeg.load_erm_processed()
+                erm_data = _load_data(meeg.load_erm_processed())
             except FileNotFoundError:
-                erm_data = meeg.load_erm()
+                erm_data = _load_data(meeg.load_erm())
             try:
                 ica.apply(erm_data, n_pca_components=n_pca_components)
             # Todo: Unmeddling ERM-SSP and ICA stuff
@@ -827,13 +828,10 @@ def calculate_gfp(evoked):
 
 
 def grand_avg_evokeds(group, ga_interpolate_bads, ga_drop_bads):
-    trial_dict = dict()
-    for name in group.group_list:
-        meeg = MEEG(name, group.ct)
-        print(f"Add {name} to grand_average")
-        evokeds = meeg.load_evokeds()
+    averages = dict()
+    for meeg, evokeds in _iter_group_data(group, lambda m: m.load_evokeds()):
         for evoked in evokeds:
-            if ga_interpolate_bads:
+            if ga_interpolate_bads and len(meeg.bad_channels) > 0:
                 bad_evoked = evoked.copy().pick(np.arange(len(meeg.bad_channels)))
                 bad_evoked = bad_evoked.rename_channels(
                     {
@@ -844,23 +842,19 @@ def grand_avg_evokeds(group, ga_interpolate_bads, ga_drop_bads):
                 bad_evoked.info["bads"] = meeg.bad_channels
                 evoked.add_channels([bad_evoked])
             if evoked.nave != 0:
-                if evoked.comment in trial_dict:
-                    trial_dict[evoked.comment].append(evoked)
-                else:
-                    trial_dict.update({evoked.comment: [evoked]})
+                if ga_interpolate_bads and len(evoked.info["bads"]) > 0:
+                    evoked.interpolate_bads()
+                if evoked.comment not in averages:
+                    averages[evoked.comment] = ChannelAverage()
+                averages[evoked.comment].add(evoked)
             else:
-                print(f"{evoked.comment} for {name} got nave=0")
+                print(f"{evoked.comment} for {meeg.name} got nave=0")
 
     ga_evokeds = dict()
-    for trial in trial_dict:
-        if len(trial_dict[trial]) != 0:
-            ga = mne.grand_average(
-                trial_dict[trial],
-                interpolate_bads=ga_interpolate_bads,
-                drop_bads=ga_drop_bads,
-            )
-            ga.comment = trial
-            ga_evokeds[trial] = ga
+    for trial, average in averages.items():
+        ga = average.get_average(drop_bads=ga_drop_bads)
+        ga.comment = trial
+        ga_evokeds[trial] = ga
 
     group.save_ga_evokeds(ga_evokeds)
 
@@ -978,39 +972,23 @@ def tfr(
 
 
 def grand_avg_tfr(group):
-    trial_dict = dict()
-    for name in group.group_list:
-        meeg = MEEG(name, group.ct)
-        print(f"Add {name} to grand_average")
-        powers = meeg.load_power_tfr_average()
+    averages = dict()
+    for meeg, powers in _iter_group_data(group, lambda m: m.load_power_tfr_average()):
         for pw in powers:
             if pw.nave != 0:
-                if pw.comment in trial_dict:
-                    trial_dict[pw.comment].append(pw)
-                else:
-                    trial_dict.update({pw.comment: [pw]})
+                if pw.comment not in averages:
+                    averages[pw.comment] = ChannelAverage()
+                averages[pw.comment].add(pw)
             else:
-                print(f"{pw.comment} for {name} got nave=0")
+                print(f"{pw.comment} for {meeg.name} got nave=0")
 
     ga_dict = dict()
-    for trial in trial_dict:
-        if len(trial_dict[trial]) != 0:
-            # Make sure, all have the same number of channels
-            commons = set()
-            for pw in trial_dict[trial]:
-                if len(commons) == 0:
-                    for c in pw.ch_names:
-                        commons.add(c)
-                commons = commons & set(pw.ch_names)
-            print(f"{trial}:Reducing all n_channels to {len(commons)}")
-            for idx, pw in enumerate(trial_dict[trial]):
-                trial_dict[trial][idx] = pw.pick(list(commons))
-
-            ga = mne.grand_average(
-                trial_dict[trial], interpolate_bads=True, drop_bads=True
-            )
-            ga.comment = trial
-            ga_dict[trial] = ga
+    for trial, average in averages.items():
+        # The average is reduced to the channels common to all powers
+        print(f"{trial}:Reducing all n_channels to {len(average.ch_names)}")
+        ga = average.get_average(drop_bads=True)
+        ga.comment = trial
+        ga_dict[trial] = ga
 
     group.save_ga_tfr(ga_dict)
 
@@ -1194,7 +1172,7 @@ def prepare_bem(fsmri, bem_spacing, bem_conductivity):
 def morph_fsmri(meeg, morph_to):
     if meeg.fsmri.name != morph_to:
         forward = meeg.load_forward()
-        fsmri_to = FSMRI(morph_to, meeg.ct)
+        fsmri_to = meeg.ct.get_fsmri(morph_to)
         morph = mne.compute_source_morph(
             forward["src"],
             subject_from=meeg.fsmri.name,
@@ -1310,18 +1288,136 @@ def create_inverse_operator(meeg):
     meeg.save_inverse_operator(inverse_operator)
 
 
-def source_estimate(meeg, inverse_method, pick_ori, lambda2):
+def _get_inverse_kernel(info, prepared_inverse, lambda2, method, pick_ori):
+    # The inverse is linear in the data (except when combining free orientations),
+    # so applying it to the identity gives the imaging kernel
+    # (for all channels in info, with zeros for channels not in the inverse)
+    identity = mne.EvokedArray(np.eye(len(info["ch_names"])), info)
+    stc = mne.minimum_norm.apply_inverse(
+        identity,
+        prepared_inverse,
+        lambda2,
+        method,
+        pick_ori,
+        prepared=True,
+        verbose="error",
+    )
+
+    return stc.data, stc.vertices
+
+
+def _get_label_weights(vertices, labels, src, mode):
+    # Weights to extract label time courses (mean or mean_flip)
+    # from data of source estimates with vertices
+    weights = np.zeros((len(labels), sum([len(v) for v in vertices])))
+    for idx, label in enumerate(labels):
+        hemi_idx = 1 if label.hemi == "rh" else 0
+        label_vertices = np.intersect1d(vertices[hemi_idx], label.vertices)
+        rows = np.searchsorted(vertices[hemi_idx], label_vertices)
+        rows += len(vertices[0]) if hemi_idx == 1 else 0
+        if len(rows) == 0:
+            raise ValueError(f"No vertices of {label.name} in the source space")
+        label_weights = np.full(len(rows), 1 / len(rows))
+        if mode == "mean_flip":
+            # Compute the sign-flip only for the vertices in the kernel
+            # (the forward-solution may exclude vertices of the source space)
+            used_label = mne.Label(label_vertices, hemi=label.hemi)
+            label_weights *= mne.label_sign_flip(used_label, src)
+        weights[idx, rows] = label_weights
+
+    return weights
+
+
+def _can_use_kernel(kernels, labels, extract_mode):
+    # Label time courses can only be computed from kernels (of surface source
+    # estimates with one value per vertex) with linear extraction-modes
+    return (
+        kernels is not None
+        and extract_mode in ["auto", "mean", "mean_flip"]
+        and all([label.hemi in ["lh", "rh"] for label in labels])
+        and all(
+            [
+                len(k["vertices"]) == 2
+                and k["kernel"].ndim == 2
+                and k["kernel"].shape[0] == sum([len(v) for v in k["vertices"]])
+                for k in kernels.values()
+            ]
+        )
+    )
+
+
+def source_estimate(meeg, inverse_method, pick_ori, lambda2, store_inverse_kernel):
     inverse_operator = meeg.load_inverse_operator()
-    evokeds = meeg.load_evokeds()
+    evokeds = [ev for ev in meeg.load_evokeds() if ev.comment in meeg.sel_trials]
+
+    # The kernel gives the source estimates only for one (fixed or normal)
+    # orientation, for free orientations they are combined non-linearly
+    fixed_ori = inverse_operator["source_ori"] == FIFF.FIFFV_MNE_FIXED_ORI
+    if store_inverse_kernel and not (
+        pick_ori == "normal" or (pick_ori is None and fixed_ori)
+    ):
+        logger().warning(
+            "The imaging kernel can only be stored for fixed orientations "
+            'or pick_ori="normal"'
+        )
+        store_inverse_kernel = False
+
+    # Evokeds with the same averages share the prepared inverse operator
+    evoked_groups = dict()
+    for evoked in evokeds:
+        key = (evoked.nave, tuple(evoked.ch_names))
+        evoked_groups.setdefault(key, list()).append(evoked)
 
     stcs = dict()
-    for evoked in [ev for ev in evokeds if ev.comment in meeg.sel_trials]:
-        stc = mne.minimum_norm.apply_inverse(
-            evoked, inverse_operator, lambda2, method=inverse_method, pick_ori=pick_ori
+    kernels = dict()
+    for (nave, _), group_evokeds in evoked_groups.items():
+        prepared_inverse = mne.minimum_norm.prepare_inverse_operator(
+            inverse_operator, nave, lambda2, inverse_method
         )
-        stcs.update({evoked.comment: stc})
+        # Apply the inverse to the concatenated evokeds at once
+        info = group_evokeds[0].info
+        group_evoked = mne.EvokedArray(
+            np.concatenate([ev.data for ev in group_evokeds], axis=1), info, nave=nave
+        )
+        group_stc = mne.minimum_norm.apply_inverse(
+            group_evoked,
+            prepared_inverse,
+            lambda2,
+            method=inverse_method,
+            pick_ori=pick_ori,
+            prepared=True,
+        )
+        start = 0
+        for evoked in group_evokeds:
+            stop = start + len(evoked.times)
+            stcs[evoked.comment] = group_stc.__class__(
+                group_stc.data[..., start:stop],
+                group_stc.vertices,
+                evoked.tmin,
+                group_stc.tstep,
+                group_stc.subject,
+            )
+            start = stop
+
+        if store_inverse_kernel:
+            kernel, vertices = _get_inverse_kernel(
+                info, prepared_inverse, lambda2, inverse_method, pick_ori
+            )
+            # The kernel is stored once for all evokeds of the group
+            group_kernel = {
+                "kernel": kernel,
+                "vertices": vertices,
+                "ch_names": info["ch_names"],
+            }
+            for evoked in group_evokeds:
+                kernels[evoked.comment] = group_kernel
 
     meeg.save_source_estimates(stcs)
+    if store_inverse_kernel:
+        meeg.save_inverse_kernels(kernels)
+    else:
+        # Remove kernels from previous runs which don't fit to the new stcs
+        meeg.remove_path("inverse_kernels")
 
 
 def label_time_course(meeg, target_labels, extract_mode):
@@ -1330,20 +1426,38 @@ def label_time_course(meeg, target_labels, extract_mode):
             "No labels selected for label time course extraction. "
             "Please select at least one label."
         )
-    stcs = meeg.load_source_estimates()
     src = meeg.fsmri.load_source_space()
     labels = meeg.fsmri.get_labels(target_labels)
 
+    # Use the imaging kernels from source_estimate if available
+    try:
+        kernels = meeg.load_inverse_kernels()
+    except (OSError, FileNotFoundError):
+        kernels = None
+
     ltc_dict = dict()
 
-    for trial in stcs:
-        ltc_dict[trial] = dict()
-        times = stcs[trial].times
-        for label in labels:
-            ltc = stcs[trial].extract_label_time_course(label, src, mode=extract_mode)[
-                0
-            ]
-            ltc_dict[trial][label.name] = np.vstack((ltc, times))
+    if _can_use_kernel(kernels, labels, extract_mode):
+        mode = "mean" if extract_mode == "mean" else "mean_flip"
+        evokeds = {ev.comment: ev for ev in meeg.load_evokeds()}
+        for trial, kernel in kernels.items():
+            ltc_dict[trial] = dict()
+            evoked = evokeds[trial]
+            weights = _get_label_weights(kernel["vertices"], labels, src, mode)
+            data = evoked.copy().pick(kernel["ch_names"]).data
+            ltcs = np.dot(np.dot(weights, kernel["kernel"]), data)
+            for label, ltc in zip(labels, ltcs):
+                ltc_dict[trial][label.name] = np.vstack((ltc, evoked.times))
+    else:
+        stcs = meeg.load_source_estimates()
+        for trial in stcs:
+            ltc_dict[trial] = dict()
+            times = stcs[trial].times
+            for label in labels:
+                ltc = stcs[trial].extract_label_time_course(
+                    label, src, mode=extract_mode
+                )[0]
+                ltc_dict[trial][label.name] = np.vstack((ltc, times))
 
     meeg.save_ltc(ltc_dict)
 
@@ -1351,8 +1465,79 @@ def label_time_course(meeg, target_labels, extract_mode):
 # Todo: Make mixed-norm more customizable
 
 
-def mixed_norm_estimate(meeg, pick_ori, inverse_method):
-    evokeds = meeg.load_evokeds()
+def _make_mixn_stc(dipoles, forward, pick_ori, tmin, tstep, n_times):
+    # The dipoles contain the complete mixed-norm solution (amplitudes and
+    # orientations), so the source estimate can be made from them
+    # like in mne.inverse_sparse.mixed_norm without solving again
+    src = forward["src"]
+    vector = pick_ori == "vector" and not is_fixed_orient(forward)
+    active_idx = np.array(
+        [
+            np.where(np.all(forward["source_rr"] == dip.pos[0], axis=1))[0][0]
+            for dip in dipoles
+        ],
+        dtype=int,
+    )
+    vertices = list()
+    n_points_so_far = 0
+    for this_src in src:
+        n_points = len(this_src["vertno"])
+        this_idx = active_idx[
+            (n_points_so_far <= active_idx) & (active_idx < n_points_so_far + n_points)
+        ]
+        vertices.append(this_src["vertno"][this_idx - n_points_so_far])
+        n_points_so_far += n_points
+
+    if vector:
+        # Dipole-orientations are already in head-coordinates
+        data = np.array([dip.amplitude * dip.ori.T for dip in dipoles])
+        data = data.reshape((-1, 3, n_times))
+    else:
+        # Amplitudes are signed for fixed and the norm for free orientations
+        data = np.array([dip.amplitude for dip in dipoles]).reshape((-1, n_times))
+
+    if src.kind == "surface":
+        klass = mne.VectorSourceEstimate if vector else mne.SourceEstimate
+    elif src.kind == "mixed":
+        klass = mne.MixedVectorSourceEstimate if vector else mne.MixedSourceEstimate
+    else:
+        klass = mne.VolVectorSourceEstimate if vector else mne.VolSourceEstimate
+
+    return klass(data, vertices, tmin, tstep, src[0]["subject_his_id"])
+
+
+def _mixed_norm_trial(evoked, forward, noise_cov, weights, pick_ori):
+    alpha = 30  # regularization parameter between 0 and 100 (100 is high)
+    n_mxne_iter = 10  # if > 1 use L0.5/L2 reweighted mixed norm solver
+    # if n_mxne_iter > 1 dSPM weighting can be avoided.
+    mixn_dipoles, dip_residual = mne.inverse_sparse.mixed_norm(
+        evoked,
+        forward,
+        noise_cov,
+        alpha,
+        maxit=3000,
+        tol=1e-4,
+        active_set_size=10,
+        debias=True,
+        weights=weights,
+        n_mxne_iter=n_mxne_iter,
+        return_residual=True,
+        return_as_dipoles=True,
+    )
+    mixn_stc = _make_mixn_stc(
+        mixn_dipoles,
+        forward,
+        pick_ori,
+        evoked.times[0],
+        1.0 / evoked.info["sfreq"],
+        len(evoked.times),
+    )
+
+    return mixn_dipoles, mixn_stc
+
+
+def mixed_norm_estimate(meeg, pick_ori, inverse_method, n_jobs):
+    evokeds = [ev for ev in meeg.load_evokeds() if ev.comment in meeg.sel_trials]
     forward = meeg.load_forward()
     noise_cov = meeg.load_noise_covariance()
     inv_op = meeg.load_inverse_operator()
@@ -1370,45 +1555,19 @@ def mixed_norm_estimate(meeg, pick_ori, inverse_method):
                 evoked, inv_op, lambda2, method="dSPM"
             )
 
+    # Solve the trials in parallel
+    parallel, run_trial, _ = mne.parallel.parallel_func(
+        _mixed_norm_trial, get_n_jobs(n_jobs)
+    )
+    results = parallel(
+        run_trial(evoked, forward, noise_cov, stcs[evoked.comment], pick_ori)
+        for evoked in evokeds
+    )
+
     mixn_dips = dict()
     mixn_stcs = dict()
-
-    for evoked in [ev for ev in evokeds if ev.comment in meeg.sel_trials]:
-        alpha = 30  # regularization parameter between 0 and 100 (100 is high)
-        n_mxne_iter = 10  # if > 1 use L0.5/L2 reweighted mixed norm solver
-        # if n_mxne_iter > 1 dSPM weighting can be avoided.
-        trial = evoked.comment
-        mixn_dipoles, dip_residual = mne.inverse_sparse.mixed_norm(
-            evoked,
-            forward,
-            noise_cov,
-            alpha,
-            maxit=3000,
-            tol=1e-4,
-            active_set_size=10,
-            debias=True,
-            weights=stcs[trial],
-            n_mxne_iter=n_mxne_iter,
-            return_residual=True,
-            return_as_dipoles=True,
-        )
-        mixn_dips[trial] = mixn_dipoles
-
-        mixn_stc, residual = mne.inverse_sparse.mixed_norm(
-            evoked,
-            forward,
-            noise_cov,
-            alpha,
-            maxit=3000,
-            tol=1e-4,
-            active_set_size=10,
-            debias=True,
-            weights=stcs[trial],
-            n_mxne_iter=n_mxne_iter,
-            return_residual=True,
-            return_as_dipoles=False,
-            pick_ori=pick_ori,
-        )
+    for evoked, (mixn_dipoles, mixn_stc) in zip(evokeds, results):
+        mixn_dips[evoked.comment] = mixn_dipoles
         mixn_stcs[evoked.comment] = mixn_stc
 
     meeg.save_mixn_dipoles(mixn_dips)
@@ -1419,7 +1578,33 @@ def mixed_norm_estimate(meeg, pick_ori, inverse_method):
 #  (better responsivness of GUI during fit, when running in QThread)
 
 
-def ecd_fit(meeg, ecd_times, ecd_positions, ecd_orientations, t_epoch):
+def _fit_ecd(evoked, noise_covariance, bem, trans, pos, ori, n_jobs):
+    start_time = time.perf_counter()
+    if pos:
+        dipole, residual = mne.fit_dipole(
+            evoked,
+            noise_covariance,
+            bem,
+            trans=trans,
+            min_dist=3.0,
+            n_jobs=n_jobs,
+            pos=pos,
+            ori=ori,
+        )
+    else:
+        dipole, residual = mne.fit_dipole(
+            evoked,
+            noise_covariance,
+            bem,
+            trans=trans,
+            min_dist=3.0,
+            n_jobs=n_jobs,
+        )
+
+    return dipole, time.perf_counter() - start_time
+
+
+def ecd_fit(meeg, ecd_times, ecd_positions, ecd_orientations, t_epoch, n_jobs):
     try:
         ecd_time = ecd_times[meeg.name]
     except KeyError:
@@ -1429,16 +1614,14 @@ def ecd_fit(meeg, ecd_times, ecd_positions, ecd_orientations, t_epoch):
             f" Dipole-Times: 0-{t_epoch[1]}"
         )
 
-    evokeds = meeg.load_evokeds()
+    evokeds = [ev for ev in meeg.load_evokeds() if ev.comment in meeg.sel_trials]
+    # Loaded once for all fits
     noise_covariance = meeg.load_noise_covariance()
     bem = meeg.fsmri.load_bem_solution()
     trans = meeg.load_transformation()
 
-    ecd_dips = dict()
-
+    fits = list()
     for evoked in evokeds:
-        trial = evoked.comment
-        ecd_dips[trial] = dict()
         for dip in ecd_time:
             tmin, tmax = ecd_time[dip]
             copy_evoked = evoked.copy().crop(tmin, tmax)
@@ -1454,29 +1637,31 @@ def ecd_fit(meeg, ecd_times, ecd_positions, ecd_orientations, t_epoch):
                     f" assigned, sequential fitting and free orientation "
                     "used."
                 )
+            fits.append(
+                (evoked.comment, dip, copy_evoked, ecd_position, ecd_orientation)
+            )
 
-            if ecd_position:
-                dipole, residual = mne.fit_dipole(
-                    copy_evoked,
-                    noise_covariance,
-                    bem,
-                    trans=trans,
-                    min_dist=3.0,
-                    n_jobs=4,
-                    pos=ecd_position,
-                    ori=ecd_orientation,
-                )
-            else:
-                dipole, residual = mne.fit_dipole(
-                    copy_evoked,
-                    noise_covariance,
-                    bem,
-                    trans=trans,
-                    min_dist=3.0,
-                    n_jobs=4,
-                )
+    # Distribute the jobs over the fits and use the rest inside each fit
+    n_jobs = get_n_jobs(n_jobs)
+    n_fit_jobs = max(min(n_jobs, len(fits)), 1)
+    parallel, run_fit, _ = mne.parallel.parallel_func(_fit_ecd, n_fit_jobs)
+    results = parallel(
+        run_fit(
+            copy_evoked,
+            noise_covariance,
+            bem,
+            trans,
+            ecd_position,
+            ecd_orientation,
+            max(n_jobs // n_fit_jobs, 1),
+        )
+        for _, _, copy_evoked, ecd_position, ecd_orientation in fits
+    )
 
-            ecd_dips[trial][dip] = dipole
+    ecd_dips = dict()
+    for (trial, dip, *_), (dipole, fit_time) in zip(fits, results):
+        logger().info(f"Fitted {dip} for {trial} of {meeg.name} in {fit_time:.2f} s")
+        ecd_dips.setdefault(trial, dict())[dip] = dipole
 
     meeg.save_ecd(ecd_dips)
 
@@ -1526,32 +1711,33 @@ def src_connectivity(
         )
 
     con_dict = dict()
+    label_kernel = None
 
     for trial, epoch in meeg.get_trial_epochs():
         con_dict[trial] = dict()
         epochs = epoch
 
+        # Compute the inverse once (with nave=1 as for single epochs)
+        if label_kernel is None:
+            prepared_inverse = mne.minimum_norm.prepare_inverse_operator(
+                inverse_operator, 1, lambda2, inverse_method
+            )
+            kernel, vertices = _get_inverse_kernel(
+                epochs.info, prepared_inverse, lambda2, inverse_method, "normal"
+            )
+            weights = _get_label_weights(vertices, labels, src, "mean_flip")
+            label_kernel = np.dot(weights, kernel)
+
         # Crop if necessary
         if con_time_window is not None:
             epochs = epochs.copy().crop(
                 tmin=con_time_window[0], tmax=con_time_window[1]
             )
 
-        # Compute inverse solution and for each epoch.
-        # By using "return_generator=True" stcs will be a generator object
-        # instead of a list.
-        stcs = mne.minimum_norm.apply_inverse_epochs(
-            epochs,
-            inverse_operator,
-            lambda2,
-            inverse_method,
-            pick_ori="normal",
-            return_generator=True,
-        )
-
-        label_ts = mne.extract_label_time_course(
-            stcs, labels, src, mode="mean_flip", return_generator=True
-        )
+        # Project each epoch directly to the label time courses
+        # (with the imaging kernel reduced to the labels)
+        # instead of computing full-resolution source estimates
+        label_ts = (np.dot(label_kernel, ep) for ep in epochs.get_data())
 
         sfreq = info["sfreq"]  # the sampling frequency
         con = mne_connectivity.spectral_connectivity_epochs(
@@ -1579,131 +1765,83 @@ def src_connectivity(
 
 
 def grand_avg_morphed(group, morph_to):
-    # for less memory only import data from stcs and add it to one
-    # stc in the end!!!
-    n_chunks = 8
-    # divide in chunks to save memory
-    fusion_dict = dict()
-    for i in range(0, len(group.group_list), n_chunks):
-        sub_trial_dict = dict()
-        ga_chunk = group.group_list[i : i + n_chunks]
-        print(ga_chunk)
-        for name in ga_chunk:
-            meeg = MEEG(name, group.ct)
-            print(f"Add {name} to grand_average")
-            if morph_to == meeg.fsmri.name:
-                stcs = meeg.load_source_estimates()
-            else:
-                stcs = meeg.load_morphed_source_estimates()
-
-            for trial in stcs:
-                if trial in sub_trial_dict:
-                    sub_trial_dict[trial].append(stcs[trial])
-                else:
-                    sub_trial_dict.update({trial: [stcs[trial]]})
-
-        # Average chunks
-        for trial in sub_trial_dict:
-            if len(sub_trial_dict[trial]) != 0:
-                print(f"grand_average for {trial}-chunk {i}-{i + n_chunks}")
-                sub_trial_average = sub_trial_dict[trial][0].copy()
-                n_subjects = len(sub_trial_dict[trial])
-
-                for trial_index in range(1, n_subjects):
-                    sub_trial_average.data += sub_trial_dict[trial][trial_index].data
-
-                sub_trial_average.data /= n_subjects
-                sub_trial_average.comment = trial
-                if trial in fusion_dict:
-                    fusion_dict[trial].append(sub_trial_average)
-                else:
-                    fusion_dict.update({trial: [sub_trial_average]})
+    def _load_stcs(meeg):
+        if morph_to == meeg.fsmri.name:
+            return meeg.load_source_estimates()
 
-    ga_stcs = dict()
-    for trial in fusion_dict:
-        if len(fusion_dict[trial]) != 0:
-            print(f"grand_average for {group.name}-{trial}")
-            trial_average = fusion_dict[trial][0].copy()
-            n_subjects = len(fusion_dict[trial])
+        return meeg.load_morphed_source_estimates()
 
-            for trial_index in range(1, n_subjects):
-                trial_average.data += fusion_dict[trial][trial_index].data
+    # Only the running average is kept in memory
+    averages = dict()
+    for _, stcs in _iter_group_data(group, _load_stcs):
+        for trial, stc in stcs.items():
+            if trial not in averages:
+                averages[trial] = InstanceAverage()
+            averages[trial].add(stc)
 
-            trial_average.data /= n_subjects
-            trial_average.comment = trial
-
-            ga_stcs[trial] = trial_average
+    ga_stcs = dict()
+    for trial, average in averages.items():
+        print(f"grand_average for {group.name}-{trial}")
+        trial_average = average.get_average()
+        trial_average.comment = trial
+        ga_stcs[trial] = trial_average
 
     group.save_ga_stc(ga_stcs)
 
 
 def grand_avg_ltc(group):
-    ltc_average_dict = dict()
+    averages = dict()
     times = None
-    for name in group.group_list:
-        meeg = MEEG(name, group.ct)
-        print(f"Add {name} to grand_average")
-        ltc_dict = meeg.load_ltc()
+    for _, ltc_dict in _iter_group_data(group, lambda m: m.load_ltc()):
         for trial in ltc_dict:
-            if trial not in ltc_average_dict:
-                ltc_average_dict[trial] = dict()
+            if trial not in averages:
+                averages[trial] = dict()
             for label in ltc_dict[trial]:
                 # First row of array is label-time-course-data,
                 # second row is time-array
-                if label in ltc_average_dict[trial]:
-                    ltc_average_dict[trial][label].append(ltc_dict[trial][label][0])
-                else:
-                    ltc_average_dict[trial][label] = [ltc_dict[trial][label][0]]
+                if label not in averages[trial]:
+                    averages[trial][label] = RunningMean()
+                averages[trial][label].add(ltc_dict[trial][label][0])
                 # Should be the same for each trial and label
                 times = ltc_dict[trial][label][1]
 
     ga_ltc = dict()
-    for trial in ltc_average_dict:
+    for trial in averages:
         ga_ltc[trial] = dict()
-        for label in ltc_average_dict[trial]:
-            if len(ltc_average_dict[trial][label]) != 0:
-                print(f"grand_average for {trial}-{label}")
-                ltc_list = ltc_average_dict[trial][label]
-                average = np.mean(ltc_list, axis=0)
-
-                ga_ltc[trial][label] = np.vstack((average, times))
+        for label, average in averages[trial].items():
+            print(f"grand_average for {trial}-{label}")
+            ga_ltc[trial][label] = np.vstack((average.mean, times))
 
     group.save_ga_ltc(ga_ltc)
 
 
 def grand_avg_connect(group):
-    # Prepare the Average-Dict
-    con_average_dict = dict()
-    for name in group.group_list:
-        meeg = MEEG(name, group.ct)
-        print(f"Add {name} to grand_average")
-        con_dict = meeg.load_connectivity()
+    averages = dict()
+    for _, con_dict in _iter_group_data(group, lambda m: m.load_connectivity()):
         for trial in con_dict:
-            if trial not in con_average_dict:
-                con_average_dict[trial] = dict()
+            if trial not in averages:
+                averages[trial] = dict()
             for con_method, con in con_dict[trial].items():
-                if con_method not in con_average_dict[trial]:
-                    con_average_dict[trial][con_method] = list()
-                con_average_dict[trial][con_method].append(con)
+                if con_method not in averages[trial]:
+                    averages[trial][con_method] = InstanceAverage()
+                averages[trial][con_method].add(con, con.get_data())
 
     ga_con_dict = dict()
-    for trial in con_average_dict:
+    for trial in averages:
         ga_con_dict[trial] = dict()
-        for con_method, con_list in con_average_dict[trial].items():
-            if len(con_list) != 0:
-                print(f"grand_average for {trial}-{con_method}")
-                avg_data = np.mean([con.get_data() for con in con_list], axis=0)
-
-                ga_con = SpectralConnectivity(
-                    data=avg_data,
-                    freqs=con_list[0].freqs,
-                    n_nodes=con_list[0].n_nodes,
-                    names=con_list[0].names,
-                    indices=con_list[0].indices,
-                    method=con_list[0].method,
-                    n_epochs_used=len(con_list),
-                )
-                ga_con_dict[trial][con_method] = ga_con
+        for con_method, average in averages[trial].items():
+            print(f"grand_average for {trial}-{con_method}")
+            template = average.template
+            ga_con = SpectralConnectivity(
+                data=average.mean,
+                freqs=template.freqs,
+                n_nodes=template.n_nodes,
+                names=template.names,
+                indices=template.indices,
+                method=template.method,
+                n_epochs_used=average.n,
+            )
+            ga_con_dict[trial][con_method] = ga_con
 
     group.save_ga_con(ga_con_dict)
 
@@ -7,8 +7,6 @@ Github: https://github.com/marsipu/mne-pipeline-hd
 
 import io
 import json
-import logging
-import multiprocessing
 import sys
 import traceback
 from contextlib import contextmanager
@@ -50,7 +48,12 @@ from qtpy.QtWidgets import (
 
 from mne_pipeline_hd import _object_refs
 from mne_pipeline_hd import extra
-from mne_pipeline_hd.pipeline.pipeline_utils import QS, logger
+from mne_pipeline_hd.pipeline.pipeline_utils import (
+    QS,
+    ExceptionTuple,
+    get_exception_tuple,
+    logger,
+)
 
 # Load theme colors
 theme_color_path = join(str(resources.files(extra)), "color_themes.json")
@@ -82,35 +85,6 @@ def get_std_icon(icon_name):
     return QApplication.instance().style().standardIcon(getattr(QStyle, icon_name))
 
 
-class ExceptionTuple(object):
-    def __init__(self, *args):
-        self._data = [*args]
-
-    def __getitem__(self, idx):
-        return self._data[idx]
-
-    def __setitem__(self, idx, value):
-        self._data[idx] = value
-
-    def __str__(self):
-        return self._data[2]
-
-
-def get_exception_tuple(is_mp=False):
-    traceback.print_exc()
-    exctype, value = sys.exc_info()[:2]
-    traceback_str = traceback.format_exc(limit=-10)
-    # ToDo: Is this doing what it's supposed to do?
-    if is_mp:
-        logger = multiprocessing.get_logger()
-    else:
-        logger = logging.getLogger()
-    logger.error(f"{exctype}: {value}")
-    exc_tuple = ExceptionTuple(exctype, value, traceback_str)
-
-    return exc_tuple
-
-
 class ErrorDialog(QDialog):
     def __init__(self, exception_tuple, parent=None, title=None):
         if parent:
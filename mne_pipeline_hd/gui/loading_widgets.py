@@ -77,93 +77,13 @@ from mne_pipeline_hd.gui.gui_utils import (
 )
 from mne_pipeline_hd.gui.models import AddFilesModel
 from mne_pipeline_hd.gui.parameter_widgets import ComboGui
+from mne_pipeline_hd.pipeline.file_scan import build_file_tables, scan_objects
 from mne_pipeline_hd.pipeline.loading import FSMRI, Group, MEEG
-from mne_pipeline_hd.pipeline.pipeline_utils import compare_filep, QS, logger
-
-
-def index_parser(index, all_items, groups=None):
-    """
-    Parses indices from a index-string in all_items
-
-    Parameters
-    ----------
-    index: str
-        A string which contains information about indices
-    all_items
-        All items
-    Returns
-    -------
-
-    """
-    indices = list()
-    rm = list()
-
-    try:
-        if index == "":
-            return [], []
-        elif "all" in index:
-            if "," in index:
-                splits = index.split(",")
-                for sp in splits:
-                    if "!" in sp and "-" in sp:
-                        x, y = sp.split("-")
-                        x = x[1:]
-                        for n in range(int(x), int(y) + 1):
-                            rm.append(n)
-                    elif "!" in sp:
-                        rm.append(int(sp[1:]))
-                    elif "all" in sp:
-                        for i in range(len(all_items)):
-                            indices.append(i)
-            else:
-                indices = [x for x in range(len(all_items))]
-
-        elif "," in index and "-" in index:
-            z = index.split(",")
-            for i in z:
-                if "-" in i and "!" not in i:
-                    x, y = i.split("-")
-                    for n in range(int(x), int(y) + 1):
-                        indices.append(n)
-                elif "!" not in i:
-                    indices.append(int(i))
-                elif "!" in i and "-" in i:
-                    x, y = i.split("-")
-                    x = x[1:]
-                    for n in range(int(x), int(y) + 1):
-                        rm.append(n)
-                elif "!" in i:
-                    rm.append(int(i[1:]))
-
-        elif "-" in index and "," not in index:
-            x, y = index.split("-")
-            indices = [x for x in range(int(x), int(y) + 1)]
-
-        elif "," in index and "-" not in index:
-            splits = index.split(",")
-            for sp in splits:
-                if "!" in sp:
-                    rm.append(int(sp))
-                else:
-                    indices.append(int(sp))
-
-        elif groups is not None and index in groups:
-            files = [x for x in all_items if x in groups[index]]
-            indices = [all_items.index(x) for x in files]
-
-        else:
-            if len(all_items) < int(index) or int(index) < 0:
-                indices = []
-            else:
-                indices = [int(index)]
-
-        indices = [i for i in indices if i not in rm]
-        files = np.asarray(all_items)[indices].tolist()
-
-        return files
-
-    except ValueError:
-        return []
+from mne_pipeline_hd.pipeline.pipeline_utils import (
+    index_parser,
+    QS,
+    logger,
+)
 
 
 class RemoveDialog(QDialog):
@@ -1779,68 +1699,23 @@ class FileManagment(QDialog):
     def get_file_tables(self, kind):
         if kind == "MEEG":
             obj_list = self.pr.all_meeg
-            obj_pd = self.pd_meeg
-            obj_pd_time = self.pd_meeg_time
-            obj_pd_size = self.pd_meeg_size
         elif kind == "FSMRI":
             obj_list = self.pr.all_fsmri
-            obj_pd = self.pd_fsmri
-            obj_pd_time = self.pd_fsmri_time
-            obj_pd_size = self.pd_fsmri_size
         else:
             obj_list = self.pr.all_groups
-            obj_pd = self.pd_group
-            obj_pd_time = self.pd_group_time
-            obj_pd_size = self.pd_group_size
         logger().debug(f"Loading {kind}")
 
+        results = scan_objects(self.ct, kind, obj_list)
+        tables = build_file_tables(results, obj_list)
         for obj_name in obj_list:
-            if kind == "MEEG":
-                obj = MEEG(obj_name, self.ct)
-            elif kind == "FSMRI":
-                obj = FSMRI(obj_name, self.ct)
-            else:
-                obj = Group(obj_name, self.ct)
+            self.param_results[obj_name] = results[obj_name]["param_results"]
 
-            obj.get_existing_paths()
-            self.param_results[obj_name] = dict()
-
-            for path_type in obj.existing_paths:
-                if len(obj.existing_paths[path_type]) > 0:
-                    obj_pd.loc[obj_name, path_type] = "exists"
-                    obj_pd_size.loc[obj_name, path_type] = 0
-
-                    for path in obj.existing_paths[path_type]:
-                        try:
-                            # Add Time
-                            # Last entry in TIME should be the most recent one
-                            obj_pd_time.loc[obj_name, path_type] = obj.file_parameters[
-                                Path(path).name
-                            ]["TIME"]
-                            # Add Size (accumulate, if there are several files)
-                            obj_pd_size.loc[obj_name, path_type] += obj.file_parameters[
-                                Path(path).name
-                            ]["SIZE"]
-                        except KeyError:
-                            pass
-
-                        # Compare all parameters from last run to now
-                        result_dict = compare_filep(obj, path, verbose=False)
-                        # Store parameter-conflicts for later retrieval
-                        self.param_results[obj_name][path_type] = result_dict
-
-                        # Change status of path_type
-                        # from object if there are conflicts
-                        for parameter in result_dict:
-                            if isinstance(result_dict[parameter], tuple):
-                                if result_dict[parameter][2]:
-                                    obj_pd.loc[obj_name, path_type] = (
-                                        "critical_conflict"
-                                    )
-                                else:
-                                    obj_pd.loc[obj_name, path_type] = (
-                                        "possible_conflict"
-                                    )
+        if kind == "MEEG":
+            self.pd_meeg, self.pd_meeg_time, self.pd_meeg_size = tables
+        elif kind == "FSMRI":
+            self.pd_fsmri, self.pd_fsmri_time, self.pd_fsmri_size = tables
+        else:
+            self.pd_group, self.pd_group_time, self.pd_group_size = tables
 
     def open_prog_dlg(self):
         # Create Progress-Dialog
@@ -1855,9 +1730,8 @@ class FileManagment(QDialog):
         self.prog_bar.setValue(self.load_prog)
         if self.load_prog == 3:
             self.prog_dlg.close()
-            self.meeg_table.content_changed()
-            self.fsmri_table.content_changed()
-            self.group_table.content_changed()
+            # The tables were replaced by the scan
+            self.mode_changed(self.mode_cmbx.currentText())
 
     def thread_error(self, err):
         self.thread_finished(None)
@@ -1884,11 +1758,11 @@ class FileManagment(QDialog):
     def init_ui(self):
         layout = QVBoxLayout()
 
-        mode_cmbx = QComboBox()
-        mode_cmbx.addItems(["Existence", "Time", "Size"])
-        mode_cmbx.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
-        mode_cmbx.currentTextChanged.connect(self.mode_changed)
-        layout.addWidget(mode_cmbx, alignment=Qt.AlignLeft)
+        self.mode_cmbx = QComboBox()
+        self.mode_cmbx.addItems(["Existence", "Time", "Size"])
+        self.mode_cmbx.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
+        self.mode_cmbx.currentTextChanged.connect(self.mode_changed)
+        layout.addWidget(self.mode_cmbx, alignment=Qt.AlignLeft)
 
         tab_widget = QTabWidget()
 
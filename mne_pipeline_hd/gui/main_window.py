@@ -418,12 +418,18 @@ class MainWindow(QMainWindow):
         #                         ' with separate processes, '
         #                         'but has a few limitations',
         #             default=0, return_integer=True))
-        # self.toolbar.addWidget(BoolGui(data=self.ct.settings, name='overwrite',
-        #                                alias='Overwrite',
-        #                                description='Check to overwrite files'
-        #                                            ' even if their parameters '
-        #                                            'where unchanged.',
-        #                                groupbox_layout=False))
+        self.toolbar.addWidget(
+            BoolGui(
+                data=self.ct.settings,
+                name="overwrite",
+                alias="Overwrite",
+                description="Check to run all steps again, "
+                "even if their outputs are up-to-date\n"
+                "(the parameters are unchanged and the outputs "
+                "are newer than the inputs).",
+                groupbox_layout=False,
+            )
+        )
         self.toolbar.addWidget(
             BoolGui(
                 data=self.ct.settings,
@@ -2242,6 +2242,29 @@ class SettingsDlg(QDialog):
                     "max_val": 5000,
                 },
             },
+            "use_cache": {
+                "gui_type": "BoolGui",
+                "data_type": "Settings",
+                "gui_kwargs": {
+                    "alias": "Use Result-Cache",
+                    "description": "Store the outputs of functions in a cache "
+                    "(in the project-folder) and reuse them, if a function "
+                    "runs again with the same inputs and parameters "
+                    "(e.g. in another Parameter-Preset).",
+                },
+            },
+            "load_modes": {
+                "gui_type": "DictGui",
+                "data_type": "Settings",
+                "gui_kwargs": {
+                    "alias": "Load-Modes",
+                    "description": "Set how data-types are loaded: "
+                    '"preload" loads the data into memory, '
+                    '"memmap" into a memory-mapped file (only raw-data) and '
+                    '"lazy" reads it from disk when needed '
+                    "(e.g. to lower the memory-usage for large recordings).",
+                },
+            },
             "enable_cuda": {
                 "gui_type": "BoolGui",
                 "data_type": "QSettings",
@@ -2254,17 +2277,34 @@ class SettingsDlg(QDialog):
                     "return_integer": True,
                 },
             },
-            "save_ram": {
-                "gui_type": "BoolGui",
+            "ram_cache_mb": {
+                "gui_type": "IntGui",
                 "data_type": "QSettings",
                 "gui_kwargs": {
-                    "alias": "Save RAM",
-                    "description": "Set to True on low RAM-Machines to avoid"
-                    " the process to be killed by the OS due "
-                    "to low Memory (with leaving it off, "
-                    "the pipeline goes a bit faster, because "
-                    "the data can be saved in memory).",
-                    "return_integer": True,
+                    "alias": "RAM-Cache (MB)",
+                    "description": "Set the size of the memory (in MB) to keep "
+                    "loaded data in (e.g. for repeated loads in the pipeline). "
+                    "The least recently used data is removed first, set lower "
+                    "on low RAM-Machines to avoid the process to be killed "
+                    "by the OS due to low Memory (0 to disable).",
+                    "min_val": 0,
+                    "max_val": 1000000,
+                    "special_value_text": "Off",
+                },
+            },
+            "n_prefetch": {
+                "gui_type": "IntGui",
+                "data_type": "QSettings",
+                "gui_kwargs": {
+                    "alias": "Prefetch Group-Items",
+                    "description": "Set how many members of a group are loaded "
+                    "ahead in background threads, while group-functions "
+                    "(e.g. grand-averages) work on the current member "
+                    "(0 to disable, each prefetched member needs additional "
+                    "memory).",
+                    "min_val": 0,
+                    "max_val": 100,
+                    "special_value_text": "Off",
                 },
             },
             "fs_path": {
@@ -5,7 +5,6 @@ License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
 from functools import partial
-from importlib import import_module
 from os.path import join, isfile
 
 from matplotlib import pyplot as plt
@@ -43,7 +42,7 @@ except ImportError:
 from mne_pipeline_hd import _object_refs
 from mne_pipeline_hd.gui.base_widgets import SimpleList, CheckList
 from mne_pipeline_hd.gui.gui_utils import Worker, set_ratio_geometry
-from mne_pipeline_hd.pipeline.function_utils import get_arguments
+from mne_pipeline_hd.pipeline.function_utils import get_arguments, get_func
 from mne_pipeline_hd.pipeline.loading import MEEG, FSMRI, Group
 
 
@@ -293,10 +292,8 @@ class PlotViewSelection(QDialog):
 
                     # Load Matplotlib-Plots
                     if self.interactive_chkbx.isChecked():
-                        # Get module of plot_function
-                        module_name = self.ct.pd_funcs.loc[self.selected_func, "module"]
-                        module = import_module(module_name)
-                        plot_func = getattr(module, self.selected_func)
+                        # Get plot_function
+                        plot_func = get_func(self.selected_func, obj)
 
                         # Get Arguments for Plot-Function
                         keyword_arguments = get_arguments(plot_func, obj)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import numpy as np
+
+
+class RunningMean:
+    """Running mean and variance of equally shaped arrays (Welford's algorithm).
+
+    Only the current mean and the sum of squared deviations are kept,
+    so the memory does not grow with the number of added arrays.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self._m2 = None
+
+    def add(self, data):
+        """Add an array to the running mean."""
+        data = np.asarray(data)
+        if self.mean is None:
+            self.mean = data.astype(np.result_type(data, float), copy=True)
+            self._m2 = np.zeros(data.shape)
+        elif data.shape != self.mean.shape:
+            raise ValueError(
+                f"Data with shape {data.shape} can't be added "
+                f"to a running mean with shape {self.mean.shape}"
+            )
+        else:
+            delta = data - self.mean
+            self.mean += delta / (self.n + 1)
+            # For complex data this accumulates the squared magnitude
+            self._m2 += np.real(delta * np.conj(data - self.mean))
+        self.n += 1
+
+    def take(self, indices, axis=0):
+        """Keep only indices along axis (e.g. to reduce to common channels)."""
+        if self.mean is not None:
+            self.mean = np.take(self.mean, indices, axis=axis)
+            self._m2 = np.take(self._m2, indices, axis=axis)
+
+    @property
+    def variance(self):
+        """The sample variance of the added arrays."""
+        if self.mean is None:
+            return None
+        if self.n < 2:
+            return np.zeros(self._m2.shape)
+
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        """The sample standard-deviation of the added arrays."""
+        variance = self.variance
+
+        return None if variance is None else np.sqrt(variance)
+
+
+class InstanceAverage(RunningMean):
+    """Running mean of the data of MNE-objects (e.g. SourceEstimate).
+
+    The first added object is kept as template for the average.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.template = None
+
+    def add(self, inst, data=None):
+        """Add the data of inst (or data if given) to the running mean."""
+        if self.template is None:
+            self.template = inst
+        super().add(inst.data if data is None else data)
+
+    def get_average(self):
+        """Get a copy of the template with the averaged data."""
+        average = self.template.copy()
+        average.data = self.mean.copy()
+
+        return average
+
+
+class ChannelAverage(InstanceAverage):
+    """Running mean of Evoked or AverageTFR objects, which is reduced
+    to the channels common to all added objects like in mne.grand_average.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ch_names = None
+        self.bads = set()
+
+    def add(self, inst, data=None):
+        """Add the data of inst to the running mean."""
+        if self.ch_names is None:
+            self.ch_names = list(inst.ch_names)
+        else:
+            common = [ch for ch in self.ch_names if ch in inst.ch_names]
+            if len(common) < len(self.ch_names):
+                self.take([self.ch_names.index(ch) for ch in common])
+                self.ch_names = common
+        self.bads.update(inst.info["bads"])
+        picks = [inst.ch_names.index(ch) for ch in self.ch_names]
+        super().add(inst, inst.data[picks])
+
+    def get_average(self, drop_bads=True):
+        """Get the average (nave is the number of added objects).
+
+        Parameters
+        ----------
+        drop_bads : bool
+            If True, drop all channels marked as bad in any added object,
+            otherwise they are marked as bad in the average.
+        """
+        average = self.template.copy().pick(self.ch_names)
+        average.data = self.mean.copy()
+        bads = [ch for ch in self.ch_names if ch in self.bads]
+        if drop_bads:
+            average.info["bads"] = list()
+            if len(bads) > 0:
+                average.drop_channels(bads)
+        else:
+            average.info["bads"] = bads
+        average.nave = self.n
+
+        return average
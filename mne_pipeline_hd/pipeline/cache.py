@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from datetime import datetime
+from os import makedirs
+from os.path import abspath, isdir, isfile, join
+from pathlib import Path
+
+from mne_pipeline_hd.pipeline.pipeline_utils import (
+    TypedJSONEncoder,
+    logger,
+    type_json_hook,
+)
+from mne_pipeline_hd.pipeline.scheduler import (
+    get_data_paths,
+    get_existing_files,
+    get_input_objects,
+)
+
+# Project-attributes which don't change the results of a function
+ignored_pr_attributes = ["plot_files"]
+
+
+def get_cache_path(obj):
+    """Get the folder of the result-cache for the project of obj."""
+    return join(obj.pr.project_path, "_cache")
+
+
+def _hash_string(string):
+    return hashlib.sha256(string.encode("utf-8")).hexdigest()
+
+
+def _get_memo_path(cache_path, file_path):
+    path_hash = hashlib.sha1(abspath(file_path).encode("utf-8")).hexdigest()
+    return join(cache_path, "hashes", f"{path_hash}.json")
+
+
+def set_file_hash(cache_path, file_path, file_hash):
+    """Store the hash for the current version (size and mtime) of a file."""
+    memo_path = _get_memo_path(cache_path, file_path)
+    makedirs(Path(memo_path).parent, exist_ok=True)
+    stat = os.stat(file_path)
+    memo = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": file_hash}
+    tmp_path = f"{memo_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(memo, file)
+    os.replace(tmp_path, memo_path)
+
+
+def get_file_hash(cache_path, file_path):
+    """Get the content-hash of a file (computed only once
+    for each version (size and mtime) of the file)."""
+    stat = os.stat(file_path)
+    try:
+        with open(_get_memo_path(cache_path, file_path), "r") as file:
+            memo = json.load(file)
+        if memo["size"] == stat.st_size and memo["mtime"] == stat.st_mtime_ns:
+            return memo["hash"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(2**20), b""):
+            sha.update(chunk)
+    file_hash = sha.hexdigest()
+    set_file_hash(cache_path, file_path, file_hash)
+
+    return file_hash
+
+
+def _is_cacheable(obj, saves):
+    # The outputs have to be files of obj with known paths
+    if not saves:
+        return False
+    for io_type, data_type in saves:
+        if io_type != type(obj).__name__:
+            return False
+        paths = get_data_paths(obj, data_type)
+        if not paths or any([isdir(p) for p in paths]):
+            return False
+
+    return True
+
+
+def get_step_key(obj, func_name, loads, saves, pr_state):
+    """Get the key of a step for the result-cache, which is a hash
+    of the input-files, the critical parameters (func_args)
+    and the source-code of the function.
+
+    Parameters
+    ----------
+    obj : MEEG | FSMRI | Group
+        The object of the step.
+    func_name : str
+        The name of the function of the step.
+    loads : set | None
+        The loaded data-types from get_function_io.
+    saves : set | None
+        The saved data-types from get_function_io.
+    pr_state : dict
+        The project-entries of obj (from get_object_pr_state).
+
+    Returns
+    -------
+    key : str | None
+        The key or None if the step can't be cached.
+    """
+    if loads is None or not _is_cacheable(obj, saves):
+        return None
+    cache_path = get_cache_path(obj)
+
+    function_entry = obj.ct.get_function_registry()[func_name]
+    critical_params = function_entry.func_args
+    func = function_entry.func
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = ""
+
+    inputs = list()
+    for io_type, data_type in sorted(loads):
+        for input_obj in get_input_objects(obj, io_type):
+            for path in get_data_paths(input_obj, data_type) or list():
+                file_hashes = [
+                    get_file_hash(cache_path, f) for f in get_existing_files(path)
+                ]
+                inputs.append([io_type, input_obj.name, data_type, file_hashes])
+
+    key_data = {
+        "function": func_name,
+        "source": _hash_string(source),
+        "name": obj.name,
+        "parameters": {p: obj.pa[p] for p in critical_params if p in obj.pa},
+        "add_kwargs": obj.pr.add_kwargs.get(func_name, dict()),
+        "project": {
+            attr: value
+            for attr, value in pr_state.items()
+            if attr not in ignored_pr_attributes
+        },
+        "inputs": inputs,
+    }
+    key_string = json.dumps(key_data, cls=TypedJSONEncoder, sort_keys=True)
+
+    return _hash_string(key_string)
+
+
+def _link_file(src, dst):
+    # Hard-links share the data without copying (if the filesystem allows)
+    if isfile(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def store_outputs(obj, key, saves, pr_state):
+    """Store the outputs of a step in the result-cache under key.
+
+    Parameters
+    ----------
+    obj : MEEG | FSMRI | Group
+        The object of the step.
+    key : str
+        The key from get_step_key.
+    saves : set
+        The saved data-types from get_function_io.
+    pr_state : dict
+        The project-entries of obj after the step (from get_object_pr_state),
+        which are restored together with the outputs.
+    """
+    entry_path = join(get_cache_path(obj), "results", key)
+    if isdir(entry_path):
+        return
+    tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+    makedirs(tmp_path, exist_ok=True)
+
+    files = list()
+    for _, data_type in sorted(saves):
+        for idx, path in enumerate(get_data_paths(obj, data_type)):
+            for file in get_existing_files(path):
+                suffix = file[len(path) :]
+                cached_name = f"{data_type}-{idx}{suffix}"
+                _link_file(file, join(tmp_path, cached_name))
+                file_params = obj.file_parameters.get(Path(file).name, dict())
+                file_hash = get_file_hash(get_cache_path(obj), file)
+                files.append(
+                    [data_type, idx, suffix, cached_name, file_params, file_hash]
+                )
+    if len(files) == 0:
+        shutil.rmtree(tmp_path)
+        return
+    # Plot-files are saved for each Parameter-Preset and not stored in the cache
+    project = {
+        attr: value
+        for attr, value in pr_state.items()
+        if attr not in ignored_pr_attributes
+    }
+
+    with open(join(tmp_path, "meta.json"), "w") as file:
+        json.dump(
+            {"files": files, "project": project}, file, cls=TypedJSONEncoder, indent=4
+        )
+    try:
+        os.rename(tmp_path, entry_path)
+    except OSError:
+        # Another process stored the same outputs
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def restore_outputs(obj, func_name, key):
+    """Restore the outputs of a step from the result-cache
+    together with the project-entries of obj after the step
+    (e.g. bad channels or excluded ICA-components).
+
+    Returns
+    -------
+    restored : bool
+        True if the outputs for key were found in the cache.
+    """
+    cache_path = get_cache_path(obj)
+    entry_path = join(cache_path, "results", key)
+    try:
+        with open(join(entry_path, "meta.json"), "r") as file:
+            meta = json.load(file, object_hook=type_json_hook)
+        files = meta["files"]
+        project = meta["project"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return False
+
+    for data_type, idx, _, cached_name, _, _ in files:
+        paths = get_data_paths(obj, data_type)
+        if not paths or idx >= len(paths) or not isfile(join(entry_path, cached_name)):
+            return False
+
+    file_names = list()
+    for data_type, idx, suffix, cached_name, file_params, file_hash in files:
+        path = get_data_paths(obj, data_type)[idx] + suffix
+        makedirs(Path(path).parent, exist_ok=True)
+        _link_file(join(entry_path, cached_name), path)
+        file_params = file_params.copy()
+        file_params["NAME"] = obj.name
+        file_params["P_PRESET"] = obj.p_preset
+        file_params["TIME"] = str(datetime.now())
+        obj.file_parameters[Path(path).name] = file_params
+        file_names.append(Path(path).name)
+        set_file_hash(cache_path, path, file_hash)
+    obj.save_file_parameter_file(file_names)
+    for attr, value in project.items():
+        getattr(obj.pr, attr)[obj.name] = value
+    logger().info(f"Restored outputs of {func_name} for {obj.name} from cache")
+
+    return True
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import argparse
+
+from mne_pipeline_hd.pipeline.controller import Controller
+from mne_pipeline_hd.pipeline.function_utils import HeadlessRunController
+from mne_pipeline_hd.pipeline.pipeline_utils import index_parser, init_logging, logger
+
+
+def _split_names(names):
+    return [n.strip() for n in names.split(",") if n.strip() != ""]
+
+
+def get_run_parser():
+    """Get the argument-parser for "mne_pipeline_hd run"."""
+    parser = argparse.ArgumentParser(
+        prog="mne_pipeline_hd run",
+        description="Run functions of the pipeline without GUI "
+        "(e.g. on headless cluster-nodes or from cron).",
+    )
+    parser.add_argument(
+        "--home", help="The Home-Path (default: the last used Home-Path)."
+    )
+    parser.add_argument(
+        "--project", help="The project (default: the last selected project)."
+    )
+    parser.add_argument(
+        "--preset", help="The Parameter-Preset (default: the selected preset)."
+    )
+    parser.add_argument(
+        "--meeg",
+        default="",
+        help="The MEEG-files as indices like in the GUI "
+        '(e.g. "1-40", "1,3,5", "all,!2") or the name of a group.',
+    )
+    parser.add_argument(
+        "--fsmri",
+        default="",
+        help="The Freesurfer-MRIs as indices like in the GUI.",
+    )
+    parser.add_argument(
+        "--groups",
+        default="",
+        help='Comma-separated names of groups or "all".',
+    )
+    parser.add_argument(
+        "--functions",
+        required=True,
+        help="Comma-separated names of the functions to run "
+        '(e.g. "filter_data,epoch_raw").',
+    )
+    parser.add_argument(
+        "--progress",
+        choices=["auto", "tqdm", "plain", "none"],
+        default="auto",
+        help='How to display the progress ("auto" uses tqdm only in a terminal).',
+    )
+    parser.add_argument("--debug", action="store_true", help="Show debug-messages.")
+
+    return parser
+
+
+def run_cli(argv=None):
+    """Run functions of the pipeline from the command-line
+    (without importing Qt-Widgets).
+
+    Parameters
+    ----------
+    argv : list of str | None
+        The command-line arguments after "run" (taken from sys.argv if None).
+
+    Returns
+    -------
+    exit_code : int
+        0 if all functions ran without errors, otherwise 1.
+    """
+    parser = get_run_parser()
+    args = parser.parse_args(argv)
+    init_logging(args.debug)
+
+    try:
+        ct = Controller(args.home)
+    except RuntimeError as err:
+        parser.error(str(err))
+    if args.project is not None:
+        # Don't create a new project for a misspelled name
+        if args.project not in ct.projects:
+            parser.error(f"The project {args.project} does not exist in {ct.home_path}")
+        if ct.pr is None or ct.pr.name != args.project:
+            ct.change_project(args.project)
+    elif ct.pr is None:
+        parser.error(f"There is no project in {ct.home_path}")
+
+    # The selection of the command-line is not saved to the project,
+    # which keeps the selection and Parameter-Preset of the GUI
+    previous_selection = {
+        attr: getattr(ct.pr, attr)
+        for attr in ["p_preset", "sel_meeg", "sel_fsmri", "sel_groups", "sel_functions"]
+    }
+
+    if args.preset is not None:
+        if args.preset not in ct.pr.parameters:
+            parser.error(
+                f"The Parameter-Preset {args.preset} does not exist "
+                f"(available: {', '.join(ct.pr.parameters)})"
+            )
+        ct.pr.p_preset = args.preset
+
+    functions = _split_names(args.functions)
+    unknown = [f for f in functions if f not in ct.pd_funcs.index]
+    if len(unknown) > 0:
+        parser.error(f"Unknown functions: {', '.join(unknown)}")
+
+    if args.groups == "all":
+        groups = list(ct.pr.all_groups)
+    else:
+        groups = _split_names(args.groups)
+    unknown = [g for g in groups if g not in ct.pr.all_groups]
+    if len(unknown) > 0:
+        parser.error(f"Unknown groups: {', '.join(unknown)}")
+
+    ct.pr.sel_meeg = (
+        index_parser(args.meeg, ct.pr.all_meeg, ct.pr.all_groups) if args.meeg else []
+    )
+    ct.pr.sel_fsmri = index_parser(args.fsmri, ct.pr.all_fsmri) if args.fsmri else []
+    ct.pr.sel_groups = groups
+    ct.pr.sel_functions = functions
+
+    try:
+        rc = HeadlessRunController(ct, args.progress)
+        if len(rc.all_steps) == 0:
+            logger().warning("No steps to run for the selected objects and functions")
+        else:
+            logger().info(
+                f"Running {len(rc.all_steps)} steps in project {ct.pr.name} "
+                f"with Parameter-Preset {ct.pr.p_preset}"
+            )
+            rc.start()
+    finally:
+        for attr, value in previous_selection.items():
+            setattr(ct.pr, attr, value)
+        # Keep the changes of the functions (e.g. bad channels) in the project
+        ct.pr.save()
+
+    return 1 if len(rc.errors) > 0 else 0
@@ -18,11 +18,14 @@ from os.path import isdir, join
 from pathlib import Path
 
 import mne
-import pandas as pd
 
 from mne_pipeline_hd import functions, extra
-from mne_pipeline_hd.gui.gui_utils import get_user_input_string
+from mne_pipeline_hd.pipeline.function_registry import (
+    FunctionRegistry,
+    read_registry_csv,
+)
 from mne_pipeline_hd.pipeline.legacy import transfer_file_params_to_single_subject
+from mne_pipeline_hd.pipeline.loading import FSMRI
 from mne_pipeline_hd.pipeline.pipeline_utils import QS, logger
 from mne_pipeline_hd.pipeline.project import Project
 
@@ -82,6 +85,9 @@ class Controller:
         self.edu_program_name = edu_program_name
         self.edu_program = None
 
+        # Shared FSMRI-objects (see get_fsmri)
+        self.fsmri_registry = dict()
+
         # Load default settings
         default_path = join(resources.files(extra), "default_settings.json")
         with open(default_path, "r") as file:
@@ -96,22 +102,17 @@ class Controller:
 
         # Pandas-DataFrame for contextual data of basic functions
         # (included with program)
-        self.pd_funcs = pd.read_csv(
-            resources.files(extra) / "functions.csv",
-            sep=";",
-            index_col=0,
-            na_values=[""],
-            keep_default_na=False,
+        # (parsed once for each version of the csv-file)
+        self.pd_funcs = read_registry_csv(
+            resources.files(extra) / "functions.csv", self.registry_cache_path
         )
+        # Pre-parsed functions from pd_funcs (see get_function_registry)
+        self._function_registry = None
 
         # Pandas-DataFrame for contextual data of parameters
         # for basic functions (included with program)
-        self.pd_params = pd.read_csv(
-            resources.files(extra) / "parameters.csv",
-            sep=";",
-            index_col=0,
-            na_values=[""],
-            keep_default_na=False,
+        self.pd_params = read_registry_csv(
+            resources.files(extra) / "parameters.csv", self.registry_cache_path
         )
 
         # Import the basic- and custom-function-modules
@@ -186,7 +187,72 @@ class Controller:
 
         return value
 
+    def __getstate__(self):
+        # The FSMRI-registry is rebuilt in other processes
+        state = self.__dict__.copy()
+        state["fsmri_registry"] = dict()
+        state["_function_registry"] = None
+
+        return state
+
+    @property
+    def registry_cache_path(self):
+        """The folder to cache the parsed csv-files in."""
+        return join(self.home_path, "_cache")
+
+    def get_function_registry(self):
+        """Get the pre-parsed functions from pd_funcs,
+        which are parsed again when pd_funcs was changed.
+
+        Returns
+        -------
+        function_registry : FunctionRegistry
+            The functions by their name.
+        """
+        registry = self._function_registry
+        if registry is None or registry.pd_funcs is not self.pd_funcs:
+            registry = FunctionRegistry(self.pd_funcs)
+            self._function_registry = registry
+
+        return registry
+
+    def get_fsmri(self, name, load_labels=False):
+        """Get the shared FSMRI-object for name, so the same MRI-Subject
+        (e.g. with its labels) is only loaded once.
+
+        Parameters
+        ----------
+        name : str | None
+            The name of the FSMRI-object.
+        load_labels : bool
+            Set True to load the labels if not already loaded.
+
+        Returns
+        -------
+        fsmri : FSMRI
+            The FSMRI-object from the registry.
+        """
+        key = (name, self.pr.p_preset)
+        fsmri = self.fsmri_registry.get(key)
+        if fsmri is None:
+            fsmri = FSMRI(name, self, load_labels=load_labels)
+            if name is not None:
+                self.fsmri_registry[key] = fsmri
+        elif load_labels and fsmri.labels is None:
+            fsmri.parcellations = fsmri._get_available_parc()
+            fsmri.labels = fsmri._get_available_labels()
+
+        return fsmri
+
+    def clear_fsmri_registry(self):
+        """Remove all FSMRI-objects from the registry
+        (e.g. to get changed parameters)."""
+        self.fsmri_registry.clear()
+
     def change_project(self, new_project):
+        self.clear_fsmri_registry()
+        if self.pr is not None:
+            self.pr.stop_file_index()
         self.pr = Project(self, new_project)
         self.settings["selected_project"] = new_project
         if new_project not in self.projects:
@@ -203,6 +269,8 @@ class Controller:
             if len(self.projects) > 0:
                 new_project = self.projects[0]
             else:
+                from mne_pipeline_hd.gui.gui_utils import get_user_input_string
+
                 new_project = get_user_input_string(
                     "Please enter the name of a new project!", "Add Project", force=True
                 )
@@ -221,6 +289,8 @@ class Controller:
     def rename_project(self):
         check_writable = os.access(self.pr.project_path, os.W_OK)
         if check_writable:
+            from mne_pipeline_hd.gui.gui_utils import get_user_input_string
+
             new_project_name = get_user_input_string(
                 f'Change the name of project "{self.pr.name}" to:',
                 "Rename Project",
@@ -312,6 +382,7 @@ class Controller:
         """
         Load all modules in functions and custom_functions
         """
+        import pandas as pd
 
         # Load basic-modules
         # Add functions to sys.path
@@ -369,19 +440,11 @@ class Controller:
                 # (otherwise don't append to pd_funcs and pd_params)
                 if len(file_dict["modules"]) == correct_count:
                     try:
-                        read_pd_funcs = pd.read_csv(
-                            functions_path,
-                            sep=";",
-                            index_col=0,
-                            na_values=[""],
-                            keep_default_na=False,
+                        read_pd_funcs = read_registry_csv(
+                            functions_path, self.registry_cache_path
                         )
-                        read_pd_params = pd.read_csv(
-                            parameters_path,
-                            sep=";",
-                            index_col=0,
-                            na_values=[""],
-                            keep_default_na=False,
+                        read_pd_params = read_registry_csv(
+                            parameters_path, self.registry_cache_path
                         )
                     except Exception:
                         traceback.print_exc()
@@ -409,6 +472,8 @@ class Controller:
                 )
 
     def reload_modules(self):
+        # The functions are imported again from the reloaded modules
+        self._function_registry = None
         for pkg_name in self.all_modules:
             for module_name in self.all_modules[pkg_name]:
                 module = import_module(module_name)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import os
+import stat
+import threading
+from collections import namedtuple
+from os.path import basename, dirname, exists, join, normpath, relpath, sep
+
+from mne_pipeline_hd.pipeline.pipeline_utils import logger
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# The owning object is the folder below data/ or the indexed FSMRI-folder
+# (the first part of the file-name for figures). The data-type is the plot-name
+# for figures and is set for data-files, when the paths of a loading-object
+# are queried.
+FileEntry = namedtuple("FileEntry", ["path", "size", "mtime", "obj_name", "data_type"])
+
+
+class _IndexEventHandler(FileSystemEventHandler):
+    def __init__(self, file_index):
+        super().__init__()
+        self.file_index = file_index
+
+    def on_any_event(self, event):
+        for path in [event.src_path, getattr(event, "dest_path", "")]:
+            if path:
+                self.file_index.update(os.fsdecode(path))
+
+
+class FileIndex:
+    """An index of all files in folders of a project.
+
+    The index is built once with os.scandir and kept current by a watcher
+    (watchdog, which uses e.g. inotify, if it is installed) or otherwise
+    by a thread polling the modification-times of the indexed folders.
+    Queries only read the index and only access the disk for paths
+    outside of the indexed folders. Files saved by the pipeline are updated
+    immediately (see update) and files saved by other processes are found
+    after a refresh.
+
+    Notes
+    -----
+    When polling, files which are changed in place by other processes
+    keep their previous size until their folder changes.
+
+    Parameters
+    ----------
+    roots : dict
+        The kind of each folder to index (e.g. "data", "figures"
+        or "fsmri" for the folder of one FSMRI).
+    poll_interval : float
+        The interval in seconds to poll the folders without watchdog.
+    """
+
+    def __init__(self, roots, poll_interval=2.0):
+        self.roots = {normpath(r): kind for r, kind in roots.items()}
+        self.poll_interval = poll_interval
+        self._files = dict()
+        # The modification-time and the names in each indexed folder
+        self._dirs = dict()
+        self._lock = threading.RLock()
+        self._observer = None
+        self._poll_thread = None
+        self._stop_event = threading.Event()
+
+    def _get_root(self, path):
+        for root in self.roots:
+            if path == root or path.startswith(root + sep):
+                return root
+
+        return None
+
+    def _make_entry(self, path, file_stat):
+        root = self._get_root(path)
+        parts = relpath(path, root).split(sep)
+        obj_name = parts[0] if len(parts) > 1 else None
+        data_type = None
+        if self.roots[root] == "figures":
+            # Figures are saved in <p_preset>/<plot_name>/.../<obj_name>--...
+            obj_name = parts[-1].split("--")[0]
+            data_type = parts[1] if len(parts) > 2 else None
+        else:
+            if self.roots[root] == "fsmri":
+                obj_name = basename(root)
+            if path in self._files:
+                data_type = self._files[path].data_type
+
+        return FileEntry(
+            path, file_stat.st_size, file_stat.st_mtime, obj_name, data_type
+        )
+
+    def _remove(self, path):
+        # Remove a file or a folder with everything in it
+        self._files.pop(path, None)
+        if path in self._dirs:
+            for name in self._dirs.pop(path)[1]:
+                self._remove(join(path, name))
+        parent = self._dirs.get(dirname(path))
+        if parent is not None:
+            parent[1].discard(path.split(sep)[-1])
+
+    def _scan_dir(self, directory):
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except OSError:
+            self._remove(directory)
+            return
+        names = set()
+        previous_names = self._dirs.get(directory, (None, set()))[1]
+        self._dirs[directory] = (dir_mtime, names)
+        for entry in entries:
+            path = normpath(entry.path)
+            try:
+                if entry.is_dir():
+                    names.add(entry.name)
+                    self._files.pop(path, None)
+                    # Only new folders are scanned, the others are polled
+                    if path not in self._dirs:
+                        self._scan_dir(path)
+                elif entry.is_file():
+                    if path in self._dirs:
+                        self._remove(path)
+                    names.add(entry.name)
+                    self._files[path] = self._make_entry(path, entry.stat())
+            except OSError:
+                continue
+        for name in previous_names - names:
+            self._remove(join(directory, name))
+
+    def build(self):
+        """Scan all folders again."""
+        with self._lock:
+            self._files.clear()
+            self._dirs.clear()
+            for root in self.roots:
+                self._scan_dir(root)
+        logger().debug(f"Indexed {len(self._files)} files in {len(self._dirs)} folders")
+
+    def add_root(self, root, kind):
+        """Index and watch another folder (if it isn't indexed yet).
+
+        Parameters
+        ----------
+        root : str
+            The folder to index.
+        kind : str
+            The kind of the folder (see roots).
+        """
+        root = normpath(root)
+        with self._lock:
+            if self._get_root(root) is not None:
+                return
+            self.roots[root] = kind
+            self._scan_dir(root)
+            if self._observer is not None and exists(root):
+                self._observer.schedule(_IndexEventHandler(self), root, recursive=True)
+
+    def refresh(self):
+        """Scan the folders, which changed since the last scan."""
+        with self._lock:
+            # Folders which didn't exist before
+            for root in self.roots:
+                if root not in self._dirs:
+                    self._scan_dir(root)
+            for directory, (dir_mtime, _) in list(self._dirs.items()):
+                # Folders can be removed by scanning their parents
+                if directory not in self._dirs:
+                    continue
+                try:
+                    changed = os.stat(directory).st_mtime_ns != dir_mtime
+                except OSError:
+                    changed = True
+                if changed:
+                    self._scan_dir(directory)
+
+    def update(self, path):
+        """Update a file or a folder in the index (e.g. after it was saved).
+
+        Parameters
+        ----------
+        path : str
+            The path of the file or folder.
+        """
+        path = normpath(path)
+        if self._get_root(path) is None:
+            return
+        with self._lock:
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                self._remove(path)
+                return
+            parent = dirname(path)
+            if parent not in self._dirs and path not in self.roots:
+                # Add missing parent-folders
+                self.update(parent)
+            if parent in self._dirs:
+                self._dirs[parent][1].add(path.split(sep)[-1])
+            if stat.S_ISDIR(file_stat.st_mode):
+                self._scan_dir(path)
+            else:
+                self._files[path] = self._make_entry(path, file_stat)
+
+    def exists(self, path):
+        """If a file or folder exists."""
+        path = normpath(path)
+        with self._lock:
+            return path in self._files or path in self._dirs
+
+    def isfile(self, path):
+        """If a file exists."""
+        with self._lock:
+            return normpath(path) in self._files
+
+    def get_entry(self, path):
+        """Get the FileEntry of a file (None if it doesn't exist)."""
+        with self._lock:
+            return self._files.get(normpath(path))
+
+    def get_size(self, path):
+        """Get the size of a file in bytes (None if it doesn't exist)."""
+        entry = self.get_entry(path)
+
+        return None if entry is None else entry.size
+
+    def listdir(self, directory):
+        """Get the names in a folder (an empty list if it doesn't exist)."""
+        with self._lock:
+            return sorted(self._dirs.get(normpath(directory), (None, set()))[1])
+
+    def get_files(self, directory=None, obj_name=None):
+        """Get the indexed files.
+
+        Parameters
+        ----------
+        directory : str | None
+            Only get files in this folder and its subfolders.
+        obj_name : str | None
+            Only get files owned by this object.
+
+        Returns
+        -------
+        entries : list of FileEntry
+            The entries of the files.
+        """
+        prefix = None if directory is None else normpath(directory) + sep
+        with self._lock:
+            return [
+                entry
+                for path, entry in self._files.items()
+                if (prefix is None or path.startswith(prefix))
+                and (obj_name is None or entry.obj_name == obj_name)
+            ]
+
+    def get_existing_paths(self, data_type_paths):
+        """Get the existing paths and set the data-types of their entries.
+
+        Parameters
+        ----------
+        data_type_paths : dict
+            The paths for each data-type.
+
+        Returns
+        -------
+        existing_paths : dict
+            The existing paths for each data-type.
+        """
+        existing_paths = dict()
+        with self._lock:
+            for data_type, paths in data_type_paths.items():
+                existing_paths[data_type] = list()
+                for path in paths:
+                    norm_path = normpath(path)
+                    # Source-estimates are saved as two files for each hemisphere
+                    stc_paths = [f"{norm_path}-lh.stc", f"{norm_path}-rh.stc"]
+                    if self._get_root(norm_path) is None:
+                        # Paths outside of the indexed folders are checked on disk
+                        found = [p for p in [norm_path] + stc_paths if exists(p)]
+                    else:
+                        found = [
+                            p
+                            for p in [norm_path] + stc_paths
+                            if p in self._files or p in self._dirs
+                        ]
+                    if len(found) > 0:
+                        existing_paths[data_type].append(path)
+                    for p in found:
+                        if p in self._files:
+                            self._files[p] = self._files[p]._replace(
+                                data_type=data_type
+                            )
+
+        return existing_paths
+
+    def _poll(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as err:
+                logger().warning(f"Polling the file-index failed: {err}")
+
+    def start(self):
+        """Build the index and start watching the folders."""
+        self.build()
+        self._stop_event.clear()
+        if Observer is not None:
+            self._observer = Observer()
+            handler = _IndexEventHandler(self)
+            for root in self.roots:
+                # Watching fails for folders which don't exist yet
+                if exists(root):
+                    self._observer.schedule(handler, root, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._poll_thread = threading.Thread(target=self._poll, daemon=True)
+            self._poll_thread.start()
+
+    def stop(self):
+        """Stop watching the folders."""
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        self._poll_thread = None
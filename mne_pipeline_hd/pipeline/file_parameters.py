@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import json
+import os
+import sys
+from contextlib import contextmanager
+from os.path import splitext
+
+from mne_pipeline_hd.pipeline.pipeline_utils import (
+    TypedJSONEncoder,
+    logger,
+    type_json_hook,
+)
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Lock lock_path exclusively between processes and threads
+    (each call opens the file again)."""
+    with open(lock_path, "a") as lock_file:
+        if sys.platform == "win32":
+            import msvcrt
+
+            while True:
+                try:
+                    # Retries for 10 seconds before raising
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class FileParameterJournal:
+    """The file-parameters of a loading-object stored as a JSON-file
+    with an append-only journal (JSON-lines) of the later changes.
+
+    Saving the parameters of a file only appends one line to the journal.
+    The journal is merged into the JSON-file (compaction), when it has more
+    entries than min_compact and the number of files, so the cost of
+    saving stays constant for each file. Appending and compaction hold
+    a file-lock and the compaction reads the JSON-file and the journal
+    again, so entries appended by other processes (e.g. the workers
+    of a parallel run) are kept. The JSON-file is replaced atomically
+    and an incomplete last line of the journal (e.g. from a crash
+    or still being written) is ignored, so the file-parameters
+    can't be truncated.
+
+    Parameters
+    ----------
+    path : str
+        The path of the JSON-file with the file-parameters.
+    min_compact : int
+        The minimum number of journal-entries before compaction.
+    """
+
+    def __init__(self, path, min_compact=100):
+        self.path = path
+        self.journal_path = f"{splitext(path)[0]}.jsonl"
+        self.lock_path = f"{splitext(path)[0]}.lock"
+        self.min_compact = min_compact
+        self.n_entries = 0
+
+    def _write_snapshot(self, file_parameters):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(file_parameters, file, cls=TypedJSONEncoder, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _read_journal(self, file_parameters):
+        # Returns the number of entries
+        n_entries = 0
+        try:
+            with open(self.journal_path, "r") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return n_entries
+        for line_idx, line in enumerate(lines):
+            # The last line is not complete yet (or after a crash)
+            if not line.endswith("\n"):
+                break
+            try:
+                entry = json.loads(line, object_hook=type_json_hook)
+            except json.JSONDecodeError:
+                logger().warning(f"Invalid line {line_idx + 1} in {self.journal_path}")
+                continue
+            if entry["params"] is None:
+                file_parameters.pop(entry["file"], None)
+            else:
+                file_parameters[entry["file"]] = entry["params"]
+            n_entries += 1
+
+        return n_entries
+
+    def _read(self):
+        # Read the JSON-file and the changes from the journal
+        try:
+            with open(self.path, "r") as file:
+                file_parameters = json.load(file, object_hook=type_json_hook)
+        except (json.JSONDecodeError, FileNotFoundError):
+            file_parameters = dict()
+        n_entries = self._read_journal(file_parameters)
+
+        return file_parameters, n_entries
+
+    def _needs_compaction(self, file_parameters):
+        return self.n_entries > max(self.min_compact, len(file_parameters))
+
+    def load(self):
+        """Load the file-parameters with the changes from the journal.
+
+        Returns
+        -------
+        file_parameters : dict
+            The parameters for each file-name.
+        """
+        file_parameters, self.n_entries = self._read()
+        if self._needs_compaction(file_parameters):
+            file_parameters = self.compact()
+
+        return file_parameters
+
+    def append(self, file_parameters, file_names):
+        """Append the parameters of file_names to the journal
+        (file-names not in file_parameters are removed).
+
+        Parameters
+        ----------
+        file_parameters : dict
+            The current parameters for each file-name.
+        file_names : list of str
+            The names of the changed files.
+        """
+        lines = [
+            json.dumps(
+                {"file": file_name, "params": file_parameters.get(file_name)},
+                cls=TypedJSONEncoder,
+            )
+            + "\n"
+            for file_name in file_names
+        ]
+        with file_lock(self.lock_path):
+            with open(self.journal_path, "a+") as file:
+                # Terminate an incomplete line from a crash,
+                # which would corrupt the first appended line
+                if file.tell() > 0:
+                    file.seek(file.tell() - 1)
+                    if file.read(1) != "\n":
+                        lines.insert(0, "\n")
+                file.write("".join(lines))
+        self.n_entries += len(file_names)
+        if self._needs_compaction(file_parameters):
+            self.compact()
+
+    def compact(self):
+        """Merge the journal into the JSON-file.
+
+        The JSON-file and the journal are read again with the file-lock held,
+        so changes appended by other processes are included.
+
+        Returns
+        -------
+        file_parameters : dict
+            The merged parameters for each file-name.
+        """
+        with file_lock(self.lock_path):
+            file_parameters, _ = self._read()
+            self._write_snapshot(file_parameters)
+            # Entries replayed again after a crash here are just overwritten
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
+        self.n_entries = 0
+
+        return file_parameters
+
+    def write(self, file_parameters):
+        """Replace all file-parameters with file_parameters
+        and clear the journal.
+
+        Parameters
+        ----------
+        file_parameters : dict
+            The parameters for each file-name.
+        """
+        with file_lock(self.lock_path):
+            self._write_snapshot(file_parameters)
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
+        self.n_entries = 0
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, split
+from pathlib import Path
+from threading import Lock
+
+import pandas as pd
+
+from mne_pipeline_hd.pipeline.pipeline_utils import compare_filep, logger
+
+# The scan-results for each object with the signature they are valid for
+_scan_cache = dict()
+_scan_cache_lock = Lock()
+
+
+def scan_directory(directory):
+    """Get the files and directories in directory with one os.scandir.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to scan.
+
+    Returns
+    -------
+    entries : dict
+        For each name in directory if it is a file (True) or a directory (False).
+    """
+    entries = dict()
+    try:
+        with os.scandir(directory or ".") as iterator:
+            for entry in iterator:
+                try:
+                    if entry.is_file():
+                        entries[entry.name] = True
+                    elif entry.is_dir():
+                        entries[entry.name] = False
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+
+    return entries
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _get_project_key(pr, kind, obj_name):
+    # The project-entries which change the paths of an object
+    # (as string to not keep references to mutable entries)
+    if kind == "MEEG":
+        entries = [
+            pr.sel_event_id.get(obj_name),
+            pr.meeg_to_fsmri.get(obj_name),
+            pr.meeg_to_erm.get(obj_name),
+        ]
+    elif kind == "Group":
+        group_list = pr.all_groups.get(obj_name)
+        # The trials of a group are taken from the first MEEG
+        first_meeg = group_list[0] if group_list else None
+        entries = [group_list, pr.sel_event_id.get(first_meeg)]
+    else:
+        entries = list()
+
+    return str(entries)
+
+
+def _get_signature(
+    directories, file_parameter_paths, parameters_key, project_key, overwrite
+):
+    return (
+        tuple(_stat_signature(d) for d in directories),
+        tuple(_stat_signature(p) for p in file_parameter_paths),
+        parameters_key,
+        project_key,
+        overwrite,
+    )
+
+
+def _path_exists(directories, path):
+    directory, name = split(path)
+    entries = directories[directory]
+
+    # Source-estimates are saved as two files for each hemisphere
+    return (
+        name in entries
+        or entries.get(f"{name}-lh.stc", False)
+        or entries.get(f"{name}-rh.stc", False)
+    )
+
+
+def _get_data_type_paths(obj):
+    return {dt: obj._return_path_list(dt) or list() for dt in obj.io_dict}
+
+
+def scan_object(obj):
+    """Scan the files of a loading-object.
+
+    Every directory containing paths of the object is only scanned once.
+
+    Parameters
+    ----------
+    obj : MEEG | FSMRI | Group
+        The loading-object to scan.
+
+    Returns
+    -------
+    result : dict
+        "status", "time" and "size" for each existing data-type,
+        "param_results" with the result of compare_filep for each
+        existing data-type and the scanned "directories".
+    """
+    data_type_paths = _get_data_type_paths(obj)
+    directories = {
+        dirname(p): None for paths in data_type_paths.values() for p in paths
+    }
+    for directory in directories:
+        directories[directory] = scan_directory(directory)
+
+    result = {
+        "status": dict(),
+        "time": dict(),
+        "size": dict(),
+        "param_results": dict(),
+        "directories": sorted(directories),
+    }
+    for data_type, paths in data_type_paths.items():
+        existing_paths = [p for p in paths if _path_exists(directories, p)]
+        if len(existing_paths) == 0:
+            continue
+        status = "exists"
+        size = 0
+        for path in existing_paths:
+            file_name = Path(path).name
+            if file_name in obj.file_parameters:
+                file_parameters = obj.file_parameters[file_name]
+                # Last entry in TIME should be the most recent one
+                if "TIME" in file_parameters:
+                    result["time"][data_type] = file_parameters["TIME"]
+                # Accumulate, if there are several files
+                size += file_parameters.get("SIZE", 0)
+            # Compare all parameters from last run to now
+            result_dict = compare_filep(obj, path, verbose=False)
+            result["param_results"][data_type] = result_dict
+            for value in result_dict.values():
+                if isinstance(value, tuple):
+                    if value[2]:
+                        status = "critical_conflict"
+                    elif status == "exists":
+                        status = "possible_conflict"
+        result["status"][data_type] = status
+        result["size"][data_type] = size
+
+    return result
+
+
+def _get_loading_class(kind):
+    from mne_pipeline_hd.pipeline.loading import FSMRI, MEEG, Group
+
+    return {"MEEG": MEEG, "FSMRI": FSMRI, "Group": Group}[kind]
+
+
+def scan_objects(controller, kind, obj_names, max_workers=None):
+    """Scan the files of several loading-objects in a thread-pool.
+
+    The results are cached and only scanned again, if the modification-time
+    of a scanned directory or the file-parameters
+    or the current parameters changed.
+
+    Parameters
+    ----------
+    controller : Controller
+        The controller of the project.
+    kind : str
+        If the objects are MEEG, FSMRI or Group.
+    obj_names : list of str
+        The names of the objects.
+    max_workers : int | None
+        The maximum number of threads (None for the default
+        of ThreadPoolExecutor).
+
+    Returns
+    -------
+    results : dict
+        The result of scan_object for each object-name.
+    """
+    pr = controller.pr
+    loading_class = _get_loading_class(kind)
+    # compare_filep compares the string-representation of the parameters
+    parameters_key = (pr.p_preset, str(pr.parameters[pr.p_preset]))
+    overwrite = controller.settings["overwrite"]
+
+    def _scan(obj_name):
+        cache_key = (kind, pr.project_path, obj_name)
+        project_key = _get_project_key(pr, kind, obj_name)
+        with _scan_cache_lock:
+            cached = _scan_cache.get(cache_key)
+        if cached is not None:
+            signature, file_parameter_paths, result = cached
+            current_signature = _get_signature(
+                result["directories"],
+                file_parameter_paths,
+                parameters_key,
+                project_key,
+                overwrite,
+            )
+            if current_signature == signature:
+                return result
+        obj = loading_class(obj_name, controller)
+        # The loading-object may have added default entries to the project
+        project_key = _get_project_key(pr, kind, obj_name)
+        file_parameter_paths = (
+            obj.file_parameters_path,
+            obj.file_parameters_journal.journal_path,
+        )
+        # Get the signature before scanning to not miss changes during the scan
+        directories = {
+            dirname(p) for paths in _get_data_type_paths(obj).values() for p in paths
+        }
+        signature = _get_signature(
+            sorted(directories),
+            file_parameter_paths,
+            parameters_key,
+            project_key,
+            overwrite,
+        )
+        result = scan_object(obj)
+        with _scan_cache_lock:
+            _scan_cache[cache_key] = (signature, file_parameter_paths, result)
+
+        return result
+
+    logger().debug(f"Scanning files of {len(obj_names)} {kind}-objects")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(obj_names, executor.map(_scan, obj_names)))
+
+    return results
+
+
+def build_file_tables(results, obj_names):
+    """Build the tables of the file-management from the scan-results.
+
+    Parameters
+    ----------
+    results : dict
+        The result of scan_object for each object-name.
+    obj_names : list of str
+        The names of the objects (the index of the tables).
+
+    Returns
+    -------
+    pd_status : pandas.DataFrame
+        The status of the existing files for each object and data-type.
+    pd_time : pandas.DataFrame
+        The time of the last change for each object and data-type.
+    pd_size : pandas.DataFrame
+        The size of the files for each object and data-type.
+    """
+    names = [name for name in obj_names if name in results]
+    # Keep the order of the data-types
+    columns = list(dict.fromkeys(dt for n in names for dt in results[n]["status"]))
+    tables = list()
+    for key in ["status", "time", "size"]:
+        rows = {name: results[name][key] for name in names}
+        table = pd.DataFrame.from_dict(rows, orient="index", columns=columns)
+        tables.append(table.reindex(index=obj_names, columns=columns))
+
+    return tuple(tables)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+from importlib import import_module
+from os import makedirs
+from os.path import abspath, join
+
+from mne_pipeline_hd.pipeline.pipeline_utils import logger
+
+# Parsed csv-files of this process: path: (signature, DataFrame)
+_csv_cache = dict()
+# Arguments with defaults of functions: function: arguments
+_arguments_cache = dict()
+
+
+def _get_csv_signature(path):
+    import pandas as pd
+
+    stat = os.stat(path)
+
+    return stat.st_mtime_ns, stat.st_size, pd.__version__
+
+
+def _read_pickled_csv(pickle_path, signature):
+    try:
+        with open(pickle_path, "rb") as file:
+            pickled_signature, data = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        logger().debug(f"Cached csv-file {pickle_path} can't be read: {err}")
+        return None
+    if pickled_signature != signature:
+        return None
+
+    return data
+
+
+def _write_pickled_csv(pickle_path, signature, data):
+    tmp_path = f"{pickle_path}.{os.getpid()}.tmp"
+    try:
+        makedirs(os.path.dirname(pickle_path), exist_ok=True)
+        with open(tmp_path, "wb") as file:
+            pickle.dump((signature, data), file)
+        os.replace(tmp_path, pickle_path)
+    except OSError as err:
+        logger().debug(f"Parsed csv-file can't be cached in {pickle_path}: {err}")
+
+
+def read_registry_csv(path, cache_path=None):
+    """Read a functions- or parameters-csv-file into a DataFrame.
+
+    Each version (modification-time and size) of a file is only parsed once,
+    the DataFrame is cached in memory and (if cache_path is given) on disk.
+
+    Parameters
+    ----------
+    path : str | Path
+        The path to the csv-file.
+    cache_path : str | None
+        The folder to cache the parsed file in.
+
+    Returns
+    -------
+    data : pandas.DataFrame
+        A copy of the parsed csv-file.
+    """
+    path = abspath(path)
+    signature = _get_csv_signature(path)
+    entry = _csv_cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1].copy()
+
+    data = None
+    if cache_path is not None:
+        path_hash = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        pickle_path = join(cache_path, f"{path_hash}.pickle")
+        data = _read_pickled_csv(pickle_path, signature)
+    if data is None:
+        import pandas as pd
+
+        data = pd.read_csv(
+            path,
+            sep=";",
+            index_col=0,
+            na_values=[""],
+            keep_default_na=False,
+        )
+        if cache_path is not None:
+            _write_pickled_csv(pickle_path, signature, data)
+    _csv_cache[path] = (signature, data)
+
+    return data.copy()
+
+
+def get_func_arguments(func):
+    """Get the arguments of func with their defaults
+    (without args and kwargs), inspected only once for each function."""
+    if func not in _arguments_cache:
+        arguments = {
+            arg_name: arg.default
+            for arg_name, arg in inspect.signature(func).parameters.items()
+        }
+        for pop_item in ["args", "kwargs"]:
+            arguments.pop(pop_item, None)
+        _arguments_cache[func] = arguments
+
+    return _arguments_cache[func]
+
+
+class FunctionEntry:
+    """The pre-parsed information of a pipeline-function from pd_funcs."""
+
+    def __init__(self, name, module, target, func_args):
+        self.name = name
+        self.module = module
+        self.target = target
+        if isinstance(func_args, str):
+            self.func_args = [a for a in func_args.replace(" ", "").split(",") if a]
+        else:
+            self.func_args = list()
+        self._func = None
+
+    @property
+    def func(self):
+        """The function (imported on first use)."""
+        if self._func is None:
+            self._func = getattr(import_module(self.module), self.name)
+
+        return self._func
+
+    @property
+    def arguments(self):
+        """The arguments of the function with their defaults."""
+        return get_func_arguments(self.func)
+
+
+class FunctionRegistry:
+    """The functions from pd_funcs by their name, parsed once
+    to avoid DataFrame-lookups and imports for each pipeline-step."""
+
+    def __init__(self, pd_funcs):
+        self.pd_funcs = pd_funcs
+        self._entries = {
+            name: FunctionEntry(name, module, target, func_args)
+            for name, module, target, func_args in zip(
+                pd_funcs.index,
+                pd_funcs["module"],
+                pd_funcs["target"],
+                pd_funcs["func_args"],
+            )
+        }
+
+    def __getitem__(self, func_name):
+        return self._entries[func_name]
+
+    def __contains__(self, func_name):
+        return func_name in self._entries
@@ -4,46 +4,67 @@ Authors: Martin Schulz <dev@mgschulz.de>
 License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
+
 from __future__ import print_function
 
 import gc
-import inspect
 import io
 import sys
-from collections import OrderedDict
-from importlib import import_module
-from multiprocessing import Pipe
+from collections import OrderedDict, deque
+from functools import partial
+from queue import Queue
 
-from matplotlib import pyplot as plt
 from qtpy.QtCore import QThreadPool, QRunnable, Slot, QObject, Signal
-from qtpy.QtWidgets import QAbstractItemView
 
-from mne_pipeline_hd.gui.base_widgets import TimedMessageBox
-from mne_pipeline_hd.gui.gui_utils import get_exception_tuple, ExceptionTuple, Worker
-from mne_pipeline_hd.pipeline.loading import BaseLoading, FSMRI, Group, MEEG
-from mne_pipeline_hd.pipeline.pipeline_utils import shutdown, ismac, QS, logger
+from mne_pipeline_hd.pipeline.cache import get_step_key, restore_outputs, store_outputs
+from mne_pipeline_hd.pipeline.function_registry import get_func_arguments
+from mne_pipeline_hd.pipeline.loading import BaseLoading, Group, MEEG
+from mne_pipeline_hd.pipeline.parallel import init_mp_pool, close_mp_pool
+from mne_pipeline_hd.pipeline.pipeline_utils import (
+    ExceptionTuple,
+    get_exception_tuple,
+    ismac,
+    logger,
+    QSettingsSnapshot,
+    get_qsettings,
+    running_function,
+    shutdown,
+    use_qsettings,
+)
+from mne_pipeline_hd.pipeline.scheduler import (
+    get_function_io,
+    get_io_maps,
+    get_step_dependencies,
+    io_classes,
+    is_up_to_date,
+)
+
+# Project-attributes with entries for single objects,
+# which can be changed by functions running in a worker-process
+object_pr_attributes = [
+    "meeg_bad_channels",
+    "meeg_event_id",
+    "sel_event_id",
+    "meeg_to_erm",
+    "meeg_to_fsmri",
+    "meeg_ica_exclude",
+    "plot_files",
+]
 
 
 def get_func(func_name, obj):
-    # Get module- and package-name, has to specified in pd_funcs
+    # Get the function from the pre-parsed pd_funcs
     # (which imports from functions.csv or the <custom_package>.csv)
-    module_name = obj.ct.pd_funcs.loc[func_name, "module"]
-    module = import_module(module_name)
-    func = getattr(module, func_name)
-
-    return func
-
+    return obj.ct.get_function_registry()[func_name].func
 
-def get_arguments(func, obj):
-    # Get arguments from function signature
-    arguments = {
-        arg_name: arg.default
-        for arg_name, arg in inspect.signature(func).parameters.items()
-    }
 
-    # Remove args/kwargs
-    for pop_item in ["args", "kwargs"]:
-        arguments.pop(pop_item, None)
+def get_arguments(func, obj, qsettings=None):
+    # Get arguments from function signature (without args/kwargs)
+    arguments = get_func_arguments(func).copy()
+    # Use the QSettingsSnapshot of the run (QS() reads the settings each time)
+    if qsettings is None:
+        qsettings = get_qsettings()
+    qsettings_keys = set(qsettings.childKeys())
 
     # Set data-objects
     for obj_name, obj in [
@@ -64,8 +85,8 @@ def get_arguments(func, obj):
             arguments[arg_name] = obj.pa[arg_name]
         elif arg_name in obj.ct.settings:
             arguments[arg_name] = obj.ct.settings[arg_name]
-        elif arg_name in QS().childKeys():
-            arguments[arg_name] = QS().value(arg_name)
+        elif arg_name in qsettings_keys:
+            arguments[arg_name] = qsettings.value(arg_name)
 
     # Add additional keyword-arguments if added for function by user
     if func.__name__ in obj.pr.add_kwargs:
@@ -130,20 +151,176 @@ class StreamReceiver(QRunnable):
                     self.signals.stdout_received.emit(text)
 
 
-def run_func(func, keywargs, pipe=None):
+def run_func(func, keywargs, pipe=None, qsettings=None):
     if pipe is not None:
         stream_manager = StreamManager(pipe)
         sys.stdout = stream_manager.stdout_sender
         sys.stderr = stream_manager.stderr_sender
     try:
-        return func(**keywargs)
+        with use_qsettings(qsettings or get_qsettings()):
+            with running_function(func.__name__):
+                return func(**keywargs)
     except Exception:
         return get_exception_tuple(is_mp=pipe is not None)
 
 
+def create_object(obj_name, obj_type, controller):
+    """Create the loading-object of obj_type for obj_name
+    (FSMRI-objects are shared through the registry of the controller)"""
+    if obj_type == "FSMRI":
+        return controller.get_fsmri(obj_name)
+    elif obj_type == "MEEG":
+        return MEEG(obj_name, controller)
+    elif obj_type == "Group":
+        return Group(obj_name, controller)
+    else:
+        return BaseLoading(obj_name, controller)
+
+
+# The copy of the controller and the QSettingsSnapshot in a worker-process
+_worker_ct = None
+_worker_qsettings = None
+
+
+def init_worker(controller, sys_paths, qsettings=None):
+    """Initialize a worker-process of the parallel run."""
+    global _worker_ct, _worker_qsettings
+    # Make custom-modules importable if the process was spawned
+    for path in [p for p in sys_paths if p not in sys.path]:
+        sys.path.append(path)
+    # Plots can't be shown from a worker-process
+    controller.settings["show_plots"] = False
+    _worker_ct = controller
+    _worker_qsettings = qsettings
+
+
+def get_object_pr_state(project, obj_names):
+    """Get the entries for obj_names from the project-attributes
+    in object_pr_attributes."""
+    pr_state = dict()
+    for obj_name in obj_names:
+        obj_state = dict()
+        for attr_name in object_pr_attributes:
+            attribute = getattr(project, attr_name)
+            if obj_name in attribute:
+                obj_state[attr_name] = attribute[obj_name]
+        pr_state[obj_name] = obj_state
+
+    return pr_state
+
+
+def set_object_pr_state(project, pr_state):
+    """Merge entries from get_object_pr_state into the project."""
+    for obj_name, obj_state in pr_state.items():
+        for attr_name, value in obj_state.items():
+            getattr(project, attr_name)[obj_name] = value
+
+
+def get_cache_key(obj, func_name, function_io):
+    """Get the key of a step for the result-cache (None if the cache
+    is disabled or the step can't be cached)."""
+    if not obj.ct.get_setting("use_cache") or function_io is None:
+        return None
+    # Figures are not stored in the result-cache
+    if any([obj.ct.pd_funcs.loc[func_name, col] for col in ["matplotlib", "mayavi"]]):
+        return None
+    pr_state = get_object_pr_state(obj.pr, [obj.name])[obj.name]
+
+    return get_step_key(obj, func_name, *function_io, pr_state)
+
+
+def run_cached(obj, func_name, function_io=None, qsettings=None):
+    """Run a function for obj or restore its outputs from the result-cache.
+
+    Parameters
+    ----------
+    obj : MEEG | FSMRI | Group | BaseLoading
+        The object to run the function for.
+    func_name : str
+        The name of the function.
+    function_io : tuple | None
+        (loads, saves) from get_function_io
+        (None to run the function without the result-cache).
+    qsettings : QSettingsSnapshot | None
+        The QSettings of the run (read from QS if None).
+
+    Returns
+    -------
+    result : object | ExceptionTuple | None
+        The return of the function (None if restored from the cache).
+    """
+    cache_key = get_cache_key(obj, func_name, function_io)
+    if cache_key is not None and restore_outputs(obj, func_name, cache_key):
+        return None
+    func = get_func(func_name, obj)
+    keywargs = get_arguments(func, obj, qsettings)
+    result = run_func(func, keywargs, qsettings=qsettings)
+    if cache_key is not None and not isinstance(result, ExceptionTuple):
+        pr_state = get_object_pr_state(obj.pr, [obj.name])[obj.name]
+        store_outputs(obj, cache_key, function_io[1], pr_state)
+
+    return result
+
+
+def run_object_steps(obj_name, obj_type, functions, pr_state=None, function_ios=None):
+    """Run the functions for one object in order inside a worker-process.
+
+    Parameters
+    ----------
+    obj_name : str
+        The name of the object.
+    obj_type : str
+        The type of the object (MEEG, FSMRI or Group).
+    functions : list of str
+        The names of the functions to run.
+    pr_state : dict | None
+        The current project-entries of the object (and related objects)
+        from the main process as returned by get_object_pr_state.
+    function_ios : dict | None
+        (loads, saves) from get_function_io for the functions
+        to use the result-cache.
+
+    Returns
+    -------
+    obj_name : str
+        The name of the object.
+    errors : list of tuple
+        (function-name, ExceptionTuple) for each function with an error.
+    pr_state : dict
+        The entries for obj_name from the project-attributes
+        in object_pr_attributes to be merged into the main process.
+    """
+    if pr_state is not None:
+        set_object_pr_state(_worker_ct.pr, pr_state)
+    errors = list()
+    try:
+        obj = create_object(obj_name, obj_type, _worker_ct)
+    except Exception:
+        error = get_exception_tuple(is_mp=True)
+        error = ExceptionTuple(str(error[0]), str(error[1]), error[2])
+        return obj_name, [(func_name, error) for func_name in functions], dict()
+
+    for func_name in functions:
+        logger().info(f"Running {func_name} for {obj_name}")
+        function_io = (function_ios or dict()).get(func_name)
+        result = run_cached(obj, func_name, function_io, _worker_qsettings)
+        if isinstance(result, ExceptionTuple):
+            # Exception-instances are not necessarily picklable
+            result = ExceptionTuple(str(result[0]), str(result[1]), result[2])
+            errors.append((func_name, result))
+
+    return obj_name, errors, get_object_pr_state(_worker_ct.pr, [obj_name])
+
+
+def _put_done(done_queue, step_idx, result):
+    done_queue.put((step_idx, result))
+
+
 class RunController:
     def __init__(self, controller):
         self.ct = controller
+        # Get FSMRI-objects with the current parameters for this run
+        self.ct.clear_fsmri_registry()
 
         self.all_steps = list()
         self.thread_idx_count = 0
@@ -151,12 +328,19 @@ class RunController:
         self.current_all_funcs = dict()
         self.current_obj_name = None
         self.current_object = None
-        self.loaded_fsmri = None
         self.current_func = None
+        self.current_cache_key = None
 
         self.prog_count = 0
         self.errors = list()
 
+        # The QSettings are read only once for the whole run
+        self.qsettings = QSettingsSnapshot()
+
+        # Data-types the functions load and save (analyzed on demand)
+        self.io_maps = None
+        self.function_ios = dict()
+
         self.init_lists()
 
     def init_lists(self):
@@ -237,31 +421,43 @@ class RunController:
 
         # Load object if the preceding object is not the same
         if not self.current_object or self.current_object.name != self.current_obj_name:
-            if self.current_type == "FSMRI":
-                self.current_object = FSMRI(self.current_obj_name, self.ct)
-                self.loaded_fsmri = self.current_object
-
-            elif self.current_type == "MEEG":
-                # Avoid reloading of same MRI-Subject for multiple files
-                # (with the same MRI-Subject)
-                if (
-                    self.current_obj_name in self.ct.pr.meeg_to_fsmri
-                    and self.loaded_fsmri
-                    and self.loaded_fsmri.name
-                    == self.ct.pr.meeg_to_fsmri[self.current_obj_name]
-                ):
-                    self.current_object = MEEG(
-                        self.current_obj_name, self.ct, fsmri=self.loaded_fsmri
-                    )
-                else:
-                    self.current_object = MEEG(self.current_obj_name, self.ct)
-                self.loaded_fsmri = self.current_object.fsmri
+            # MRI-Subjects are only loaded once for multiple files
+            # (from the registry of the controller)
+            self.current_object = create_object(
+                self.current_obj_name, self.current_type, self.ct
+            )
+
+    def get_function_io(self, func_name):
+        """Get the data-types func_name loads and saves."""
+        if func_name not in self.function_ios:
+            if self.io_maps is None:
+                obj_types = {n: info["type"] for n, info in self.all_objects.items()}
+                self.io_maps = get_io_maps(self.ct, obj_types)
+            self.function_ios[func_name] = get_function_io(
+                self.ct, func_name, *self.io_maps
+            )
 
-            elif self.current_type == "Group":
-                self.current_object = Group(self.current_obj_name, self.ct)
+        return self.function_ios[func_name]
 
-            elif self.current_type == "Other":
-                self.current_object = BaseLoading(self.current_obj_name, self.ct)
+    def get_step_io(self, func_name):
+        """Get the data-types func_name loads and saves
+        (None for functions without object)."""
+        if self.ct.pd_funcs.loc[func_name, "target"] not in io_classes:
+            return None
+
+        return self.get_function_io(func_name)
+
+    def step_is_up_to_date(self, obj, func_name):
+        """Check if the step can be skipped, because its outputs
+        are up-to-date (see scheduler.is_up_to_date)."""
+        if self.get_step_io(func_name) is None:
+            return False
+        loads, saves = self.get_function_io(func_name)
+        if is_up_to_date(obj, func_name, loads, saves):
+            logger().info(f"Skipping {func_name} for {obj.name} (up-to-date)")
+            return True
+
+        return False
 
     def process_finished(self, result):
         # ToDo: tqdm-progressbar for headless-mode
@@ -272,12 +468,14 @@ class RunController:
             self.finished()
 
     def finished(self):
+        # Files saved by worker-processes are not in the file-index yet
+        self.ct.pr.refresh_file_index()
         for name, func, error in self.errors:
             logger().critical(f"Error in {name} <- {func}: {error}")
 
     def prepare_start(self):
         # Take first step of all_steps until there are no steps left.
-        if len(self.all_steps) > 0:
+        while len(self.all_steps) > 0:
             # Getting information as encoded in init_lists
             self.current_obj_name, self.current_func = self.all_steps.pop(0)
             logger().debug(
@@ -286,45 +484,216 @@ class RunController:
             # Get current object
             self.get_object()
 
+            # Skip steps with up-to-date outputs
+            if self.step_is_up_to_date(self.current_object, self.current_func):
+                self.mark_current_items(0)
+                self.prog_count += 1
+                continue
+
+            # Restore outputs from the result-cache
+            function_io = self.get_step_io(self.current_func)
+            self.current_cache_key = get_cache_key(
+                self.current_object, self.current_func, function_io
+            )
+            if self.current_cache_key is not None and restore_outputs(
+                self.current_object, self.current_func, self.current_cache_key
+            ):
+                self.mark_current_items(0)
+                self.prog_count += 1
+                continue
+
             # Mark current object and current function
             self.mark_current_items(2)
 
             # Run function in Multiprocessing-Pool
             kwds = dict()
             kwds["func"] = get_func(self.current_func, self.current_object)
-            kwds["keywargs"] = get_arguments(kwds["func"], self.current_object)
+            kwds["keywargs"] = get_arguments(
+                kwds["func"], self.current_object, self.qsettings
+            )
+            kwds["qsettings"] = self.qsettings
 
             return kwds
 
-        else:
-            self.finished()
+        self.finished()
+
+    def run_step(self, obj_name, func_name):
+        self.current_obj_name = obj_name
+        self.current_func = func_name
+        self.get_object()
+        if self.step_is_up_to_date(self.current_object, func_name):
+            self.prog_count += 1
+            return
+        logger().info(
+            f"########################################\n"
+            f"Running {self.current_func} for {self.current_obj_name}\n"
+            f"########################################\n"
+        )
+        result = run_cached(
+            self.current_object, func_name, self.get_step_io(func_name), self.qsettings
+        )
+
+        if isinstance(result, ExceptionTuple):
+            self.errors.append((self.current_object.name, self.current_func, result))
+        self.prog_count += 1
+
+    def step_finished(self, obj_name, functions, errors, pr_state):
+        # Merge changes of the project made in the worker-process
+        set_object_pr_state(self.ct.pr, pr_state)
+        for func_name, error in errors:
+            self.errors.append((obj_name, func_name, error))
+        obj_funcs = self.all_objects[obj_name]["functions"]
+        for func_name in functions:
+            obj_funcs[func_name] = 0
+        if all([status == 0 for status in obj_funcs.values()]):
+            self.all_objects[obj_name]["status"] = 0
+        self.prog_count += len(functions)
+        logger().info(
+            f"Finished {', '.join(functions)} for {obj_name} "
+            f"({self.prog_count}/{len(self.all_steps)} steps)"
+        )
+
+    def _get_task_pr_state(self, obj_name, obj_type):
+        obj_names = [obj_name]
+        if obj_type == "Group":
+            obj_names += self.ct.pr.all_groups.get(obj_name, list())
+
+        return get_object_pr_state(self.ct.pr, obj_names)
+
+    def start_parallel(self, n_parallel):
+        """Run the steps in parallel worker-processes, each as soon as
+        the steps it depends on (see scheduler.py) are finished."""
+        obj_types = {name: info["type"] for name, info in self.all_objects.items()}
+        function_ios = {
+            func_name: self.get_function_io(func_name)
+            for obj_name, func_name in self.all_steps
+            if obj_types[obj_name] in io_classes
+        }
+        dependencies = get_step_dependencies(
+            self.ct, self.all_steps, obj_types, function_ios
+        )
+        n_waiting = [len(deps) for deps in dependencies]
+        dependents = [list() for _ in self.all_steps]
+        for step_idx, deps in enumerate(dependencies):
+            for dep_idx in deps:
+                dependents[dep_idx].append(step_idx)
+        ready = deque([idx for idx, n in enumerate(n_waiting) if n == 0])
+        # Steps which have to run in the main-process
+        main_ready = deque()
+        done_queue = Queue()
+        n_running = 0
+
+        pool = init_mp_pool(
+            n_parallel, init_worker, (self.ct, sys.path, self.qsettings)
+        )
+        try:
+            while len(ready) > 0 or len(main_ready) > 0 or n_running > 0:
+                while len(ready) > 0:
+                    step_idx = ready.popleft()
+                    obj_name, func_name = self.all_steps[step_idx]
+                    obj_type = obj_types[obj_name]
+                    # Functions for no specific object and 3D-plots
+                    # are run in the main-process
+                    if obj_type == "Other" or self.ct.pd_funcs.loc[func_name, "mayavi"]:
+                        main_ready.append(step_idx)
+                        continue
+                    n_running += 1
+                    # The dependencies are finished now, so the outputs
+                    # of the step can be checked
+                    if self.step_is_up_to_date(
+                        create_object(obj_name, obj_type, self.ct), func_name
+                    ):
+                        self.all_objects[obj_name]["functions"][func_name] = 0
+                        self.prog_count += 1
+                        done_queue.put((step_idx, None))
+                    else:
+                        pool.apply_async(
+                            run_object_steps,
+                            (
+                                obj_name,
+                                obj_type,
+                                [func_name],
+                                self._get_task_pr_state(obj_name, obj_type),
+                                {func_name: function_ios[func_name]},
+                            ),
+                            callback=partial(_put_done, done_queue, step_idx),
+                            error_callback=partial(_put_done, done_queue, step_idx),
+                        )
+                # Collect finished results before running a step
+                # in the main-process, which blocks the scheduling
+                # until it is finished
+                if n_running > 0 and (len(main_ready) == 0 or not done_queue.empty()):
+                    step_idx, result = done_queue.get()
+                    n_running -= 1
+                    obj_name, func_name = self.all_steps[step_idx]
+                    if isinstance(result, BaseException):
+                        error = ExceptionTuple(str(type(result)), str(result), "")
+                        self.step_finished(
+                            obj_name, [func_name], [(func_name, error)], {}
+                        )
+                    elif result is not None:
+                        self.step_finished(obj_name, [func_name], *result[1:])
+                else:
+                    step_idx = main_ready.popleft()
+                    obj_name, func_name = self.all_steps[step_idx]
+                    self.run_step(obj_name, func_name)
+                    self.all_objects[obj_name]["functions"][func_name] = 0
+                for dep_idx in dependents[step_idx]:
+                    n_waiting[dep_idx] -= 1
+                    if n_waiting[dep_idx] == 0:
+                        ready.append(dep_idx)
+        finally:
+            close_mp_pool()
 
     def start(self):
         """No-Gui start method."""
-        for name, func in self.all_steps:
-            self.current_obj_name = name
-            self.current_func = func
-            self.get_object()
-            kwds = dict()
-            kwds["func"] = get_func(self.current_func, self.current_object)
-            kwds["keywargs"] = get_arguments(kwds["func"], self.current_object)
-            logger().info(
-                f"########################################\n"
-                f"Running {self.current_func} for {self.current_obj_name}\n"
-                f"########################################\n"
-            )
-            result = run_func(**kwds)
-
-            if isinstance(result, ExceptionTuple):
-                self.errors.append(
-                    (self.current_object.name, self.current_func, result)
-                )
-            # ToDo: MP
-            # self.pool.apply_async(func=run_func, kwds=kwds,
-            #                       callback=self.process_finished)
+        n_parallel = self.qsettings.value("n_parallel")
+        if n_parallel > 1 and len(self.all_objects) > 1:
+            logger().info(f"Running {n_parallel} steps in parallel")
+            self.start_parallel(n_parallel)
+        else:
+            for name, func in self.all_steps:
+                self.run_step(name, func)
         self.finished()
 
 
+class HeadlessRunController(RunController):
+    """Run the pipeline without GUI (e.g. from the command-line)
+    and display the progress with tqdm or as plain log-messages."""
+
+    def __init__(self, controller, progress="auto"):
+        super().__init__(controller)
+        if progress == "auto":
+            progress = "tqdm" if sys.stderr.isatty() else "plain"
+        self.progress = progress
+        self.n_steps = len(self.all_steps)
+        self.pgbar = None
+        if self.progress == "tqdm":
+            from tqdm import tqdm
+
+            self.pgbar = tqdm(total=self.n_steps, unit="step")
+
+    def update_progress(self):
+        if self.pgbar is not None:
+            self.pgbar.update(self.prog_count - self.pgbar.n)
+        elif self.progress == "plain":
+            logger().info(f"Progress: {self.prog_count}/{self.n_steps} steps")
+
+    def run_step(self, obj_name, func_name):
+        super().run_step(obj_name, func_name)
+        self.update_progress()
+
+    def step_finished(self, obj_name, functions, errors, pr_state):
+        super().step_finished(obj_name, functions, errors, pr_state)
+        self.update_progress()
+
+    def finished(self):
+        if self.pgbar is not None:
+            self.update_progress()
+            self.pgbar.close()
+        super().finished()
+
+
 class QRunController(RunController):
     def __init__(self, run_dialog, controller):
         super().__init__(controller)
@@ -335,6 +704,8 @@ class QRunController(RunController):
         self.paused = False
 
     def mark_current_items(self, status):
+        from qtpy.QtWidgets import QAbstractItemView
+
         super().mark_current_items(status)
         obj_idx = list(self.all_objects.keys()).index(self.current_object.name)
         func_idx = list(
@@ -376,6 +747,17 @@ class QRunController(RunController):
         self.prog_count += 1
         self.rd.pgbar.setValue(self.prog_count)
         self.mark_current_items(0)
+        if self.current_cache_key is not None and not isinstance(
+            result, ExceptionTuple
+        ):
+            store_outputs(
+                self.current_object,
+                self.current_cache_key,
+                self.get_function_io(self.current_func)[1],
+                get_object_pr_state(self.ct.pr, [self.current_object.name])[
+                    self.current_object.name
+                ],
+            )
         # Process
         if self.paused:
             self.rd.console_widget.write_html("<b><big>Paused</big></b><br>")
@@ -407,6 +789,8 @@ class QRunController(RunController):
             self.start()
 
     def finished(self):
+        # Files saved by worker-processes are not in the file-index yet
+        self.ct.pr.refresh_file_index()
         self.rd.console_widget.write_html("<b><big>Finished</big></b><br>")
         # Enable/Disable Buttons
         self.rd.continue_bt.setEnabled(False)
@@ -418,6 +802,8 @@ class QRunController(RunController):
             close_all()
 
         if self.ct.get_setting("shutdown"):
+            from mne_pipeline_hd.gui.base_widgets import TimedMessageBox
+
             self.ct.save()
             ans = TimedMessageBox.information(
                 timeout=60,
@@ -434,45 +820,35 @@ class QRunController(RunController):
         if kwds:
             # Plot functions with interactive plots currently can't
             # run in a separate thread, so they
-            #  excuted in the main thread
+            #  excuted in the main thread.
+            # GUI-runs are serial (start_parallel is only used by
+            # RunController.start, e.g. from the command-line)
             ismayavi = self.ct.pd_funcs.loc[self.current_func, "mayavi"]
             ismpl = self.ct.pd_funcs.loc[self.current_func, "matplotlib"]
             show_plots = self.ct.get_setting("show_plots")
-            use_qthread = QS().value("use_qthread")
+            use_qthread = self.qsettings.value("use_qthread")
             if (
-                ismayavi
-                or (ismpl and show_plots and use_qthread)
-                or (ismpl and not show_plots and use_qthread and ismac)
+                not use_qthread
+                or ismayavi
+                or (ismpl and show_plots)
+                or (ismpl and not show_plots and ismac)
             ):
                 logger().info("Starting in Main-Thread.")
                 result = run_func(**kwds)
                 self.process_finished(result)
 
-            elif QS().value("use_qthread"):
+            else:
+                from mne_pipeline_hd.gui.gui_utils import Worker
+
                 logger().info("Starting in separate Thread.")
                 worker = Worker(function=run_func, **kwds)
                 worker.signals.error.connect(self.process_finished)
                 worker.signals.finished.connect(self.process_finished)
                 QThreadPool.globalInstance().start(worker)
 
-            else:
-                logger().info("Starting in process from multiprocessing.")
-                recv_pipe, send_pipe = Pipe(False)
-                kwds["pipe"] = send_pipe
-                stream_rcv = StreamReceiver(recv_pipe)
-                stream_rcv.signals.stdout_received.connect(
-                    self.rd.console_widget.write_stdout
-                )
-                stream_rcv.signals.stderr_received.connect(
-                    self.rd.console_widget.write_stderr
-                )
-                QThreadPool.globalInstance().start(stream_rcv)
-                # ToDO: MP
-                self.pool.apply_async(
-                    func=run_func, kwds=kwds, callback=self.process_finished
-                )
-
 
 def close_all():
+    from matplotlib import pyplot as plt
+
     plt.close("all")
     gc.collect()
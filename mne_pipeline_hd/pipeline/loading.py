@@ -14,21 +14,26 @@ import json
 import os
 import pickle
 import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from copy import deepcopy
 from datetime import datetime
 from os import listdir, makedirs
 from os.path import exists, getsize, isdir, isfile, join
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import mne
-import mne_connectivity
 import numpy as np
-from tqdm import tqdm
 
+from mne_pipeline_hd.pipeline.file_parameters import FileParameterJournal
+from mne_pipeline_hd.pipeline.parallel import prefetch_map
 from mne_pipeline_hd.pipeline.pipeline_utils import (
     TypedJSONEncoder,
     type_json_hook,
-    QS,
+    get_current_function,
+    get_qsettings,
     _test_run,
     logger,
 )
@@ -49,6 +54,152 @@ def _get_data_type_from_func(self, func, method):
     return data_type
 
 
+def estimate_nbytes(data, _visited=None, _depth=0):
+    """Estimate the memory-size of data (mostly from the numpy-arrays
+    it contains, e.g. in Raw, Epochs or SourceEstimate)."""
+    if _visited is None:
+        _visited = set()
+    if id(data) in _visited or _depth > 6:
+        return 0
+    _visited.add(id(data))
+
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    elif isinstance(data, dict):
+        values = data.values()
+    elif isinstance(data, (list, tuple, set)):
+        values = data
+    elif hasattr(data, "__dict__"):
+        values = vars(data).values()
+    else:
+        return sys.getsizeof(data)
+
+    return sys.getsizeof(data) + sum(
+        [estimate_nbytes(v, _visited, _depth + 1) for v in values]
+    )
+
+
+class DataCache:
+    """A size-bounded LRU-cache for loaded data, which is shared
+    by all loading-objects of a process.
+
+    The size is set in MB with the QSetting "ram_cache_mb"
+    (0 disables the cache, which is the default).
+    Each entry is validated with the modification-time and size
+    of its files and a copy is returned by get, so the cached data
+    is not changed by functions working in place.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+    @staticmethod
+    def get_max_bytes():
+        return int(get_qsettings().value("ram_cache_mb")) * 1024**2
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def get(self, key, signature):
+        """Get a copy of the data for key (or _missing if not cached)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _missing
+            if entry[0] != signature:
+                self._pop(key)
+                return _missing
+            self._entries.move_to_end(key)
+            data = entry[1]
+
+        return deepcopy(data)
+
+    def put(self, key, signature, data, copy=False):
+        """Put data (or a copy of it) for key into the cache and evict
+        the least recently used entries exceeding the size-limit.
+
+        Returns
+        -------
+        stored : bool
+            False if data is too large for the cache.
+        """
+        max_bytes = self.get_max_bytes()
+        # Don't estimate the size when the cache is disabled
+        if signature is None or max_bytes == 0:
+            self.remove(key)
+            return False
+        nbytes = estimate_nbytes(data)
+        if nbytes > max_bytes:
+            self.remove(key)
+            return False
+        if copy:
+            data = deepcopy(data)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (signature, data, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > max_bytes:
+                self._pop(next(iter(self._entries)))
+
+        return True
+
+    def remove(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+_missing = object()
+data_cache = DataCache()
+
+
+def _get_file_signature(paths):
+    # Identify the current version of the files at paths
+    # (None if there are missing files)
+    if not paths:
+        return None
+    signature = list()
+    for path in paths:
+        if isfile(path):
+            files = [path]
+        else:
+            files = [path + "-lh.stc", path + "-rh.stc"]
+        for file_path in files:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                return None
+            signature.append((file_path, stat.st_mtime_ns, stat.st_size))
+
+    return tuple(signature)
+
+
+def _get_cache_key(self, data_type, args=(), kwargs=None):
+    return (
+        type(self).__name__,
+        self.name,
+        self.p_preset,
+        data_type,
+        repr(args),
+        repr(sorted((kwargs or dict()).items())),
+    )
+
+
+def _is_file_backed(data):
+    # Copying lazy or memory-mapped data would load it completely into memory
+    return getattr(data, "preload", True) is False or isinstance(
+        getattr(data, "_data", None), np.memmap
+    )
+
+
 def load_decorator(load_func):
     @functools.wraps(load_func)
     def load_wrapper(self, *args, **kwargs):
@@ -56,8 +207,13 @@ def load_decorator(load_func):
         data_type = _get_data_type_from_func(self, load_func, "load")
         logger().info(f"Loading {data_type} for {self.name}")
 
-        if data_type in self.data_dict:
-            data = self.data_dict[data_type]
+        cache_key = _get_cache_key(self, data_type, args, kwargs)
+        signature = _get_file_signature(self._return_path_list(data_type))
+        load_mode = kwargs.get("load_mode") or self.get_load_mode(data_type)
+        use_cache = load_mode == "preload"
+        data = data_cache.get(cache_key, signature) if use_cache else _missing
+        if data is not _missing:
+            logger().debug(f"Loaded {data_type} for {self.name} from memory")
         else:
             # Todo: Dependencies!
             try:
@@ -103,15 +259,26 @@ def load_decorator(load_func):
                     else:
                         raise err
 
-        # Save data in data-dict for machines with big RAM
-        if not QS().value("save_ram"):
-            self.data_dict[data_type] = data
+            # Keep the loaded data in memory and return a copy from the cache
+            # (or the loaded data itself if it was evicted in the meantime)
+            if use_cache and data_cache.put(cache_key, signature, data):
+                cached_data = data_cache.get(cache_key, signature)
+                if cached_data is not _missing:
+                    data = cached_data
 
         return data
 
     return load_wrapper
 
 
+def _unshare_file(path):
+    # Files shared with the result-cache by hard-links
+    # must not be overwritten in place
+    for file_path in [path, path + "-lh.stc", path + "-rh.stc"]:
+        if isfile(file_path) and os.stat(file_path).st_nlink > 1:
+            os.remove(file_path)
+
+
 def save_decorator(save_func):
     @functools.wraps(save_func)
     def save_wrapper(self, *args, **kwargs):
@@ -119,8 +286,8 @@ def save_decorator(save_func):
         data_type = _get_data_type_from_func(self, save_func, "save")
 
         # Get data-object
-        if len(args) > 1:
-            data = args[1]
+        if len(args) > 0:
+            data = args[0]
         elif len(kwargs) > 0:
             data = kwargs[list(kwargs.keys())[0]]
         else:
@@ -130,16 +297,25 @@ def save_decorator(save_func):
         paths = self._return_path_list(data_type)
         for path in [p for p in paths if not isdir(Path(p).parent)]:
             makedirs(Path(path).parent, exist_ok=True)
+        for path in paths:
+            _unshare_file(path)
 
         logger().info(f"Saving {data_type} for {self.name}")
         save_func(self, *args, **kwargs)
 
-        # Save data in data-dict for machines with big RAM
-        if not QS().value("save_ram"):
-            self.data_dict[data_type] = data
+        # Keep a copy of the saved data in memory
+        paths = self._return_path_list(data_type)
+        cache_key = _get_cache_key(self, data_type)
+        if (
+            data is not None
+            and self.get_load_mode(data_type) == "preload"
+            and not _is_file_backed(data)
+        ):
+            data_cache.put(cache_key, _get_file_signature(paths), data, copy=True)
+        else:
+            data_cache.remove(cache_key)
 
         # Save File-Parameters
-        paths = self._return_path_list(data_type)
         for path in paths:
             self.save_file_params(path)
 
@@ -166,7 +342,6 @@ class BaseLoading:
         self.img_format = self.ct.get_setting("img_format")
         self.dpi = self.ct.get_setting("dpi")
 
-        self.data_dict = dict()
         self.existing_paths = dict()
 
         self.init_attributes()
@@ -203,6 +378,19 @@ class BaseLoading:
         self.io_dict = dict()
         self.deprecated_paths = dict()
 
+    def get_load_mode(self, data_type):
+        """Get the load-mode for data_type from the settings.
+
+        Returns
+        -------
+        load_mode : str
+            "preload" to load the data into memory, "memmap" to load it
+            into a memory-mapped file or "lazy" to read it from disk on demand.
+        """
+        load_modes = self.ct.get_setting("load_modes") or dict()
+
+        return load_modes.get(data_type, "preload")
+
     def _return_path_list(self, data_type):
         paths = self.io_dict[data_type]["path"]
         # Convert paths to list
@@ -229,16 +417,23 @@ class BaseLoading:
         self.file_parameters_path = join(
             self.save_dir, f"_{self.name}_file_parameters.json"
         )
-        try:
-            with open(self.file_parameters_path, "r") as file:
-                self.file_parameters = json.load(file, object_hook=type_json_hook)
-        except (json.JSONDecodeError, FileNotFoundError):
-            self.file_parameters = dict()
+        self.file_parameters_journal = FileParameterJournal(self.file_parameters_path)
+        self.file_parameters = self.file_parameters_journal.load()
+
+    def save_file_parameter_file(self, file_names=None):
+        """Save the file-parameters.
 
-    def save_file_parameter_file(self):
-        # Save File-Parameters file
-        with open(self.file_parameters_path, "w") as file:
-            json.dump(self.file_parameters, file, cls=TypedJSONEncoder, indent=4)
+        Parameters
+        ----------
+        file_names : list of str | None
+            Only append the changed parameters of these files to the journal
+            (removed if not in file_parameters). All file-parameters
+            are written if None.
+        """
+        if file_names is None:
+            self.file_parameters_journal.write(self.file_parameters)
+        else:
+            self.file_parameters_journal.append(self.file_parameters, file_names)
 
     def save_file_params(self, path):
         # Check existence of path and append appendices for hemispheres
@@ -250,21 +445,36 @@ class BaseLoading:
         else:
             paths = [path]
 
+        # Get the name of the running pipeline-function (if not called
+        # from the run-engine, the first pipeline-function in the stack
+        # or the function 2 Frames above)
+        function_registry = self.ct.get_function_registry()
+        function = get_current_function()
+        if function is None:
+            stack = inspect.stack(0)
+            function = stack[2][3]
+            for frame_info in stack[2:]:
+                if frame_info.function in function_registry:
+                    function = frame_info.function
+                    break
+
         for path in paths:
             file_name = Path(path).name
 
             if file_name not in self.file_parameters:
                 self.file_parameters[file_name] = dict()
-            # Get the name of the calling function (assuming it is 2 Frames
-            # above when running in pipeline)
-            function = inspect.stack()[2][3]
             self.file_parameters[file_name]["FUNCTION"] = function
+            # Keep the history of functions which changed the file in place,
+            # a function running again discards the functions after it.
+            functions = self.file_parameters[file_name].get("FUNCTIONS", list())
+            if function in functions:
+                functions = functions[: functions.index(function) + 1]
+            else:
+                functions.append(function)
+            self.file_parameters[file_name]["FUNCTIONS"] = functions
 
-            if function in self.ct.pd_funcs.index:
-                critical_params_str = self.ct.pd_funcs.loc[function, "func_args"]
-                # Make sure there are no spaces left
-                critical_params_str = critical_params_str.replace(" ", "")
-                critical_params = critical_params_str.split(",")
+            if function in function_registry:
+                critical_params = function_registry[function].func_args
 
                 # Add critical parameters
                 for p_name in [p for p in self.pa if p in critical_params]:
@@ -278,7 +488,8 @@ class BaseLoading:
 
             self.file_parameters[file_name]["P_PRESET"] = self.p_preset
 
-        self.save_file_parameter_file()
+        self.save_file_parameter_file([Path(path).name for path in paths])
+        self.pr.update_file_index(paths)
 
     def clean_file_parameters(self):
         remove_files = list()
@@ -299,16 +510,20 @@ class BaseLoading:
                 ]["TIME"][0]
 
             function = self.file_parameters[file_name]["FUNCTION"]
+            function_registry = self.ct.get_function_registry()
             # ToDo: Why is there sometimes <module> as FUNCTION?
-            if function == "<module>" or function not in self.ct.pd_funcs.index:
+            if function == "<module>" or function not in function_registry:
                 pass
             else:
                 remove_params = list()
-                critical_params_str = self.ct.pd_funcs.loc[function, "func_args"]
-                # Make sure there are no spaces left
-                critical_params_str = critical_params_str.replace(" ", "")
-                critical_params = critical_params_str.split(",")
-                critical_params += ["FUNCTION", "NAME", "TIME", "SIZE", "P_PRESET"]
+                critical_params = function_registry[function].func_args + [
+                    "FUNCTION",
+                    "FUNCTIONS",
+                    "NAME",
+                    "TIME",
+                    "SIZE",
+                    "P_PRESET",
+                ]
 
                 for param in self.file_parameters[file_name]:
                     if param not in critical_params:
@@ -407,7 +622,8 @@ class BaseLoading:
 
             save_path = join(dir_path, file_name)
             # Get the plot-function and the save the path to the image
-            calling_func = inspect.stack()[1][3]
+            # (the calling function if not called from the run-engine)
+            calling_func = get_current_function() or inspect.stack(0)[1][3]
 
             # Check if required keys are in the dictionary-levels
             if calling_func not in self.plot_files:
@@ -451,9 +667,14 @@ class BaseLoading:
                 else:
                     brain.save_image(save_path)
             else:
+                import matplotlib.pyplot as plt
+
                 plt.savefig(save_path, dpi=dpi)
             logger().info(f"figure: {save_path} has been saved")
 
+            # Add the new figures to the file-index
+            self.pr.update_file_index([dir_path])
+
             if not isinstance(matplotlib_figure, list):
                 # Only store relative path to be compatible across OS
                 plot_files_save_path = os.path.relpath(save_path, self.figures_path)
@@ -496,6 +717,7 @@ class BaseLoading:
         if file_name[-5:] == ".json":
             file_name = file_name[:-5]
         file_path = join(self.save_dir, f"{self.name}_{self.p_preset}_{file_name}.json")
+        _unshare_file(file_path)
         try:
             with open(file_path, "w") as file:
                 json.dump(data, file, cls=TypedJSONEncoder, indent=4)
@@ -519,19 +741,14 @@ class BaseLoading:
         """Get existing paths and add the mapped File-Type
         to existing_paths (set)"""
         self.existing_paths.clear()
-        for data_type in self.io_dict:
-            paths = self._return_path_list(data_type)
-            if paths:
-                self.existing_paths[data_type] = [
-                    p
-                    for p in paths
-                    if isfile(p)
-                    or isdir(p)
-                    or isfile(p + "-lh.stc")
-                    or isfile(p + "-rh.stc")
-                ]
-            else:
-                self.existing_paths[data_type] = list()
+        data_type_paths = {
+            data_type: self._return_path_list(data_type) or list()
+            for data_type in self.io_dict
+        }
+        # The file-index doesn't access the disk
+        self.existing_paths.update(
+            self.pr.get_file_index().get_existing_paths(data_type_paths)
+        )
 
     def remove_path(self, data_type):
         # Remove path specified by path_type (which is the name
@@ -572,6 +789,7 @@ class BaseLoading:
                 logger().warning(f"{p} could not be removed due to {err}")
             else:
                 logger().warning(f"{p} was removed")
+            self.pr.update_file_index([p, p + "-lh.stc", p + "-rh.stc"])
 
 
 sample_paths = {
@@ -622,7 +840,7 @@ class MEEG(BaseLoading):
             if self.fsmri and self.fsmri.name == self.pr.meeg_to_fsmri[self.name]:
                 pass
             else:
-                self.fsmri = FSMRI(self.pr.meeg_to_fsmri[self.name], self.ct)
+                self.fsmri = self.ct.get_fsmri(self.pr.meeg_to_fsmri[self.name])
         else:
             self.fsmri = FSMRI(None, self.ct)
             if not self.suppress_warnings:
@@ -765,6 +983,9 @@ class MEEG(BaseLoading):
             trial: join(self.save_dir, f"{self.name}_{trial}_{self.p_preset}-morphed")
             for trial in self.sel_trials
         }
+        self.inverse_kernels_path = join(
+            self.save_dir, f"{self.name}_{self.p_preset}-inv-kernels.npz"
+        )
         self.ecd_paths = {
             trial: {
                 dip: join(
@@ -772,7 +993,8 @@ class MEEG(BaseLoading):
                     "ecd_dipoles",
                     f"{self.name}_{trial}_{self.p_preset}_{dip}-ecd-dip.dip",
                 )
-                for dip in self.pa["ecd_times"]
+                # ecd_fit fits "Dip1" if no times are assigned for this object
+                for dip in self.pa["ecd_times"].get(self.name, ["Dip1"])
             }
             for trial in self.sel_trials
         }
@@ -920,6 +1142,11 @@ class MEEG(BaseLoading):
                 "load": self.load_morphed_source_estimates,
                 "save": self.save_morphed_source_estimates,
             },
+            "inverse_kernels": {
+                "path": self.inverse_kernels_path,
+                "load": self.load_inverse_kernels,
+                "save": self.save_inverse_kernels,
+            },
             "ecd": {
                 "path": self.ecd_paths,
                 "load": self.load_ecd,
@@ -951,7 +1178,7 @@ class MEEG(BaseLoading):
         self.pr.meeg_to_erm[self.name] = self.erm
 
         self.pr.meeg_to_fsmri[self.name] = "fsaverage"
-        self.fsmri = FSMRI("fsaverage", self.ct)
+        self.fsmri = self.ct.get_fsmri("fsaverage")
 
         # Add event_id
         if self.name not in self.pr.meeg_event_id:
@@ -1046,6 +1273,27 @@ class MEEG(BaseLoading):
         self.ica_exclude = ica_exclude
         self.pr.meeg_ica_exclude[self.name] = self.ica_exclude
 
+    def _read_raw(self, path, data_type, load_mode=None):
+        load_mode = load_mode or self.get_load_mode(data_type)
+        if load_mode == "memmap":
+            fd, preload = tempfile.mkstemp(
+                suffix=".dat", prefix=f"{self.name}_{data_type}_"
+            )
+            os.close(fd)
+            try:
+                raw = mne.io.read_raw_fif(path, preload=preload)
+            finally:
+                # The memory-map stays valid after removing the file
+                # (not possible on Windows while the file is mapped)
+                try:
+                    os.remove(preload)
+                except OSError:
+                    pass
+        else:
+            raw = mne.io.read_raw_fif(path, preload=load_mode == "preload")
+
+        return raw
+
     ###########################################################################
     # Load- & Save-Methods
     ###########################################################################
@@ -1054,8 +1302,8 @@ class MEEG(BaseLoading):
         return mne.io.read_info(self.raw_path)
 
     @load_decorator
-    def load_raw(self):
-        raw = mne.io.read_raw_fif(self.raw_path, preload=True)
+    def load_raw(self, load_mode=None):
+        raw = self._read_raw(self.raw_path, "raw", load_mode)
         raw.info["bads"] = [bc for bc in self.bad_channels if bc in raw.ch_names]
         return raw
 
@@ -1065,7 +1313,7 @@ class MEEG(BaseLoading):
 
     @load_decorator
     def load_filtered(self):
-        raw = mne.io.read_raw_fif(self.raw_filtered_path, preload=True)
+        raw = self._read_raw(self.raw_filtered_path, "raw_filtered")
         return raw
 
     @save_decorator
@@ -1076,14 +1324,14 @@ class MEEG(BaseLoading):
 
     @load_decorator
     def load_erm(self):
-        erm_raw = mne.io.read_raw_fif(self.erm_path, preload=True)
+        erm_raw = self._read_raw(self.erm_path, "erm")
         return erm_raw
 
     @load_decorator
     def load_erm_processed(self):
         if isfile(self.old_erm_processed_path):
             os.remove(self.old_erm_processed_path)
-        return mne.io.read_raw_fif(self.erm_processed_path, preload=True)
+        return self._read_raw(self.erm_processed_path, "erm_processed")
 
     @save_decorator
     def save_erm_processed(self, erm_filtered):
@@ -1101,8 +1349,11 @@ class MEEG(BaseLoading):
 
     @load_decorator
     def load_epochs(self):
+        # Epochs can't be memory-mapped and are read lazily instead
         return mne.read_epochs(
-            self.epochs_path, proj=self.pa["apply_proj"], preload=True
+            self.epochs_path,
+            proj=self.pa["apply_proj"],
+            preload=self.get_load_mode("epochs") == "preload",
         )
 
     @save_decorator
@@ -1306,6 +1557,50 @@ class MEEG(BaseLoading):
         for trial in morphed_stcs:
             morphed_stcs[trial].save(self.morphed_stc_paths[trial], overwrite=True)
 
+    @load_decorator
+    def load_inverse_kernels(self):
+        kernels = dict()
+        with np.load(self.inverse_kernels_path) as kernel_file:
+            # Trials with the same kernel share it
+            unique_kernels = dict()
+            for trial, kernel_idx in zip(
+                kernel_file["trials"], kernel_file["kernel_idx"]
+            ):
+                if str(trial) not in self.sel_trials:
+                    continue
+                if kernel_idx not in unique_kernels:
+                    vertices = list()
+                    while f"vertices_{kernel_idx}_{len(vertices)}" in kernel_file:
+                        vertices.append(
+                            kernel_file[f"vertices_{kernel_idx}_{len(vertices)}"]
+                        )
+                    unique_kernels[kernel_idx] = {
+                        "kernel": kernel_file[f"kernel_{kernel_idx}"],
+                        "vertices": vertices,
+                        "ch_names": list(kernel_file[f"ch_names_{kernel_idx}"]),
+                    }
+                kernels[str(trial)] = unique_kernels[kernel_idx]
+
+        return kernels
+
+    @save_decorator
+    def save_inverse_kernels(self, kernels):
+        # Kernels shared by trials (from the same prepared inverse)
+        # are stored only once
+        unique_kernels = list()
+        kernel_idx = list()
+        for kernel in kernels.values():
+            if not any([kernel is k for k in unique_kernels]):
+                unique_kernels.append(kernel)
+            kernel_idx.append([id(k) for k in unique_kernels].index(id(kernel)))
+        arrays = {"trials": np.asarray(list(kernels)), "kernel_idx": kernel_idx}
+        for idx, kernel in enumerate(unique_kernels):
+            arrays[f"kernel_{idx}"] = kernel["kernel"]
+            arrays[f"ch_names_{idx}"] = np.asarray(kernel["ch_names"])
+            for vert_idx, vertices in enumerate(kernel["vertices"]):
+                arrays[f"vertices_{idx}_{vert_idx}"] = vertices
+        np.savez(self.inverse_kernels_path, **arrays)
+
     def load_mixn_dipoles(self):
         mixn_dips = dict()
         for trial in self.sel_trials:
@@ -1405,6 +1700,8 @@ class MEEG(BaseLoading):
 
     @load_decorator
     def load_connectivity(self):
+        import mne_connectivity
+
         con_dict = dict()
         for trial in self.con_paths:
             con_dict[trial] = dict()
@@ -1441,10 +1738,12 @@ class FSMRI(BaseLoading):
 
     def init_attributes(self):
         """Initialize additional attributes for FSMRI"""
-        self.fs_path = QS().value("fs_path")
-        self.mne_path = QS().value("mne_path")
+        qsettings = get_qsettings()
+        self.fs_path = qsettings.value("fs_path")
+        self.mne_path = qsettings.value("mne_path")
 
         # Initialize Parcellations and Labels
+        self._labels_mtime = None
         if self.load_labels:
             self.parcellations = self._get_available_parc()
             self.labels = self._get_available_labels()
@@ -1531,10 +1830,19 @@ class FSMRI(BaseLoading):
 
         return annotations
 
+    def _get_label_dir_mtime(self):
+        try:
+            return os.stat(join(self.subjects_dir, self.name, "label")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
     def _get_available_labels(self):
+        from tqdm import tqdm
+
         labels = dict()
         labels["Other"] = list()
         label_dir = join(self.subjects_dir, self.name, "label")
+        self._labels_mtime = self._get_label_dir_mtime()
         try:
             files = os.listdir(label_dir)
             for label_path in tqdm(
@@ -1573,8 +1881,10 @@ class FSMRI(BaseLoading):
         if self.name is None:
             logger().warning("FSMRI-Object has no name and is empty!")
         else:
-            # Get available parcellations
-            if self.labels is None:
+            # Get available parcellations (again if labels were added)
+            labels_mtime = self._get_label_dir_mtime()
+            if self.labels is None or self._labels_mtime != labels_mtime:
+                self.parcellations = self._get_available_parc()
                 self.labels = self._get_available_labels()
 
             # Subselect labels with parcellation
@@ -1667,7 +1977,7 @@ class Group(BaseLoading):
             self.sel_trials = dict()
 
         # The fsmri where all group members are morphed to
-        self.fsmri = FSMRI(self.pa["morph_to"], self.ct)
+        self.fsmri = self.ct.get_fsmri(self.pa["morph_to"])
 
     def init_paths(self):
         # Main Path
@@ -1758,23 +2068,51 @@ class Group(BaseLoading):
     ###########################################################################
     # Load- & Save-Methods
     ###########################################################################
-    def load_items(self, obj_type="MEEG", data_type=None):
-        """Returns a generator for group items."""
-        for obj_name in self.group_list:
-            if obj_type == "MEEG":
-                obj = MEEG(obj_name, self.ct)
-            elif obj_type == "FSMRI":
-                obj = FSMRI(obj_name, self.ct)
-            else:
-                logger().error(f"The object-type {obj_type} is not valid!")
-                continue
-            if data_type is None:
-                yield obj
-            elif data_type in obj.io_dict:
-                data = obj.io_dict[data_type]["load"]()
-                yield data, obj
-            else:
-                logger().error(f"{data_type} is not valid for {obj_type}")
+    def _load_item(self, obj_name, obj_type, data_type):
+        if obj_type == "MEEG":
+            obj = MEEG(obj_name, self.ct)
+        elif obj_type == "FSMRI":
+            obj = self.ct.get_fsmri(obj_name)
+        else:
+            logger().error(f"The object-type {obj_type} is not valid!")
+            return None
+        if data_type is None:
+            return obj
+        elif data_type in obj.io_dict:
+            data = obj.io_dict[data_type]["load"]()
+            return data, obj
+        else:
+            logger().error(f"{data_type} is not valid for {obj_type}")
+            return None
+
+    def load_items(self, obj_type="MEEG", data_type=None, n_prefetch=None):
+        """Returns a generator for group items.
+
+        Parameters
+        ----------
+        obj_type : str
+            The object-type of the items ("MEEG" or "FSMRI").
+        data_type : str | None
+            The data-type to load for each item. If None,
+            only the objects are returned.
+        n_prefetch : int | None
+            The number of items to load ahead in a thread-pool
+            (0 to load each item when it is requested).
+            Taken from the QSetting "n_prefetch" if None.
+
+        Yields
+        ------
+        item : MEEG | FSMRI | tuple
+            The object or (data, object) if data_type is given.
+        """
+        items = prefetch_map(
+            functools.partial(self._load_item, obj_type=obj_type, data_type=data_type),
+            self.group_list,
+            n_prefetch,
+        )
+        for item in items:
+            if item is not None:
+                yield item
 
     @load_decorator
     def load_ga_evokeds(self):
@@ -1835,6 +2173,8 @@ class Group(BaseLoading):
 
     @load_decorator
     def load_ga_con(self):
+        import mne_connectivity
+
         ga_connect = dict()
         for trial in self.ga_con_paths:
             ga_connect[trial] = {}
@@ -5,19 +5,100 @@ License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from itertools import islice
 from multiprocessing import Pool
 
+from mne_pipeline_hd.pipeline.pipeline_utils import get_qsettings
+
 mp_pool = None
 
 
 def close_mp_pool():
+    global mp_pool
+
     if mp_pool is not None:
         mp_pool.close()
         mp_pool.join()
+        mp_pool = None
+
 
+def init_mp_pool(n_parallel=None, initializer=None, initargs=()):
+    """Initialize the process-pool for running pipeline-objects in parallel.
 
-def init_mp_pool():
+    Parameters
+    ----------
+    n_parallel : int | None
+        The number of worker-processes (taken from QSettings if None).
+    initializer : callable | None
+        A function which is called in each worker-process on startup.
+    initargs : tuple
+        Arguments for initializer.
+
+    Returns
+    -------
+    mp_pool : multiprocessing.pool.Pool
+        The initialized process-pool.
+    """
     global mp_pool
 
     close_mp_pool()
-    mp_pool = Pool(1)
+    if n_parallel is None:
+        n_parallel = get_qsettings().value("n_parallel")
+    mp_pool = Pool(max(int(n_parallel), 1), initializer, initargs)
+
+    return mp_pool
+
+
+def prefetch_map(func, items, n_prefetch=None):
+    """Apply func to items in a thread-pool, which stays up to n_prefetch items
+    ahead of the consumer.
+
+    This way loading the next items (e.g. of a group) overlaps the computation
+    on the current item, while the memory stays bounded by n_prefetch items.
+    Exceptions from func are raised in the consumer.
+
+    Parameters
+    ----------
+    func : callable
+        The function applied to each item (e.g. loading data).
+    items : iterable
+        The items.
+    n_prefetch : int | None
+        The maximum number of items loaded ahead (0 to apply func
+        only when the next result is requested). Taken from QSettings if None.
+
+    Yields
+    ------
+    result
+        The results of func in the order of items.
+    """
+    if n_prefetch is None:
+        n_prefetch = int(get_qsettings().value("n_prefetch"))
+    if n_prefetch < 1:
+        for item in items:
+            yield func(item)
+        return
+
+    items = iter(items)
+    pending = deque()
+
+    def _submit(executor, item):
+        # Run func with the context of the consumer (e.g. its QSettingsSnapshot)
+        return executor.submit(copy_context().run, func, item)
+
+    with ThreadPoolExecutor(max_workers=n_prefetch) as executor:
+        try:
+            for item in islice(items, n_prefetch):
+                pending.append(_submit(executor, item))
+            while len(pending) > 0:
+                result = pending.popleft().result()
+                for item in islice(items, 1):
+                    pending.append(_submit(executor, item))
+                yield result
+        finally:
+            # Don't load further items if the consumer exits early
+            for future in pending:
+                future.cancel()
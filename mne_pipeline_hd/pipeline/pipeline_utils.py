@@ -5,13 +5,17 @@ License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
 
+import base64
 import inspect
 import json
 import logging
 import multiprocessing
 import os
 import sys
+import traceback
 from ast import literal_eval
+from contextlib import contextmanager
+from contextvars import ContextVar
 from copy import deepcopy
 from datetime import datetime
 from importlib import resources
@@ -68,6 +72,120 @@ def get_n_jobs(n_jobs):
     return n_cores
 
 
+class ExceptionTuple(object):
+    def __init__(self, *args):
+        self._data = [*args]
+
+    def __getitem__(self, idx):
+        return self._data[idx]
+
+    def __setitem__(self, idx, value):
+        self._data[idx] = value
+
+    def __str__(self):
+        return self._data[2]
+
+
+def get_exception_tuple(is_mp=False):
+    traceback.print_exc()
+    exctype, value = sys.exc_info()[:2]
+    traceback_str = traceback.format_exc(limit=-10)
+    # ToDo: Is this doing what it's supposed to do?
+    if is_mp:
+        logger = multiprocessing.get_logger()
+    else:
+        logger = logging.getLogger()
+    logger.error(f"{exctype}: {value}")
+    exc_tuple = ExceptionTuple(exctype, value, traceback_str)
+
+    return exc_tuple
+
+
+def index_parser(index, all_items, groups=None):
+    """
+    Parses indices from a index-string in all_items
+
+    Parameters
+    ----------
+    index: str
+        A string which contains information about indices
+    all_items
+        All items
+    Returns
+    -------
+
+    """
+    indices = list()
+    rm = list()
+
+    try:
+        if index == "":
+            return [], []
+        elif "all" in index:
+            if "," in index:
+                splits = index.split(",")
+                for sp in splits:
+                    if "!" in sp and "-" in sp:
+                        x, y = sp.split("-")
+                        x = x[1:]
+                        for n in range(int(x), int(y) + 1):
+                            rm.append(n)
+                    elif "!" in sp:
+                        rm.append(int(sp[1:]))
+                    elif "all" in sp:
+                        for i in range(len(all_items)):
+                            indices.append(i)
+            else:
+                indices = [x for x in range(len(all_items))]
+
+        elif "," in index and "-" in index:
+            z = index.split(",")
+            for i in z:
+                if "-" in i and "!" not in i:
+                    x, y = i.split("-")
+                    for n in range(int(x), int(y) + 1):
+                        indices.append(n)
+                elif "!" not in i:
+                    indices.append(int(i))
+                elif "!" in i and "-" in i:
+                    x, y = i.split("-")
+                    x = x[1:]
+                    for n in range(int(x), int(y) + 1):
+                        rm.append(n)
+                elif "!" in i:
+                    rm.append(int(i[1:]))
+
+        elif "-" in index and "," not in index:
+            x, y = index.split("-")
+            indices = [x for x in range(int(x), int(y) + 1)]
+
+        elif "," in index and "-" not in index:
+            splits = index.split(",")
+            for sp in splits:
+                if "!" in sp:
+                    rm.append(int(sp))
+                else:
+                    indices.append(int(sp))
+
+        elif groups is not None and index in groups:
+            files = [x for x in all_items if x in groups[index]]
+            indices = [all_items.index(x) for x in files]
+
+        else:
+            if len(all_items) < int(index) or int(index) < 0:
+                indices = []
+            else:
+                indices = [int(index)]
+
+        indices = [i for i in indices if i not in rm]
+        files = np.asarray(all_items)[indices].tolist()
+
+        return files
+
+    except ValueError:
+        return []
+
+
 def encode_tuples(input_dict):
     """Encode tuples in a dictionary, because JSON does not recognize them
     (CAVE: input_dict is changed in place)"""
@@ -79,14 +197,45 @@ def encode_tuples(input_dict):
                 input_dict[key] = {"tuple_type": value}
 
 
+# Arrays with more elements (or other types than bool, int and float)
+# are encoded as base64 of their bytes instead of a (readable) list
+json_array_b64_min_size = 64
+
+
+def _encode_array(array):
+    is_small = array.dtype.kind in "biuf" and array.size < json_array_b64_min_size
+    if array.dtype.hasobject or is_small:
+        return {"numpy_array": array.tolist()}
+    array = np.ascontiguousarray(array)
+
+    return {
+        "numpy_b64": {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "data": base64.b64encode(array.data).decode("ascii"),
+        }
+    }
+
+
+_b64_keys = {"dtype", "shape", "data"}
+
+
+def _decode_array_b64(value):
+    data = base64.b64decode(value["data"])
+    # A copy, because arrays from bytes are read-only
+    array = np.frombuffer(data, dtype=np.dtype(value["dtype"])).copy()
+
+    return array.reshape(value["shape"])
+
+
 class TypedJSONEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, np.integer):
+        if isinstance(obj, np.ndarray):
+            return _encode_array(obj)
+        elif isinstance(obj, np.integer):
             return int(obj)
         elif isinstance(obj, np.floating):
             return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return {"numpy_array": obj.tolist()}
         elif isinstance(obj, datetime):
             return {"datetime": obj.strftime(datetime_format)}
         elif isinstance(obj, set):
@@ -95,21 +244,32 @@ class TypedJSONEncoder(json.JSONEncoder):
             return json.JSONEncoder.default(self, obj)
 
 
+# Decoders for the type-tags of TypedJSONEncoder (and older versions)
+_json_type_decoders = {
+    "numpy_int": lambda value: value,
+    "numpy_float": lambda value: value,
+    "numpy_array": np.asarray,
+    "numpy_b64": _decode_array_b64,
+    "datetime": lambda value: datetime.strptime(value, datetime_format),
+    "tuple_type": tuple,
+    "set_type": set,
+}
+
+
 def type_json_hook(obj):
-    if "numpy_int" in obj.keys():
-        return obj["numpy_int"]
-    elif "numpy_float" in obj.keys():
-        return obj["numpy_float"]
-    elif "numpy_array" in obj.keys():
-        return np.asarray(obj["numpy_array"])
-    elif "datetime" in obj.keys():
-        return datetime.strptime(obj["datetime"], datetime_format)
-    elif "tuple_type" in obj.keys():
-        return tuple(obj["tuple_type"])
-    elif "set_type" in obj.keys():
-        return set(obj["set_type"])
-    else:
-        return obj
+    # Typed objects are encoded as a dictionary with only the type-tag as key
+    if len(obj) == 1:
+        for key, value in obj.items():
+            decoder = _json_type_decoders.get(key)
+            # A user-dictionary with a type-tag as key is returned unchanged
+            if key == "numpy_b64" and not (
+                isinstance(value, dict) and value.keys() == _b64_keys
+            ):
+                decoder = None
+            if decoder is not None:
+                return decoder(value)
+
+    return obj
 
 
 def compare_filep(obj, path, target_parameters=None, verbose=True):
@@ -144,13 +304,7 @@ def compare_filep(obj, path, target_parameters=None, verbose=True):
     try:
         # The last entry in FUNCTION should be the most recent
         function = obj.file_parameters[file_name]["FUNCTION"]
-        critical_params_str = obj.ct.pd_funcs.loc[function, "func_args"]
-        # Make sure there are no spaces left
-        critical_params_str = critical_params_str.replace(" ", "")
-        if "," in critical_params_str:
-            critical_params = critical_params_str.split(",")
-        else:
-            critical_params = [critical_params_str]
+        critical_params = obj.ct.get_function_registry()[function].func_args
     except KeyError:
         critical_params = list()
         function = None
@@ -361,6 +515,82 @@ except ImportError:
             self._write_settings()
 
 
+class QSettingsSnapshot(BaseSettings):
+    """A read-only copy of the QSettings, which is resolved once
+    (e.g. at the start of a run), so repeated lookups don't read
+    the settings-store each time.
+
+    Parameters
+    ----------
+    settings : dict | None
+        The values of the settings (read from QS if None).
+    """
+
+    def __init__(self, settings=None):
+        super().__init__()
+        if settings is None:
+            qs = QS()
+            settings = {key: qs.value(key) for key in self.default_qsettings}
+        self.settings = settings
+
+    def value(self, setting, defaultValue=None):
+        value = self.settings.get(setting)
+        if value is not None:
+            return value
+        if defaultValue is None:
+            return self.get_default(setting)
+        else:
+            return defaultValue
+
+    def childKeys(self):
+        return list(self.settings)
+
+
+# The QSettingsSnapshot of the current run
+_active_qsettings = ContextVar("active_qsettings", default=None)
+
+
+@contextmanager
+def use_qsettings(qsettings):
+    """Use qsettings for get_qsettings() inside this context
+    (and in threads started with its context)."""
+    token = _active_qsettings.set(qsettings)
+    try:
+        yield qsettings
+    finally:
+        _active_qsettings.reset(token)
+
+
+def get_qsettings():
+    """Get the QSettingsSnapshot of the current run or QS() outside of runs."""
+    qsettings = _active_qsettings.get()
+    if qsettings is None:
+        qsettings = QS()
+
+    return qsettings
+
+
+# The name of the pipeline-function which is currently running
+_current_function = ContextVar("current_function", default=None)
+
+
+@contextmanager
+def running_function(func_name):
+    """Publish func_name as the currently running pipeline-function
+    inside this context (e.g. for the file-parameters and plot-files)."""
+    token = _current_function.set(func_name)
+    try:
+        yield func_name
+    finally:
+        _current_function.reset(token)
+
+
+def get_current_function():
+    """Get the name of the currently running pipeline-function
+    (None outside of running_function)."""
+    return _current_function.get()
+
+
 def _set_test_run():
     os.environ["TEST_RUN"] = "True"
 
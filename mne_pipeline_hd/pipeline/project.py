@@ -5,18 +5,22 @@ License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
 
+import hashlib
 import json
 import os
+import pickle
 import shutil
+import sqlite3
 from ast import literal_eval
 from copy import deepcopy
 from os import listdir, makedirs
-from os.path import exists, getsize, isfile, join, isdir
+from os.path import exists, isfile, join, isdir
 from pathlib import Path
 
 import mne
 import numpy as np
 
+from mne_pipeline_hd.pipeline.file_index import FileIndex
 from mne_pipeline_hd.pipeline.legacy import renamed_parameters
 from mne_pipeline_hd.pipeline.loading import MEEG, FSMRI, Group
 from mne_pipeline_hd.pipeline.pipeline_utils import (
@@ -26,6 +30,18 @@ from mne_pipeline_hd.pipeline.pipeline_utils import (
     type_json_hook,
     logger,
 )
+from mne_pipeline_hd.pipeline.project_store import ProjectStore
+
+
+def _get_fingerprint(attribute):
+    # Pickling is much faster than copying and encoding to JSON
+    # (None if attribute can't be pickled)
+    try:
+        attribute_bytes = pickle.dumps(attribute, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+    return hashlib.sha1(attribute_bytes).digest()
 
 
 class Project:
@@ -37,6 +53,8 @@ class Project:
     def __init__(self, controller, name):
         self.ct = controller
         self.name = name
+        # The index of the files in the project (built on demand)
+        self._file_index = None
 
         self.init_main_paths()
         self.init_attributes()
@@ -158,6 +176,14 @@ class Project:
         self.sel_p_preset_path = join(
             self.pscripts_path, f"sel_p_preset_{self.name}.json"
         )
+        # The attributes are stored in a database (the JSON-files above
+        # are only read for projects from older versions)
+        self.store_path = join(self.pscripts_path, f"project_{self.name}.sqlite")
+        self.store = ProjectStore(self.store_path)
+        # The JSON-encoded attributes as in the store (read on demand)
+        self._stored_attributes = None
+        # Fingerprints of the attributes as in the store (see save)
+        self._fingerprints = dict()
 
         # Map the paths to their attribute in the Project-Class
         self.path_to_attribute = {
@@ -181,23 +207,107 @@ class Project:
             self.sel_p_preset_path: "p_preset",
         }
 
+    def __getstate__(self):
+        # The file-index is rebuilt in other processes
+        state = self.__dict__.copy()
+        state["_file_index"] = None
+
+        return state
+
+    def get_file_index(self):
+        """Get the index of the files in data/, figures/ and the folders
+        of the selected FSMRI-objects (and of the selected MEEG-objects)
+        in the subjects-directory.
+
+        The index is built and watched from the first call on.
+        The folders of newly selected FSMRI-objects are added on each call.
+
+        Returns
+        -------
+        file_index : FileIndex
+            The index of the files.
+        """
+        if self._file_index is None:
+            self._file_index = FileIndex(
+                {self.data_path: "data", self.figures_path: "figures"}
+            )
+            self._file_index.start()
+        fsmri_names = set(self.sel_fsmri)
+        fsmri_names.update(
+            [self.meeg_to_fsmri[m] for m in self.sel_meeg if m in self.meeg_to_fsmri]
+        )
+        for fsmri in sorted(fsmri_names):
+            self._file_index.add_root(join(self.ct.subjects_dir, fsmri), "fsmri")
+
+        return self._file_index
+
+    def refresh_file_index(self):
+        """Scan the changed folders of the file-index (if it was built),
+        e.g. after files were saved by other processes."""
+        if self._file_index is not None:
+            self._file_index.refresh()
+
+    def update_file_index(self, paths):
+        """Update paths in the file-index (if it was built)
+        after they were changed."""
+        if self._file_index is not None:
+            for path in paths:
+                self._file_index.update(path)
+
+    def stop_file_index(self):
+        """Stop watching the files and remove the file-index."""
+        if self._file_index is not None:
+            self._file_index.stop()
+            self._file_index = None
+
     def rename(self, new_name):
         # Rename folder
         old_name = self.name
+        self.stop_file_index()
         os.rename(self.project_path, join(self.ct.projects_path, new_name))
         self.name = new_name
         self.init_main_paths()
         # Rename project-files
         old_paths = [Path(p).name for p in self.path_to_attribute]
+        old_paths.append(Path(self.store_path).name)
         self.init_pipeline_scripts()
         new_paths = [Path(p).name for p in self.path_to_attribute]
+        new_paths.append(Path(self.store_path).name)
         for old_path, new_path in zip(old_paths, new_paths):
+            # JSON-files don't exist for projects created with the store
+            if not isfile(join(self.pscripts_path, old_path)):
+                continue
             os.rename(
                 join(self.pscripts_path, old_path), join(self.pscripts_path, new_path)
             )
             logger().info(f"Renamed project-script {old_path} to {new_path}")
         logger().info(f'Finished renaming project "{old_name}" to "{new_name}"')
 
+    def _get_stored_attributes(self):
+        if self._stored_attributes is None:
+            try:
+                self._stored_attributes = self.store.read()
+            except sqlite3.DatabaseError as err:
+                logger().warning(f"The project-store can't be read: {err}")
+                self._stored_attributes = dict()
+
+        return self._stored_attributes
+
+    def _read_attribute(self, path):
+        """Read the attribute for path from the store
+        (or from its JSON-file for projects from older versions)."""
+        stored_attributes = self._get_stored_attributes()
+        attribute_name = self.path_to_attribute[path]
+        if attribute_name in stored_attributes:
+            attribute = json.loads(
+                stored_attributes[attribute_name], object_hook=type_json_hook
+            )
+            # Changes after loading (also in place) change the fingerprint
+            self._fingerprints[attribute_name] = _get_fingerprint(attribute)
+            return attribute
+        with open(path, "r") as file:
+            return json.load(file, object_hook=type_json_hook)
+
     def load_lists(self):
         # Old Paths to allow transition (22.11.2020)
         self.old_all_meeg_path = join(self.pscripts_path, "file_list.json")
@@ -244,14 +354,11 @@ class Project:
         ]:
             attribute_name = self.path_to_attribute[path]
             try:
-                with open(path, "r") as file:
-                    loaded_attribute = json.load(file, object_hook=type_json_hook)
-                    # Make sure, that loaded object has same type
-                    # as default from __init__
-                    if isinstance(
-                        loaded_attribute, type(getattr(self, attribute_name))
-                    ):
-                        setattr(self, attribute_name, loaded_attribute)
+                loaded_attribute = self._read_attribute(path)
+                # Make sure, that loaded object has same type
+                # as default from __init__
+                if isinstance(loaded_attribute, type(getattr(self, attribute_name))):
+                    setattr(self, attribute_name, loaded_attribute)
             # Either empty file or no file, leaving default from __init__
             except (json.JSONDecodeError, FileNotFoundError):
                 # Old Paths to allow transition (22.11.2020)
@@ -267,59 +374,55 @@ class Project:
 
     def load_parameters(self):
         try:
-            with open(
-                join(self.pscripts_path, f"parameters_{self.name}.json"), "r"
-            ) as read_file:
-                loaded_parameters = json.load(read_file, object_hook=type_json_hook)
-
-                for p_preset in loaded_parameters:
-                    # Make sure, that only parameters,
-                    # which exist in pd_params are loaded
-                    for param in [
-                        p
-                        for p in loaded_parameters[p_preset]
-                        if p not in self.ct.pd_params.index
-                    ]:
-                        if "_exp" not in param:
-                            loaded_parameters[p_preset].pop(param)
-
-                    # Add parameters, which exist in extra/parameters.csv,
-                    # but not in loaded-parameters
-                    # (e.g. added with custom-module)
-                    for param in [
-                        p
-                        for p in self.ct.pd_params.index
-                        if p not in loaded_parameters[p_preset]
-                    ]:
-                        try:
-                            eval_param = literal_eval(
-                                self.ct.pd_params.loc[param, "default"]
-                            )
-                        except (ValueError, SyntaxError, NameError):
-                            # Allow parameters to be defined by functions
-                            # e.g. by numpy, etc.
-                            is_func_gui = (
-                                self.ct.pd_params.loc[param, "gui_type"] == "FuncGui"
+            loaded_parameters = self._read_attribute(self.parameters_path)
+            for p_preset in loaded_parameters:
+                # Make sure, that only parameters,
+                # which exist in pd_params are loaded
+                for param in [
+                    p
+                    for p in loaded_parameters[p_preset]
+                    if p not in self.ct.pd_params.index
+                ]:
+                    if "_exp" not in param:
+                        loaded_parameters[p_preset].pop(param)
+
+                # Add parameters, which exist in extra/parameters.csv,
+                # but not in loaded-parameters
+                # (e.g. added with custom-module)
+                for param in [
+                    p
+                    for p in self.ct.pd_params.index
+                    if p not in loaded_parameters[p_preset]
+                ]:
+                    try:
+                        eval_param = literal_eval(
+                            self.ct.pd_params.loc[param, "default"]
+                        )
+                    except (ValueError, SyntaxError, NameError):
+                        # Allow parameters to be defined by functions
+                        # e.g. by numpy, etc.
+                        is_func_gui = (
+                            self.ct.pd_params.loc[param, "gui_type"] == "FuncGui"
+                        )
+                        if is_func_gui:
+                            default_string = self.ct.pd_params.loc[param, "default"]
+                            eval_param = eval(default_string, {"np": np})
+                            exp_name = param + "_exp"
+                            loaded_parameters[p_preset].update(
+                                {exp_name: default_string}
                             )
-                            if is_func_gui:
-                                default_string = self.ct.pd_params.loc[param, "default"]
-                                eval_param = eval(default_string, {"np": np})
-                                exp_name = param + "_exp"
-                                loaded_parameters[p_preset].update(
-                                    {exp_name: default_string}
-                                )
-                            else:
-                                eval_param = self.ct.pd_params.loc[param, "default"]
-                        loaded_parameters[p_preset].update({param: eval_param})
-                    # Change renamed legacy parameters
-                    for param, value in loaded_parameters[p_preset].items():
-                        if param in renamed_parameters:
-                            if value in renamed_parameters[param]:
-                                loaded_parameters[p_preset][param] = renamed_parameters[
-                                    param
-                                ][value]
-
-                self.parameters = loaded_parameters
+                        else:
+                            eval_param = self.ct.pd_params.loc[param, "default"]
+                    loaded_parameters[p_preset].update({param: eval_param})
+                # Change renamed legacy parameters
+                for param, value in loaded_parameters[p_preset].items():
+                    if param in renamed_parameters:
+                        if value in renamed_parameters[param]:
+                            loaded_parameters[p_preset][param] = renamed_parameters[
+                                param
+                            ][value]
+
+            self.parameters = loaded_parameters
         except (FileNotFoundError, json.decoder.JSONDecodeError):
             self.load_default_parameters()
 
@@ -346,12 +449,11 @@ class Project:
 
     def load_last_p_preset(self):
         try:
-            with open(self.sel_p_preset_path, "r") as read_file:
-                self.p_preset = json.load(read_file)
-                # If parameter-preset not in Parameters,
-                # load first Parameter-Key(=Parameter-Preset)
-                if self.p_preset not in self.parameters:
-                    self.p_preset = list(self.parameters.keys())[0]
+            self.p_preset = self._read_attribute(self.sel_p_preset_path)
+            # If parameter-preset not in Parameters,
+            # load first Parameter-Key(=Parameter-Preset)
+            if self.p_preset not in self.parameters:
+                self.p_preset = list(self.parameters.keys())[0]
         except (FileNotFoundError, json.decoder.JSONDecodeError):
             self.p_preset = list(self.parameters.keys())[0]
 
@@ -364,12 +466,23 @@ class Project:
         if worker_signals:
             worker_signals.pgbar_max.emit(len(self.path_to_attribute))
 
-        for idx, path in enumerate(self.path_to_attribute):
+        stored_attributes = self._get_stored_attributes()
+        changed_attributes = dict()
+        fingerprints = dict()
+        for idx, attribute_name in enumerate(self.path_to_attribute.values()):
             if worker_signals:
                 worker_signals.pgbar_n.emit(idx)
-                worker_signals.pgbar_text.emit(f"Saving {self.path_to_attribute[path]}")
+                worker_signals.pgbar_text.emit(f"Saving {attribute_name}")
+
+            attribute = getattr(self, attribute_name, None)
 
-            attribute = getattr(self, self.path_to_attribute[path], None)
+            # Skip attributes, which were not changed since the last save
+            # (without copying and encoding them)
+            fingerprint = _get_fingerprint(attribute)
+            if fingerprint is not None:
+                if self._fingerprints.get(attribute_name) == fingerprint:
+                    continue
+                fingerprints[attribute_name] = fingerprint
 
             # Make sure the tuples are encoded correctly
             if isinstance(attribute, dict):
@@ -377,11 +490,18 @@ class Project:
                 encode_tuples(attribute)
 
             try:
-                with open(path, "w") as file:
-                    json.dump(attribute, file, cls=TypedJSONEncoder, indent=4)
-
-            except json.JSONDecodeError as err:
-                logger().warning(f"There is a problem with path:\n" f"{err}")
+                value = json.dumps(attribute, cls=TypedJSONEncoder)
+            except (TypeError, ValueError) as err:
+                logger().warning(f"{attribute_name} can't be saved:\n{err}")
+                fingerprints.pop(attribute_name, None)
+                continue
+            # Only changed attributes are written
+            if stored_attributes.get(attribute_name) != value:
+                changed_attributes[attribute_name] = value
+
+        self.store.write(changed_attributes)
+        stored_attributes.update(changed_attributes)
+        self._fingerprints.update(fingerprints)
 
     def add_meeg(self, name, file_path=None, is_erm=False):
         if is_erm:
@@ -465,9 +585,10 @@ class Project:
         pass
 
     def check_data(self):
+        file_index = self.get_file_index()
         missing_objects = [
             x
-            for x in listdir(self.data_path)
+            for x in file_index.listdir(self.data_path)
             if x != "grand_averages"
             and x not in self.all_meeg
             and x not in self.all_erm
@@ -478,6 +599,7 @@ class Project:
 
         # Get Freesurfer-folders (with 'surf'-folder)
         # from subjects_dir (excluding .files for Mac)
+        # (the subjects-directory is not indexed)
         read_dir = sorted(
             [f for f in os.listdir(self.ct.subjects_dir) if not f.startswith(".")],
             key=str.lower,
@@ -531,6 +653,7 @@ class Project:
                     return
 
     def clean_plot_files(self, worker_signals=None):
+        file_index = self.get_file_index()
         all_image_paths = list()
         # Remove object-keys which no longer exist
         remove_obj = list()
@@ -592,7 +715,7 @@ class Project:
                                         join(self.figures_path, rel_image_path)
                                     )
                                     if (
-                                        not isfile(image_path)
+                                        not file_index.isfile(image_path)
                                         or self.figures_path in rel_image_path
                                     ):
                                         self.plot_files[obj_key][p_preset][func].remove(
@@ -626,14 +749,13 @@ class Project:
         free_space = 0
         logger().info("Removing unregistered images...")
         n_removed_images = 0
-        for root, _, files in os.walk(self.figures_path):
-            files = [join(root, f) for f in files]
-            for file_path in [
-                fp for fp in files if str(Path(fp)) not in all_image_paths
-            ]:
-                free_space += getsize(file_path)
+        all_image_paths = set(all_image_paths)
+        for entry in file_index.get_files(self.figures_path):
+            if str(Path(entry.path)) not in all_image_paths:
+                free_space += entry.size
                 n_removed_images += 1
-                os.remove(file_path)
+                os.remove(entry.path)
+                file_index.update(entry.path)
         logger().info(f"Removed {n_removed_images} images")
 
         # Remove empty folders (loop until all empty folders are removed)
@@ -648,6 +770,7 @@ class Project:
                 folders = [join(root, fd) for fd in folders]
                 for folder in [fdp for fdp in folders if len(listdir(fdp)) == 0]:
                     os.rmdir(folder)
+                    file_index.update(folder)
                     n_removed_folders += 1
                     folder_loop = True
         logger().info(f"Removed {n_removed_folders} folders")
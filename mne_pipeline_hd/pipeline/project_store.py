@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import sqlite3
+from contextlib import closing
+
+
+class ProjectStore:
+    """A SQLite-database storing the JSON-encoded attributes of a project.
+
+    The database uses write-ahead-logging, so readers (e.g. other processes)
+    are not blocked while the changed attributes are written
+    in one transaction. Connections are only opened for each operation.
+
+    Parameters
+    ----------
+    path : str
+        The path of the database-file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS attributes "
+            "(name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+        return connection
+
+    def read(self):
+        """Read all attributes.
+
+        Returns
+        -------
+        attributes : dict
+            The JSON-encoded value for each attribute-name.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT name, value FROM attributes").fetchall()
+
+        return dict(rows)
+
+    def write(self, attributes):
+        """Write attributes in one transaction.
+
+        Parameters
+        ----------
+        attributes : dict
+            The JSON-encoded value for each attribute-name.
+        """
+        if len(attributes) == 0:
+            return
+        with closing(self._connect()) as connection:
+            # The connection as context-manager commits or rolls back
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO attributes (name, value) VALUES (?, ?)",
+                    attributes.items(),
+                )
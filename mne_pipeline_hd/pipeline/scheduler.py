@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Martin Schulz <dev@mgschulz.de>
+License: BSD 3-Clause
+Github: https://github.com/marsipu/mne-pipeline-hd
+"""
+
+import ast
+import inspect
+import textwrap
+from os.path import getmtime, isfile, join
+from pathlib import Path
+
+from mne_pipeline_hd.pipeline.loading import BaseLoading, FSMRI, Group, MEEG
+from mne_pipeline_hd.pipeline.pipeline_utils import compare_filep, logger
+
+io_classes = {"MEEG": MEEG, "FSMRI": FSMRI, "Group": Group}
+
+
+def get_io_maps(ct, obj_types):
+    """Map the names of load-/save-methods and of path-attributes
+    to the data-types from the io_dict of the loading-classes.
+
+    Parameters
+    ----------
+    ct : Controller
+        The controller of the run.
+    obj_types : dict
+        The object-type for each object-name in the run.
+
+    Returns
+    -------
+    method_map : dict
+        method-name: (object-type, data-type, has_no_path)
+    path_map : dict
+        attribute-name: (object-type, data-type)
+    """
+    # Initialize an example object for each object-type
+    objects = dict()
+    for obj_name, obj_type in obj_types.items():
+        if obj_type in io_classes and obj_type not in objects:
+            objects[obj_type] = io_classes[obj_type](obj_name, ct)
+
+    method_map = dict()
+    path_map = dict()
+    for obj in objects.values():
+        obj_type = type(obj).__name__
+        for data_type, io in obj.io_dict.items():
+            for method in ["load", "save"]:
+                if io[method] is not None:
+                    method_map[io[method].__name__] = (
+                        obj_type,
+                        data_type,
+                        io["path"] is None,
+                    )
+            if io["path"] is None:
+                continue
+            for attr_name, value in vars(obj).items():
+                if value is io["path"]:
+                    path_map[attr_name] = (obj_type, data_type)
+
+    return method_map, path_map
+
+
+class FunctionIO:
+    """Find the data-types a function loads and saves
+    by analyzing its source-code."""
+
+    def __init__(self, method_map, path_map, parameters):
+        self.method_map = method_map
+        self.path_map = path_map
+        self.parameters = parameters
+
+        self.loads = set()
+        self.saves = set()
+        self._visited = set()
+
+    def _resolve(self, node, func_params):
+        # Data-types are given directly or as the name of a parameter
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        elif isinstance(node, ast.Name) and node.id in func_params:
+            value = self.parameters.get(node.id)
+            if isinstance(value, str):
+                return value
+
+        return None
+
+    def _add(self, is_save, obj_type, data_type):
+        if data_type is None:
+            return
+        if is_save:
+            self.saves.add((obj_type, data_type))
+        else:
+            self.loads.add((obj_type, data_type))
+
+    def _add_call(self, node, obj_type, func_params):
+        name = node.func.attr
+        args = node.args
+        kwargs = {kw.arg: kw.value for kw in node.keywords}
+        if name in ["load", "save", "remove_path"]:
+            if len(args) > 0:
+                data_type = self._resolve(args[0], func_params)
+                self._add(name != "load", obj_type, data_type)
+        elif name in ["load_json", "save_json", "remove_json"]:
+            if len(args) > 0:
+                file_name = self._resolve(args[0], func_params)
+                if file_name is not None:
+                    self._add(name != "load_json", obj_type, f"{file_name}.json")
+        elif name == "load_items":
+            item_type = kwargs.get("obj_type", args[0] if len(args) > 0 else None)
+            item_type = self._resolve(item_type, func_params) or "MEEG"
+            data_type = kwargs.get("data_type", args[1] if len(args) > 1 else None)
+            self._add(False, item_type, self._resolve(data_type, func_params))
+        elif name in self.method_map:
+            io_type, data_type, has_no_path = self.method_map[name]
+            self._add(name.startswith("save"), io_type, data_type)
+            # Data-types without path are derived from other data-types
+            if has_no_path:
+                self.analyze(getattr(io_classes[io_type], name), io_type)
+        elif not hasattr(BaseLoading, name):
+            # Helper-methods of the loading-classes
+            for cls_type in [obj_type] + list(io_classes):
+                method = getattr(io_classes.get(cls_type), name, None)
+                if callable(method):
+                    self.analyze(method, cls_type)
+                    break
+            else:
+                if name.startswith(("load_", "save_")):
+                    # Data which is not in io_dict
+                    self._add(name.startswith("save"), obj_type, name[5:])
+
+    def analyze(self, func, obj_type):
+        """Analyze func (running for obj_type)
+
+        Returns
+        -------
+        analyzed : bool
+            False if the source-code of func is not available.
+        """
+        if func in self._visited:
+            return True
+        self._visited.add(func)
+        try:
+            source = textwrap.dedent(inspect.getsource(func))
+            tree = ast.parse(source)
+        except (OSError, TypeError, SyntaxError):
+            return False
+        func_params = set(inspect.signature(func).parameters)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                self._add_call(node, obj_type, func_params)
+            elif isinstance(node, ast.Attribute) and node.attr in self.path_map:
+                self.loads.add(self.path_map[node.attr])
+
+        return True
+
+
+def get_function_io(ct, func_name, method_map, path_map):
+    """Get the data-types a function loads and saves.
+
+    Parameters
+    ----------
+    ct : Controller
+        The controller of the run.
+    func_name : str
+        The name of the function.
+    method_map : dict
+        The method-map from get_io_maps.
+    path_map : dict
+        The path-map from get_io_maps.
+
+    Returns
+    -------
+    loads : set | None
+        (object-type, data-type) for each loaded data-type
+         (None if nothing could be found).
+    saves : set | None
+        (object-type, data-type) for each saved data-type
+         (None if nothing could be found).
+    """
+    function_entry = ct.get_function_registry()[func_name]
+    obj_type = function_entry.target
+    func = function_entry.func
+    parameters = ct.pr.parameters[ct.pr.p_preset]
+
+    function_io = FunctionIO(method_map, path_map, parameters)
+    analyzed = function_io.analyze(func, obj_type)
+    if not analyzed or len(function_io.loads | function_io.saves) == 0:
+        return None, None
+
+    return function_io.loads, function_io.saves
+
+
+def _get_related_objects(ct, obj_name, obj_type, parameters):
+    # Objects, from which an object may load data
+    related = {"MEEG": set(), "FSMRI": set(), "Group": set()}
+    if obj_type in related:
+        related[obj_type].add(obj_name)
+    if obj_type == "MEEG":
+        if obj_name in ct.pr.meeg_to_fsmri:
+            related["FSMRI"].add(ct.pr.meeg_to_fsmri[obj_name])
+        related["FSMRI"].add(parameters["morph_to"])
+    elif obj_type == "Group":
+        related["MEEG"].update(ct.pr.all_groups.get(obj_name, list()))
+        related["FSMRI"].add(parameters["morph_to"])
+
+    return related
+
+
+def get_step_dependencies(ct, steps, obj_types, function_ios):
+    """Get the dependencies between pipeline-steps from the data-types
+    in io_dict which their functions load and save.
+
+    The steps of one object are always run one after another, because
+    each step returns the project-entries of its object
+    (e.g. plot_files or bad channels) and appends to its file-parameters.
+
+    Parameters
+    ----------
+    ct : Controller
+        The controller of the run.
+    steps : list of tuple
+        (object-name, function-name) for each step in pipeline-order.
+    obj_types : dict
+        The object-type for each object-name.
+    function_ios : dict
+        (loads, saves) from get_function_io for each function-name.
+
+    Returns
+    -------
+    dependencies : list of set
+        The indices of the steps each step depends on.
+    """
+    parameters = ct.pr.parameters[ct.pr.p_preset]
+
+    dependencies = [set() for _ in steps]
+    # The step which saved a resource last
+    last_save = dict()
+    # The steps which loaded a resource since the last save
+    loads_since_save = dict()
+    # The last step for each function and object
+    last_step = dict()
+    # The last step for each object
+    last_object_step = dict()
+    for idx, (obj_name, func_name) in enumerate(steps):
+        obj_type = obj_types[obj_name]
+        # Functions without object depend on all steps before
+        if obj_type not in io_classes:
+            dependencies[idx] = set(range(idx))
+            continue
+
+        # Depend on the step before for the same object
+        if (obj_type, obj_name) in last_object_step:
+            dependencies[idx].add(last_object_step[(obj_type, obj_name)])
+
+        related = _get_related_objects(ct, obj_name, obj_type, parameters)
+        loads, saves = function_ios[func_name]
+        if loads is None:
+            # Without known data-types, the step is a barrier for its object
+            barrier = (obj_type, obj_name, "*")
+            load_resources = set()
+            save_resources = {barrier}
+        else:
+            load_resources = {
+                (io_type, name, data_type)
+                for io_type, data_type in loads
+                for name in related[io_type]
+            }
+            save_resources = {
+                (io_type, name, data_type)
+                for io_type, data_type in saves
+                for name in related[io_type]
+            }
+        # Depend on barriers of all related objects
+        load_resources.update(
+            {
+                (rel_type, name, "*")
+                for rel_type, names in related.items()
+                for name in names
+            }
+        )
+        load_resources -= save_resources
+
+        for resource in load_resources:
+            if resource in last_save:
+                dependencies[idx].add(last_save[resource])
+        for resource in save_resources:
+            if resource in last_save:
+                dependencies[idx].add(last_save[resource])
+            dependencies[idx].update(loads_since_save.get(resource, list()))
+            if resource[2] == "*":
+                # A barrier depends on every step before for this object
+                for other in loads_since_save:
+                    if other[:2] == resource[:2]:
+                        dependencies[idx].update(loads_since_save[other])
+                for other in last_save:
+                    if other[:2] == resource[:2]:
+                        dependencies[idx].add(last_save[other])
+
+        # Explicit dependencies from the dependencies-column (functions.csv)
+        explicit = ct.pd_funcs.loc[func_name, "dependencies"]
+        if isinstance(explicit, str):
+            for dep_func in [d.strip() for d in explicit.split(",") if d.strip()]:
+                for rel_type, names in related.items():
+                    for name in names:
+                        dep_step = last_step.get((dep_func, rel_type, name))
+                        if dep_step is not None:
+                            dependencies[idx].add(dep_step)
+
+        for resource in load_resources:
+            loads_since_save.setdefault(resource, list()).append(idx)
+        for resource in save_resources:
+            last_save[resource] = idx
+            loads_since_save[resource] = list()
+        last_step[(func_name, obj_type, obj_name)] = idx
+        last_object_step[(obj_type, obj_name)] = idx
+        dependencies[idx].discard(idx)
+
+    logger().debug(
+        f"Found {sum([len(d) for d in dependencies])} dependencies "
+        f"between {len(steps)} steps"
+    )
+
+    return dependencies
+
+
+def get_data_paths(obj, data_type):
+    """Get the paths of obj for data_type (None if they are unknown)."""
+    if data_type.endswith(".json"):
+        return [join(obj.save_dir, f"{obj.name}_{obj.p_preset}_{data_type}")]
+    elif data_type in obj.io_dict and obj.io_dict[data_type]["path"] is not None:
+        return obj._return_path_list(data_type)
+
+    return None
+
+
+def get_existing_files(path):
+    """Get the existing files for path
+    (Source-Estimates are saved with an appendix for each hemisphere)."""
+    if isfile(path):
+        return [path]
+
+    return [p for p in [path + "-lh.stc", path + "-rh.stc"] if isfile(p)]
+
+
+def get_input_objects(obj, io_type):
+    """Get the objects, from which obj loads data of io_type."""
+    if io_type == type(obj).__name__:
+        return [obj]
+    elif io_type == "FSMRI" and getattr(obj, "fsmri", None) is not None:
+        return [obj.fsmri]
+    elif io_type == "MEEG" and isinstance(obj, Group):
+        return [MEEG(name, obj.ct, fsmri=obj.fsmri) for name in obj.group_list]
+
+    return list()
+
+
+def is_up_to_date(obj, func_name, loads, saves):
+    """Check if a step can be skipped (like in make), because the outputs
+    of func_name for obj exist, were saved by func_name with the same
+    critical parameters and are newer than its inputs.
+
+    Parameters
+    ----------
+    obj : MEEG | FSMRI | Group
+        The object of the step.
+    func_name : str
+        The name of the function of the step.
+    loads : set | None
+        The loaded data-types from get_function_io.
+    saves : set | None
+        The saved data-types from get_function_io.
+
+    Returns
+    -------
+    up_to_date : bool
+        True if the step can be skipped.
+    """
+    if obj.ct.settings["overwrite"] or not saves:
+        return False
+
+    func_args = obj.ct.get_function_registry()[func_name].func_args
+    critical_params = [p for p in func_args if p in obj.pa]
+
+    output_times = list()
+    for io_type, data_type in saves:
+        if io_type != type(obj).__name__:
+            return False
+        paths = get_data_paths(obj, data_type)
+        if not paths:
+            return False
+        for path in paths:
+            files = get_existing_files(path)
+            if len(files) == 0:
+                return False
+            for file in files:
+                file_params = obj.file_parameters.get(Path(file).name, dict())
+                functions = file_params.get("FUNCTIONS", [file_params.get("FUNCTION")])
+                if func_name not in functions:
+                    return False
+                if len(critical_params) > 0:
+                    results = compare_filep(obj, file, critical_params, verbose=False)
+                    if any([results[p] != "equal" for p in critical_params]):
+                        return False
+                output_times.append(getmtime(file))
+
+    # Inputs which are not changed in place must be older than the outputs
+    input_times = list()
+    for io_type, data_type in loads - saves:
+        for input_obj in get_input_objects(obj, io_type):
+            for path in get_data_paths(input_obj, data_type) or list():
+                input_times += [getmtime(f) for f in get_existing_files(path)]
+    if len(input_times) > 0 and max(input_times) > min(output_times):
+        return False
+
+    return True
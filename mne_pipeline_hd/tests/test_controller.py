@@ -55,3 +55,60 @@ def test_project_management(tmpdir, monkeypatch):
     _check_project(ct, "test3")
 
     assert len(ct.projects) == 2
+
+
+def test_lazy_imports():
+    import subprocess
+    import sys
+
+    # Heavy modules are only imported when they are needed
+    script = (
+        "import sys\n"
+        "import mne_pipeline_hd.pipeline.controller\n"
+        "import mne_pipeline_hd.pipeline.function_utils\n"
+        "heavy = ['matplotlib.pyplot', 'mne_connectivity', 'pandas', "
+        "'qtpy.QtWidgets', 'tqdm']\n"
+        "assert not any([m in sys.modules for m in heavy]), "
+        "[m for m in heavy if m in sys.modules]\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+def test_function_registry(tmpdir):
+    import os
+    from importlib import resources
+
+    from mne_pipeline_hd import extra
+    from mne_pipeline_hd.pipeline import function_registry
+    from mne_pipeline_hd.pipeline.function_registry import read_registry_csv
+
+    ct = Controller(tmpdir, "test")
+    registry = ct.get_function_registry()
+    assert ct.get_function_registry() is registry
+    entry = registry["filter_data"]
+    assert entry.func.__name__ == "filter_data"
+    assert entry.func is registry["filter_data"].func
+    assert entry.target == "MEEG"
+    assert "highpass" in entry.func_args
+    assert "meeg" in entry.arguments
+    # The registry is built again for changed functions
+    ct.pd_funcs = ct.pd_funcs.drop(index="filter_data")
+    assert "filter_data" not in ct.get_function_registry()
+
+    # The parsed csv-file is cached on disk until the file changes
+    csv_path = tmpdir.join("functions.csv")
+    csv_path.write_text(
+        (resources.files(extra) / "functions.csv").read_text(), encoding="utf-8"
+    )
+    cache_path = tmpdir.join("cache")
+    pd_funcs = read_registry_csv(csv_path, cache_path)
+    assert len(os.listdir(cache_path)) == 1
+    function_registry._csv_cache.clear()
+    assert read_registry_csv(csv_path, cache_path).equals(pd_funcs)
+    csv_path.write_text(
+        csv_path.read_text(encoding="utf-8").replace("filter_data", "filter_raw"),
+        encoding="utf-8",
+    )
+    pd_funcs = read_registry_csv(csv_path, cache_path)
+    assert "filter_raw" in pd_funcs.index
+    assert "filter_data" not in pd_funcs.index
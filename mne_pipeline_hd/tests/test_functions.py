@@ -4,10 +4,17 @@ Authors: Martin Schulz <dev@mgschulz.de>
 License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
-# from mne_pipeline_hd.pipeline.function_utils import RunController
-# from mne_pipeline_hd.pipeline.loading import MEEG
-#
-#
+from copy import deepcopy
+from os import mkdir, remove, utime
+from os.path import getmtime, isfile, join, samefile
+from pathlib import Path
+
+from mne_pipeline_hd.pipeline.controller import Controller
+from mne_pipeline_hd.pipeline.function_utils import RunController
+from mne_pipeline_hd.pipeline.loading import MEEG
+from mne_pipeline_hd.pipeline.pipeline_utils import QS
+from mne_pipeline_hd.pipeline.scheduler import get_step_dependencies
+
 # def test_all_functions(controller):
 #     controller.pr.sel_functions = list(controller.pd_funcs.index)
 #     controller.sel_meeg = ['_sample_', '_test_']
@@ -31,3 +38,538 @@ Github: https://github.com/marsipu/mne-pipeline-hd
 #     meeg = MEEG('_sample_', controller)
 #     epochs = meeg.load_epochs()
 #     assert epochs.data.shape[1] == 37
+
+test_module = """
+def save_test_json(meeg):
+    meeg.save_json("test", {"name": meeg.name})
+    meeg.set_bad_channels(["MEG 0111"])
+
+
+def copy_test_json(meeg):
+    meeg.save_json("test_copy", meeg.load_json("test"))
+"""
+test_functions_csv = (
+    ";alias;target;tab;group;matplotlib;mayavi;dependencies;module;pkg_name;func_args\n"
+    "save_test_json;;MEEG;Compute;Test;False;False;;test_run_module;;meeg\n"
+    "copy_test_json;;MEEG;Compute;Test;False;False;;test_run_module;;meeg\n"
+)
+test_parameters_csv = ";alias;group;default;unit;description;gui_type;gui_args\n"
+
+
+def _add_test_package(home_path):
+    pkg_path = join(home_path, "custom_packages", "test_run_pkg")
+    mkdir(pkg_path)
+    with open(join(pkg_path, "test_run_module.py"), "w") as file:
+        file.write(test_module)
+    with open(join(pkg_path, "test_run_pkg_functions.csv"), "w") as file:
+        file.write(test_functions_csv)
+    with open(join(pkg_path, "test_run_pkg_parameters.csv"), "w") as file:
+        file.write(test_parameters_csv)
+
+
+def test_parallel_run(controller):
+    _add_test_package(controller.home_path)
+    ct = Controller(controller.home_path, "test")
+    meeg_names = ["a", "b", "c"]
+    ct.pr.all_meeg = meeg_names
+    ct.pr.sel_meeg = meeg_names
+    ct.pr.sel_functions = ["save_test_json", "copy_test_json"]
+
+    QS().setValue("n_parallel", 2)
+    try:
+        rc = RunController(ct)
+        rc.start()
+    finally:
+        QS().setValue("n_parallel", 1)
+
+    assert len(rc.errors) == 0
+    assert rc.prog_count == 2 * len(meeg_names)
+    for name in meeg_names:
+        assert MEEG(name, ct).load_json("test_copy") == {"name": name}
+        # Changes to the project in the worker-process are merged
+        assert ct.pr.meeg_bad_channels[name] == ["MEG 0111"]
+
+
+def test_step_dependencies(controller):
+    _add_test_package(controller.home_path)
+    ct = Controller(controller.home_path, "test")
+    ct.pr.all_meeg = ["a", "b"]
+    ct.pr.sel_meeg = ["a", "b"]
+    ct.pr.sel_functions = ["save_test_json", "copy_test_json"]
+    rc = RunController(ct)
+    obj_types = {name: info["type"] for name, info in rc.all_objects.items()}
+
+    function_ios = {f: rc.get_function_io(f) for f in ct.pr.sel_functions}
+
+    dependencies = get_step_dependencies(ct, rc.all_steps, obj_types, function_ios)
+    steps = rc.all_steps
+    for idx, (obj_name, func_name) in enumerate(steps):
+        if func_name == "copy_test_json":
+            # copy_test_json loads what save_test_json saved for the same object
+            assert [steps[d] for d in dependencies[idx]] == [
+                (obj_name, "save_test_json")
+            ]
+        else:
+            assert len(dependencies[idx]) == 0
+
+    # Steps of the same object run one after another,
+    # even if they only load data
+    load_ios = {"copy_test_json": ({("MEEG", "test.json")}, set())}
+    steps = [("a", "copy_test_json"), ("b", "copy_test_json"), ("a", "copy_test_json")]
+    dependencies = get_step_dependencies(ct, steps, obj_types, load_ios)
+    assert dependencies == [set(), set(), {0}]
+
+
+def test_skip_up_to_date(controller):
+    _add_test_package(controller.home_path)
+    ct = Controller(controller.home_path, "test")
+    ct.pr.all_meeg = ["a"]
+    ct.pr.sel_meeg = ["a"]
+    ct.pr.sel_functions = ["save_test_json", "copy_test_json"]
+    RunController(ct).start()
+    meeg = MEEG("a", ct)
+    test_path = join(meeg.save_dir, f"a_{meeg.p_preset}_test.json")
+    copy_path = join(meeg.save_dir, f"a_{meeg.p_preset}_test_copy.json")
+    # Make the outputs older to detect if they were saved again
+    for path in [test_path, copy_path]:
+        utime(path, (0, 0))
+
+    # Both steps are up-to-date
+    RunController(ct).start()
+    assert getmtime(test_path) == 0
+    assert getmtime(copy_path) == 0
+
+    # The input of copy_test_json is newer than its output
+    utime(test_path, (1, 1))
+    RunController(ct).start()
+    assert getmtime(test_path) == 1
+    assert getmtime(copy_path) > 1
+
+    # Overwrite runs all steps again
+    ct.settings["overwrite"] = True
+    RunController(ct).start()
+    assert getmtime(test_path) > 1
+
+
+def test_result_cache(controller):
+    _add_test_package(controller.home_path)
+    ct = Controller(controller.home_path, "test")
+    ct.settings["use_cache"] = True
+    ct.pr.all_meeg = ["a"]
+    ct.pr.sel_meeg = ["a"]
+    ct.pr.sel_functions = ["save_test_json", "copy_test_json"]
+    RunController(ct).start()
+    default_meeg = MEEG("a", ct)
+
+    # Switching to another Parameter-Preset with the same parameters
+    # reuses the outputs
+    ct.pr.parameters["Other"] = deepcopy(ct.pr.parameters["Default"])
+    ct.pr.p_preset = "Other"
+    rc = RunController(ct)
+    rc.start()
+    assert len(rc.errors) == 0
+    other_meeg = MEEG("a", ct)
+    default_path = join(default_meeg.save_dir, "a_Default_test_copy.json")
+    other_path = join(other_meeg.save_dir, "a_Other_test_copy.json")
+    assert samefile(default_path, other_path)
+    assert other_meeg.file_parameters[Path(other_path).name]["P_PRESET"] == "Other"
+    assert other_meeg.load_json("test_copy") == {"name": "a"}
+    # save_test_json changed the bad channels in the first run,
+    # so it runs again with the changed project
+    default_path = join(default_meeg.save_dir, "a_Default_test.json")
+    other_path = join(other_meeg.save_dir, "a_Other_test.json")
+    assert not samefile(default_path, other_path)
+
+    # Saving again doesn't change the cached files
+    other_meeg.save_json("test", {"name": "changed"})
+    assert default_meeg.load_json("test") == {"name": "a"}
+
+    # The changes to the project are restored together with the outputs
+    ct.pr.meeg_bad_channels.pop("a")
+    ct.pr.parameters["Third"] = deepcopy(ct.pr.parameters["Default"])
+    ct.pr.p_preset = "Third"
+    RunController(ct).start()
+    third_meeg = MEEG("a", ct)
+    default_path = join(default_meeg.save_dir, "a_Default_test.json")
+    third_path = join(third_meeg.save_dir, "a_Third_test.json")
+    assert samefile(default_path, third_path)
+    assert ct.pr.meeg_bad_channels["a"] == ["MEG 0111"]
+
+
+def test_find_6ch_binary_events(controller):
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import find_6ch_binary_events
+
+    controller.pr.add_meeg("a")
+    meeg = MEEG("a", controller)
+    stim_channels = [f"STI 00{idx}" for idx in range(1, 7)]
+    info = mne.create_info(stim_channels, 1000, "stim")
+    data = np.zeros((6, 2000))
+    # Channels of the same event may have their onsets one sample apart
+    expected = [[100, 0, 63], [500, 0, 5], [900, 0, 1], [1300, 0, 48]]
+    for sample, _, code in expected:
+        for bit in range(6):
+            if code & 2**bit:
+                data[bit, sample + bit % 2 : sample + 50] = 1
+    # Pulses running from the start and pulses shorter than min_duration
+    # are no events
+    data[0, :20] = 1
+    data[3, 1700] = 1
+    meeg.save_raw(mne.io.RawArray(data, info, first_samp=10))
+
+    find_6ch_binary_events(meeg, 0.002, 1, 1)
+    events = meeg.load_events()
+    assert np.array_equal(events, np.asarray(expected) + [11, 0, 0])
+
+
+def test_filter_chunked(controller):
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import filter_data
+
+    controller.pr.add_meeg("a")
+    meeg = MEEG("a", controller)
+    info = mne.create_info(["MEG 0111", "MEG 0112"], 1000, "mag")
+    raw = mne.io.RawArray(np.random.RandomState(0).randn(2, 30000), info)
+    raw.set_annotations(mne.Annotations([12], [0], ["edge"]))
+    meeg.save_raw(raw)
+
+    filter_kwargs = dict(
+        filter_target="raw",
+        highpass=1,
+        lowpass=40,
+        filter_length="auto",
+        l_trans_bandwidth="auto",
+        h_trans_bandwidth="auto",
+        filter_method="fir",
+        iir_params=None,
+        fir_phase="zero",
+        fir_window="hamming",
+        fir_design="firwin",
+        skip_by_annotation=["edge", "bad_acq_skip"],
+        fir_pad="reflect_limited",
+        n_jobs=1,
+        enable_cuda=False,
+        erm_t_limit=None,
+        bad_interpolation=None,
+    )
+    filter_data(meeg, **filter_kwargs)
+    expected = meeg.load_filtered()
+    remove(meeg.raw_filtered_path)
+    filter_data(meeg, **filter_kwargs, filter_chunk_duration=4)
+    filtered = meeg.load_filtered()
+    assert np.allclose(filtered.get_data(), expected.get_data(), atol=1e-12)
+    assert filtered.info["highpass"] == 1
+    assert filtered.info["lowpass"] == 40
+
+
+def test_source_estimate_batched(controller):
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import source_estimate
+
+    # Small EEG-setup with a spherical head-model
+    rng = np.random.RandomState(0)
+    montage = mne.channels.make_standard_montage("standard_1020")
+    info = mne.create_info(montage.ch_names[:32], 200, "eeg")
+    info.set_montage(montage)
+    sphere = mne.make_sphere_model("auto", "auto", info)
+    pos = {"rr": rng.uniform(-0.04, 0.04, (50, 3)), "nn": np.tile([0, 0, 1], (50, 1))}
+    src = mne.setup_volume_source_space(pos=pos, sphere=sphere)
+    fwd = mne.make_forward_solution(info, None, src, sphere)
+    fwd = mne.convert_forward_solution(fwd, force_fixed=True)
+    evokeds = list()
+    for trial, nave in zip(["a", "b", "c"], [10, 10, 7]):
+        evoked = mne.EvokedArray(
+            rng.randn(32, 40) * 1e-6, info, tmin=-0.1, nave=nave, comment=trial
+        )
+        evoked.set_eeg_reference(projection=True)
+        evokeds.append(evoked)
+    inv = mne.minimum_norm.make_inverse_operator(
+        evokeds[0].info, fwd, mne.make_ad_hoc_cov(info), fixed=True, depth=None
+    )
+
+    controller.pr.add_meeg("a")
+    controller.pr.sel_event_id["a"] = {"a": None, "b": None, "c": None}
+    meeg = MEEG("a", controller)
+    meeg.save_inverse_operator(inv)
+    meeg.save_evokeds(evokeds)
+
+    source_estimate(meeg, "dSPM", None, 1 / 9, True)
+    kernels = meeg.load_inverse_kernels()
+    # Compare to the saved inverse operator (with single precision)
+    inv = meeg.load_inverse_operator()
+    for evoked in meeg.load_evokeds():
+        expected = mne.minimum_norm.apply_inverse(evoked, inv, 1 / 9, "dSPM")
+        stc = mne.read_source_estimate(f"{meeg.stc_paths[evoked.comment]}-vl.stc")
+        assert np.allclose(stc.data, expected.data, rtol=1e-4)
+        assert np.allclose(stc.times, expected.times)
+        kernel = kernels[evoked.comment]
+        data = evoked.copy().pick(kernel["ch_names"]).data
+        assert np.allclose(np.dot(kernel["kernel"], data), expected.data)
+    # Evokeds with the same averages share one stored kernel
+    assert kernels["a"] is kernels["b"]
+    assert kernels["a"] is not kernels["c"]
+
+
+def test_label_weights_excluded_vertices():
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import _get_label_weights
+
+    rng = np.random.RandomState(0)
+    src = [{"vertno": np.arange(10), "nn": rng.randn(10, 3)} for _ in range(2)]
+    # The forward-solution excluded vertex 3 of the label
+    vertices = [np.array([0, 1, 2, 4, 5, 8]), np.arange(10)]
+    label = mne.Label(np.arange(6), hemi="lh", name="test")
+
+    weights = _get_label_weights(vertices, [label], src, "mean_flip")
+    used_label = mne.Label(np.array([0, 1, 2, 4, 5]), hemi="lh")
+    expected = mne.label_sign_flip(used_label, src) / 5
+    assert np.allclose(weights[0, :5], expected)
+    assert np.all(weights[0, 5:] == 0)
+
+
+def test_mixn_stc_from_dipoles():
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import _make_mixn_stc
+
+    rng = np.random.RandomState(0)
+    montage = mne.channels.make_standard_montage("standard_1020")
+    info = mne.create_info(montage.ch_names[:32], 200, "eeg")
+    info.set_montage(montage)
+    sphere = mne.make_sphere_model("auto", "auto", info)
+    pos = {"rr": rng.uniform(-0.04, 0.04, (50, 3)), "nn": np.tile([0, 0, 1], (50, 1))}
+    src = mne.setup_volume_source_space(pos=pos, sphere=sphere)
+    fwd = mne.make_forward_solution(info, None, src, sphere)
+    evoked = mne.EvokedArray(rng.randn(32, 40) * 1e-6, info, nave=20)
+    evoked.set_eeg_reference(projection=True)
+    cov = mne.make_ad_hoc_cov(info)
+
+    kwargs = dict(maxit=100, n_mxne_iter=2, active_set_size=10)
+    dipoles = mne.inverse_sparse.mixed_norm(
+        evoked, fwd, cov, 30, return_as_dipoles=True, **kwargs
+    )
+    # The source estimates from the dipoles of one solve are the same
+    # as from solving again
+    for pick_ori in [None, "vector"]:
+        expected = mne.inverse_sparse.mixed_norm(
+            evoked, fwd, cov, 30, pick_ori=pick_ori, **kwargs
+        )
+        stc = _make_mixn_stc(
+            dipoles, fwd, pick_ori, evoked.times[0], 1 / 200, len(evoked.times)
+        )
+        assert type(stc) is type(expected)
+        assert np.array_equal(np.concatenate(stc.vertices), expected.vertices[0])
+        assert np.allclose(stc.data, expected.data)
+
+
+def test_mixed_norm_estimate_parallel(controller):
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import mixed_norm_estimate
+
+    rng = np.random.RandomState(0)
+    montage = mne.channels.make_standard_montage("standard_1020")
+    info = mne.create_info(montage.ch_names[:32], 200, "eeg")
+    info.set_montage(montage)
+    sphere = mne.make_sphere_model("auto", "auto", info)
+    pos = {"rr": rng.uniform(-0.04, 0.04, (50, 3)), "nn": np.tile([0, 0, 1], (50, 1))}
+    src = mne.setup_volume_source_space(pos=pos, sphere=sphere)
+    fwd = mne.make_forward_solution(info, None, src, sphere)
+    evokeds = list()
+    for trial in ["a", "b"]:
+        evoked = mne.EvokedArray(rng.randn(32, 40) * 1e-6, info, nave=20, comment=trial)
+        evoked.set_eeg_reference(projection=True)
+        evokeds.append(evoked)
+    cov = mne.make_ad_hoc_cov(info)
+    inv = mne.minimum_norm.make_inverse_operator(evokeds[0].info, fwd, cov)
+
+    controller.pr.add_meeg("a")
+    controller.pr.sel_event_id["a"] = {"a": None, "b": None}
+    meeg = MEEG("a", controller)
+    meeg.save_forward(fwd)
+    meeg.save_noise_covariance(cov)
+    meeg.save_inverse_operator(inv)
+    meeg.save_evokeds(evokeds)
+
+    # n_jobs is passed from the parameters
+    func_args = controller.get_function_registry()["mixed_norm_estimate"].func_args
+    assert "n_jobs" in func_args
+    stc_paths = {
+        trial: join(meeg.save_dir, f"a_{trial}_{meeg.p_preset}-mixn-vl.stc")
+        for trial in ["a", "b"]
+    }
+    mixed_norm_estimate(meeg, None, "MNE", 1)
+    expected = {t: mne.read_source_estimate(p) for t, p in stc_paths.items()}
+    mixed_norm_estimate(meeg, None, "MNE", 2)
+    for trial, stc_path in stc_paths.items():
+        stc = mne.read_source_estimate(stc_path)
+        assert len(stc.vertices[0]) > 0
+        assert np.array_equal(stc.vertices[0], expected[trial].vertices[0])
+        assert np.allclose(stc.data, expected[trial].data)
+
+
+def test_ecd_fit_parallel(controller, monkeypatch):
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.functions.operations import ecd_fit
+
+    # Small EEG-setup with a spherical head-model
+    rng = np.random.RandomState(0)
+    montage = mne.channels.make_standard_montage("standard_1020")
+    info = mne.create_info(montage.ch_names[:32], 200, "eeg")
+    info.set_montage(montage)
+    sphere = mne.make_sphere_model("auto", "auto", info)
+    evoked = mne.EvokedArray(rng.randn(32, 20) * 1e-6, info, comment="a")
+    evoked.set_eeg_reference(projection=True)
+
+    # Avoid the fsaverage-download
+    controller.pr.add_fsmri("mri")
+    controller.pr.add_meeg("a")
+    controller.pr.meeg_to_fsmri["a"] = "mri"
+    controller.pr.sel_event_id["a"] = {"a": None}
+    ecd_times = {"a": {"Dip1": (0, 0.02), "Dip2": (0.03, 0.05)}}
+    controller.pr.parameters["Default"]["ecd_times"] = ecd_times
+    meeg = MEEG("a", controller)
+    # Sphere-models can't be saved as BEM-solution
+    monkeypatch.setattr(meeg.fsmri, "load_bem_solution", lambda: sphere)
+    meeg.save_transformation(mne.transforms.Transform("head", "mri"))
+    meeg.save_noise_covariance(mne.make_ad_hoc_cov(info))
+    meeg.save_evokeds([evoked])
+
+    ecd_fit(meeg, ecd_times, dict(), dict(), (-0.1, 0.1), 1)
+    expected = meeg.load_ecd()
+    # The jobs are distributed over the fits
+    # (and inside each fit if there are more jobs than fits)
+    for n_jobs in [2, 4]:
+        ecd_fit(meeg, ecd_times, dict(), dict(), (-0.1, 0.1), n_jobs)
+        dipoles = meeg.load_ecd()
+        for dip in ["Dip1", "Dip2"]:
+            dipole = dipoles["a"][dip]
+            expected_dipole = expected["a"][dip]
+            assert np.allclose(dipole.times, expected_dipole.times)
+            assert np.allclose(dipole.pos, expected_dipole.pos)
+            assert np.allclose(dipole.amplitude, expected_dipole.amplitude)
+            assert np.allclose(dipole.gof, expected_dipole.gof)
+
+
+def test_grand_avg_streaming(controller):
+    import mne
+    import numpy as np
+    import pytest
+
+    from mne_pipeline_hd.functions.operations import grand_avg_evokeds
+    from mne_pipeline_hd.pipeline.accumulators import RunningMean
+    from mne_pipeline_hd.pipeline.loading import Group
+    from mne_pipeline_hd.pipeline.parallel import prefetch_map
+
+    rng = np.random.RandomState(0)
+    arrays = rng.randn(5, 3, 4) + 1j * rng.randn(5, 3, 4)
+    running_mean = RunningMean()
+    for array in arrays:
+        running_mean.add(array)
+    assert np.allclose(running_mean.mean, arrays.mean(axis=0))
+    assert np.allclose(running_mean.variance, arrays.var(axis=0, ddof=1))
+
+    # Subjects with different channels and bad channels
+    ch_names = [f"EEG {idx:03}" for idx in range(8)]
+    controller.pr.all_groups["group"] = ["a", "b", "c"]
+    sel_chs = {"a": ch_names, "b": ch_names[1:], "c": ch_names}
+    bads = {"a": [], "b": ["EEG 004"], "c": ["EEG 005"]}
+    all_evokeds = list()
+    for name in controller.pr.all_groups["group"]:
+        controller.pr.add_meeg(name)
+        controller.pr.sel_event_id[name] = {"a": None}
+        info = mne.create_info(sel_chs[name], 100, "eeg")
+        info["bads"] = bads[name]
+        evoked = mne.EvokedArray(rng.randn(len(sel_chs[name]), 20), info, comment="a")
+        MEEG(name, controller).save_evokeds([evoked])
+        all_evokeds.append(evoked)
+    # Avoid the fsaverage-download
+    controller.pr.add_fsmri("mri")
+    controller.pr.parameters["Default"]["morph_to"] = "mri"
+    group = Group("group", controller)
+    grand_avg_evokeds(group, False, True)
+
+    expected = mne.grand_average(all_evokeds, interpolate_bads=False, drop_bads=True)
+    ga = group.load_ga_evokeds()["a"]
+    assert ga.ch_names == expected.ch_names
+    assert np.allclose(ga.data, expected.data)
+    assert ga.nave == 3
+
+    # Errors while prefetching are raised in the consumer
+    def _load(item):
+        if item == 2:
+            raise RuntimeError("Loading failed")
+        return item
+
+    items = prefetch_map(_load, [0, 1, 2, 3], n_prefetch=2)
+    assert next(items) == 0
+    assert next(items) == 1
+    with pytest.raises(RuntimeError, match="Loading failed"):
+        next(items)
+
+
+def test_headless_run(controller):
+    import subprocess
+    import sys
+
+    _add_test_package(controller.home_path)
+    controller.pr.all_meeg = ["a", "b", "c"]
+    controller.pr.save()
+
+    # The command-line runs without importing Qt-Widgets
+    script = (
+        "import sys\n"
+        "from mne_pipeline_hd.pipeline.cli import run_cli\n"
+        f"exit_code = run_cli(['--home', r'{controller.home_path}', "
+        "'--project', 'test', '--meeg', '0-1', '--progress', 'plain', "
+        "'--functions', 'save_test_json,copy_test_json'])\n"
+        "assert not any(['QtWidgets' in m for m in sys.modules])\n"
+        "sys.exit(exit_code)\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    ct = Controller(controller.home_path, "test")
+    # The selection of the GUI is kept
+    assert ct.pr.sel_meeg == []
+    assert ct.pr.sel_functions == controller.pr.sel_functions
+    for name in ["a", "b"]:
+        assert MEEG(name, ct).load_json("test_copy") == {"name": name}
+        # Changes of the functions are saved
+        assert ct.pr.meeg_bad_channels[name] == ["MEG 0111"]
+    assert not isfile(join(MEEG("c", ct).save_dir, "c_Default_test.json"))
+
+
+def test_current_function(controller):
+    from matplotlib import pyplot as plt
+
+    from mne_pipeline_hd.pipeline.function_utils import run_func
+
+    def _save_helper(meeg):
+        meeg.save_json("test", {"name": meeg.name})
+        fig = plt.figure()
+        meeg.plot_save("test_plot", matplotlib_figure=fig)
+        plt.close(fig)
+
+    def provenance_func(meeg):
+        _save_helper(meeg)
+
+    meeg = MEEG("test", controller)
+    meeg.save_plots = True
+    assert run_func(provenance_func, {"meeg": meeg}) is None
+    # The running function is recorded, not the helper which saved the files
+    file_params = meeg.file_parameters["test_Default_test.json"]
+    assert file_params["FUNCTION"] == "provenance_func"
+    assert "provenance_func" in meeg.plot_files
+    assert "_save_helper" not in meeg.plot_files
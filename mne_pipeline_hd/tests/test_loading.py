@@ -47,3 +47,240 @@ def test_kwargs_geopenfilenames():
 
     signature = inspect.signature(compat.getopenfilenames)
     assert "filters" in signature.parameters
+
+
+def test_data_cache(controller, monkeypatch):
+    import numpy as np
+
+    from mne_pipeline_hd.pipeline import loading
+    from mne_pipeline_hd.pipeline.loading import DataCache, _missing
+    from mne_pipeline_hd.pipeline.pipeline_utils import QS
+
+    old_size = QS().value("ram_cache_mb")
+    QS().setValue("ram_cache_mb", 1)
+    try:
+        cache = DataCache()
+        arrays = {key: np.ones(50000) for key in ["a", "b", "c"]}
+        for key in ["a", "b"]:
+            assert cache.put(key, key, arrays[key])
+        # A hit returns a copy
+        data = cache.get("a", "a")
+        assert np.array_equal(data, arrays["a"])
+        assert data is not arrays["a"]
+        # "b" is the least recently used and is evicted
+        assert cache.put("c", "c", arrays["c"])
+        assert cache.get("b", "b") is _missing
+        assert cache.nbytes <= 1024**2
+        # Changed files invalidate the entry
+        assert cache.get("a", "changed") is _missing
+        # Data larger than the cache is not stored
+        assert not cache.put("d", "d", np.ones(200000))
+
+        # The size is not estimated when the cache is disabled
+        QS().setValue("ram_cache_mb", 0)
+        monkeypatch.setattr(loading, "estimate_nbytes", None)
+        assert not cache.put("a", "a", arrays["a"])
+        assert cache.get("a", "a") is _missing
+    finally:
+        QS().setValue("ram_cache_mb", old_size)
+
+
+def test_fsmri_registry(controller):
+    from mne_pipeline_hd.pipeline.loading import MEEG
+
+    controller.pr.add_meeg("a")
+    controller.pr.add_meeg("b")
+    controller.pr.add_fsmri("mri")
+    controller.pr.meeg_to_fsmri["a"] = "mri"
+    controller.pr.meeg_to_fsmri["b"] = "mri"
+
+    fsmri = controller.get_fsmri("mri")
+    assert controller.get_fsmri("mri") is fsmri
+    # MEEG-objects with the same MRI-Subject share the FSMRI-object
+    assert MEEG("a", controller).fsmri is fsmri
+    assert MEEG("b", controller).fsmri is fsmri
+
+    # Other Parameter-Presets get their own FSMRI-object
+    controller.pr.parameters["Other"] = controller.pr.parameters["Default"].copy()
+    controller.pr.p_preset = "Other"
+    assert controller.get_fsmri("mri") is not fsmri
+
+    controller.clear_fsmri_registry()
+    controller.pr.p_preset = "Default"
+    assert controller.get_fsmri("mri") is not fsmri
+
+
+def test_load_modes(controller):
+    import mne
+    import numpy as np
+
+    from mne_pipeline_hd.pipeline.loading import MEEG
+
+    controller.pr.add_meeg("a")
+    meeg = MEEG("a", controller)
+    info = mne.create_info(["MEG 0111", "STI 001"], 100, ["mag", "stim"])
+    data = np.random.RandomState(0).randn(2, 1000)
+    meeg.save_raw(mne.io.RawArray(data, info))
+
+    controller.settings["load_modes"] = {"raw": "lazy"}
+    raw = meeg.load_raw()
+    assert not raw.preload
+    assert np.allclose(raw.get_data(), data, atol=1e-6)
+
+    controller.settings["load_modes"] = {"raw": "memmap"}
+    raw = meeg.load_raw()
+    assert isinstance(raw._data, np.memmap)
+    # In-place changes work on the memory-mapped data
+    raw.apply_function(lambda x: x * 2, picks="all")
+    assert np.allclose(raw.get_data(), data * 2, atol=1e-6)
+    # Saving to the same file
+    meeg.save_raw(raw)
+
+    controller.settings["load_modes"] = {"raw": "preload"}
+    raw = meeg.load_raw()
+    assert raw.preload and not isinstance(raw._data, np.memmap)
+    assert np.allclose(raw.get_data(), data * 2, atol=1e-6)
+
+
+def test_group_load_items(controller):
+    from mne_pipeline_hd.pipeline.loading import Group, MEEG
+
+    names = ["a", "b", "c", "d"]
+    controller.pr.all_groups["group"] = names
+    for name in names:
+        controller.pr.add_meeg(name)
+        MEEG(name, controller).save_json("test", {"name": name})
+    # Avoid the fsaverage-download
+    controller.pr.add_fsmri("mri")
+    controller.pr.parameters["Default"]["morph_to"] = "mri"
+    group = Group("group", controller)
+
+    for n_prefetch in [0, 2]:
+        items = list(group.load_items(n_prefetch=n_prefetch))
+        assert [obj.name for obj in items] == names
+    # The items are loaded ahead, but returned in order
+    items = group.load_items(data_type="test", n_prefetch=2)
+    for (data, obj), name in zip(items, names):
+        assert data == {"name": name}
+        assert obj.name == name
+
+
+def test_file_parameter_journal(controller):
+    from os.path import isfile
+
+    from mne_pipeline_hd.pipeline.loading import MEEG
+
+    meeg = MEEG("test", controller)
+    journal = meeg.file_parameters_journal
+    journal.min_compact = 5
+    for idx in range(5):
+        meeg.save_json(f"test{idx}", {"idx": idx})
+    # Saving only appends to the journal
+    assert not isfile(meeg.file_parameters_path)
+    assert journal.n_entries == 5
+    assert MEEG("test", controller).file_parameters == meeg.file_parameters
+
+    # The journal is merged into the file-parameters-file
+    # when it has more entries than files
+    meeg.save_json("test5", {"idx": 5})
+    meeg.save_json("test0", {"idx": 0})
+    assert isfile(meeg.file_parameters_path)
+    assert not isfile(journal.journal_path)
+    meeg.save_json("test1", {"idx": 1})
+
+    # An incomplete last line (not written yet or from a crash) is ignored
+    with open(journal.journal_path, "a") as file:
+        file.write('{"file": "test_Default_test6.json", "par')
+    new_meeg = MEEG("test", controller)
+    assert new_meeg.file_parameters == meeg.file_parameters
+    assert len(new_meeg.file_parameters) == 6
+    assert isfile(journal.journal_path)
+    # and doesn't corrupt the next entry
+    new_meeg.save_json("test6", {"idx": 6})
+    assert len(MEEG("test", controller).file_parameters) == 7
+
+    # Compaction keeps the entries appended by other instances (processes)
+    meeg.save_json("test7", {"idx": 7})
+    new_meeg.file_parameters_journal.compact()
+    assert not isfile(journal.journal_path)
+    assert MEEG("test", controller).file_parameters.keys() == set(
+        meeg.file_parameters
+    ) | set(new_meeg.file_parameters)
+
+
+def test_file_scan(controller):
+    import os
+
+    from mne_pipeline_hd.pipeline.file_scan import build_file_tables, scan_objects
+    from mne_pipeline_hd.pipeline.loading import MEEG
+
+    meeg = MEEG("test", controller)
+    open(meeg.epochs_path, "w").close()
+    results = scan_objects(controller, "MEEG", ["test"])
+    assert results["test"]["status"] == {"epochs": "exists"}
+    pd_status, pd_time, pd_size = build_file_tables(results, ["test", "missing"])
+    assert pd_status.loc["test", "epochs"] == "exists"
+    assert pd_size.loc["test", "epochs"] == 0
+    assert pd_status.loc["missing"].isna().all()
+
+    # Unchanged directories are not scanned again
+    assert scan_objects(controller, "MEEG", ["test"])["test"] is results["test"]
+    # Changed project-entries of the object change its paths
+    controller.pr.sel_event_id["test"] = {"auditory": None}
+    results = scan_objects(controller, "MEEG", ["test"])
+    assert results["test"]["status"] == {"epochs": "exists"}
+    assert scan_objects(controller, "MEEG", ["test"])["test"] is results["test"]
+    controller.pr.meeg_to_fsmri["test"] = "other"
+    assert scan_objects(controller, "MEEG", ["test"])["test"] is not results["test"]
+    os.remove(meeg.epochs_path)
+    # Make sure the modification-time changes
+    stat = os.stat(meeg.save_dir)
+    os.utime(meeg.save_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert scan_objects(controller, "MEEG", ["test"])["test"]["status"] == dict()
+
+
+def test_typed_json():
+    import json
+    from datetime import datetime
+
+    import numpy as np
+
+    from mne_pipeline_hd.pipeline.pipeline_utils import (
+        TypedJSONEncoder,
+        type_json_hook,
+    )
+
+    data = {
+        "small": np.arange(3),
+        "large": np.arange(200, dtype=np.float32).reshape(10, 20),
+        "complex": np.array([1 + 2j, 3j]),
+        "set": {1, 2},
+        "time": datetime(2021, 2, 12, 10, 30),
+        "tuple": {"tuple_type": [1, 2]},
+        "numpy_b64": "not a type-tag",
+        "int": np.int64(3),
+    }
+    decoded = json.loads(
+        json.dumps(data, cls=TypedJSONEncoder), object_hook=type_json_hook
+    )
+    assert np.array_equal(decoded["small"], data["small"])
+    assert decoded["large"].dtype == np.float32
+    assert np.array_equal(decoded["large"], data["large"])
+    assert np.array_equal(decoded["complex"], data["complex"])
+    assert decoded["set"] == {1, 2}
+    assert decoded["time"] == data["time"]
+    assert decoded["tuple"] == (1, 2)
+    assert decoded["numpy_b64"] == "not a type-tag"
+    assert decoded["int"] == 3
+
+    # Dictionaries with a type-tag as only key and another payload stay unchanged
+    for user_dict in [{"numpy_b64": "abc"}, {"numpy_b64": {"data": "abc"}}]:
+        assert json.loads(json.dumps(user_dict), object_hook=type_json_hook) == (
+            user_dict
+        )
+
+    # Files from older versions can be read
+    old_json = '{"a": {"numpy_array": [1, 2]}, "b": {"numpy_int": 4}}'
+    decoded = json.loads(old_json, object_hook=type_json_hook)
+    assert np.array_equal(decoded["a"], [1, 2])
+    assert decoded["b"] == 4
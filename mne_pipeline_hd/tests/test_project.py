@@ -4,3 +4,116 @@ Authors: Martin Schulz <dev@mgschulz.de>
 License: BSD 3-Clause
 Github: https://github.com/marsipu/mne-pipeline-hd
 """
+
+import json
+from os import makedirs
+from os.path import isfile, join
+
+from mne_pipeline_hd.pipeline.controller import Controller
+
+
+def test_project_store(tmpdir, monkeypatch):
+    # Projects from older versions are loaded from their JSON-files
+    pscripts_path = join(tmpdir, "projects", "old", "_pipeline_scripts")
+    makedirs(pscripts_path)
+    with open(join(pscripts_path, "all_meeg_old.json"), "w") as file:
+        json.dump(["a", "b"], file)
+    ct = Controller(tmpdir, "old")
+    assert ct.pr.all_meeg == ["a", "b"]
+    assert isfile(ct.pr.store_path)
+
+    # Only changed attributes are written
+    written = list()
+    write = ct.pr.store.write
+
+    def _write(attributes):
+        written.append(set(attributes))
+        write(attributes)
+
+    monkeypatch.setattr(ct.pr.store, "write", _write)
+    ct.pr.save()
+    ct.pr.meeg_bad_channels["a"] = ["MEG 0111"]
+    ct.pr.meeg_event_id["a"] = {"Start": (1, 2)}
+    ct.pr.save()
+    assert written == [set(), {"meeg_bad_channels", "meeg_event_id"}]
+
+    ct.pr.rename("new")
+    new_ct = Controller(tmpdir, "new")
+    assert new_ct.pr.all_meeg == ["a", "b"]
+    assert new_ct.pr.meeg_bad_channels == {"a": ["MEG 0111"]}
+    assert new_ct.pr.meeg_event_id == {"a": {"Start": (1, 2)}}
+
+
+def test_project_dirty_tracking(tmpdir, monkeypatch):
+    from mne_pipeline_hd.pipeline import project
+
+    ct = Controller(tmpdir, "test")
+    ct.pr.plot_files["a"] = {"plot_func": ["a.png"]}
+    ct.pr.save()
+
+    # Unchanged attributes are not copied or encoded again
+    copied = list()
+    deepcopy = project.deepcopy
+    monkeypatch.setattr(
+        project, "deepcopy", lambda obj: copied.append(obj) or deepcopy(obj)
+    )
+    ct.pr.save()
+    assert copied == []
+
+    # Changes in nested containers are detected
+    ct.pr.plot_files["a"]["plot_func"].append("b.png")
+    ct.pr.save()
+    assert copied == [ct.pr.plot_files]
+    new_ct = Controller(tmpdir, "test")
+    assert new_ct.pr.plot_files == {"a": {"plot_func": ["a.png", "b.png"]}}
+
+
+def test_file_index(controller):
+    import os
+
+    from mne_pipeline_hd.pipeline.loading import MEEG
+
+    pr = controller.pr
+    meeg = MEEG("test", controller)
+    file_index = pr.get_file_index()
+    assert not file_index.exists(meeg.epochs_path)
+
+    # Changes by other processes are found when polling (or watching)
+    with open(meeg.epochs_path, "w") as file:
+        file.write("epochs")
+    file_index.refresh()
+    assert file_index.get_size(meeg.epochs_path) == 6
+    meeg.get_existing_paths()
+    assert meeg.existing_paths["epochs"] == [meeg.epochs_path]
+    entry = file_index.get_entry(meeg.epochs_path)
+    assert (entry.obj_name, entry.data_type) == ("test", "epochs")
+
+    # Figures are owned by the first part of their name
+    figure_path = join(pr.figures_path, "Default", "plot_test", "test--Default.png")
+    makedirs(os.path.dirname(figure_path))
+    open(figure_path, "w").close()
+    pr.update_file_index([figure_path])
+    entry = file_index.get_entry(figure_path)
+    assert (entry.obj_name, entry.data_type) == ("test", "plot_test")
+    assert file_index.listdir(join(pr.figures_path, "Default")) == ["plot_test"]
+
+    meeg.remove_path("epochs")
+    assert not file_index.exists(meeg.epochs_path)
+
+    # Only the folders of the selected FSMRI-objects are indexed
+    fsmri_path = join(controller.subjects_dir, "other", "bem", "other-bem.fif")
+    makedirs(os.path.dirname(fsmri_path))
+    open(fsmri_path, "w").close()
+    file_index.refresh()
+    assert not file_index.exists(fsmri_path)
+    pr.sel_fsmri.append("other")
+    assert pr.get_file_index().get_entry(fsmri_path).obj_name == "other"
+    # Paths outside of the indexed folders are checked on disk
+    outside_path = join(controller.subjects_dir, "fsaverage", "test.fif")
+    existing = file_index.get_existing_paths({"test": [outside_path, fsmri_path]})
+    assert existing["test"] == [fsmri_path]
+    makedirs(os.path.dirname(outside_path), exist_ok=True)
+    open(outside_path, "w").close()
+    existing = file_index.get_existing_paths({"test": [outside_path]})
+    assert existing["test"] == [outside_path]
+    pr.stop_file_index()
@@ -26,3 +26,36 @@ def test_qsettings_types(qtbot):
         value = QSettings().value(v)
         if value is not None:
             assert isinstance(value, type(default_qsettings[v]))
+
+
+def test_qsettings_snapshot(controller):
+    from mne_pipeline_hd.pipeline.function_utils import get_arguments, run_func
+    from mne_pipeline_hd.pipeline.loading import MEEG
+    from mne_pipeline_hd.pipeline.parallel import prefetch_map
+    from mne_pipeline_hd.pipeline.pipeline_utils import (
+        QS,
+        QSettingsSnapshot,
+        get_qsettings,
+    )
+
+    previous_n_jobs = QS().value("n_jobs")
+    QS().setValue("n_jobs", 1)
+    qsettings = QSettingsSnapshot()
+    # Changes after the start of a run don't affect the run
+    QS().setValue("n_jobs", 4)
+    try:
+        assert qsettings.value("n_jobs") == 1
+
+        def _func(meeg, n_jobs):
+            # The snapshot is also used in threads loading items ahead
+            prefetched = list(
+                prefetch_map(lambda _: get_qsettings().value("n_jobs"), [0], 1)
+            )
+            return n_jobs, prefetched[0]
+
+        meeg = MEEG("test", controller)
+        keywargs = get_arguments(_func, meeg, qsettings)
+        assert run_func(_func, keywargs, qsettings=qsettings) == (1, 1)
+        assert get_qsettings().value("n_jobs") == 4
+    finally:
+        QS().setValue("n_jobs", previous_n_jobs)